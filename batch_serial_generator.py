@@ -0,0 +1,91 @@
+#
+#  batch_serial_generator.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains functions to generate whole batches of serial numbers with numpy
+#
+#  These are the batch forms of the generators in serial_number_generator.py.  Each
+#  returns N serials at once as a numpy uint64 array, already fit to the scheme's
+#  serial field, so it can go straight into the batch encoders (see batch_encoder.py).
+#
+#  Note: this module requires numpy.
+#
+
+import time
+
+import numpy as np
+
+from packer import *
+from serial_number_generator import (linear_congruential_generator_with_seed, feistel_half_bits,
+                                     feistel_keys)
+
+# LCG constants, the same as linear_congruential_generator_with_seed
+LCG_PRIME = 9999999999971
+LCG_MULTIPLIER = 1013904223
+LCG_INCREMENT = 1664525
+
+# Batch form of new_serial_with_seed: count serials from consecutive seeds, cut to the
+# digits the scheme's encoder keeps from a serial string (see dict_scheme_2_serial_limit),
+# so each is the serial new_serial_with_seed would encode.  Like new_serial_with_seed,
+# this pads and cuts the LCG result, so serials can repeat (use serials_with_key for
+# serials that never do)
+def serials_with_seed(initial_seed, count, scheme=TCIN_96, now=None):
+  if now is None:
+    now = int(time.time())
+  seed = int(initial_seed) + int(linear_congruential_generator_with_seed(now))
+  seeds = np.arange(count, dtype=np.uint64) + np.uint64(seed % LCG_PRIME)
+  lcg_results = lcg_batch(seeds)
+
+  # Like new_serial_with_seed: prepend '00' and append zeros until it is 15 digits long,
+  # then keep the leading digits, like the encoder's ser[0:digits]
+  num_digits = np.searchsorted(powers_of_ten, lcg_results, side='right')
+  serials = lcg_results * powers_of_ten[np.maximum(13 - num_digits, 0)]
+  digits = len(str(dict_scheme_2_serial_limit[scheme] - 1))
+  return serials // powers_of_ten[15 - digits]
+
+powers_of_ten = np.array([10 ** i for i in range(20)], dtype=np.uint64)
+
+# (seed * multiplier + increment) % prime, without overflowing uint64: the multiplier is
+# split into two 15 bit halves, so no product is wider than 59 bits
+def lcg_batch(seeds):
+  prime = np.uint64(LCG_PRIME)
+  seeds = seeds % prime
+  result = (seeds * np.uint64(LCG_MULTIPLIER >> 15)) % prime
+  result = (result * np.uint64(1 << 15) + seeds * np.uint64(LCG_MULTIPLIER & 0x7FFF)) % prime
+  return (result + np.uint64(LCG_INCREMENT)) % prime
+
+# Batch form of new_serial_with_key: serials for indexes start to start + count - 1
+def serials_with_key(key, start, count, scheme=TCIN_96):
+  indexes = np.arange(start, start + count, dtype=np.uint64)
+  return permuted_serials(key, indexes, dict_scheme_2_serial_limit[scheme])
+
+# Batch form of permuted_serial, for an array of indexes
+def permuted_serials(key, indexes, limit):
+  indexes = np.asarray(indexes, dtype=np.uint64)
+  if len(indexes) and indexes.max() >= np.uint64(limit):
+    raise ValueError(f'Index {indexes.max()} is out of range for {limit} serial numbers')
+  half = feistel_half_bits(limit)
+  keys = feistel_keys(key)
+
+  serials = feistel_batch(indexes, half, keys)
+  walk = np.flatnonzero(serials >= np.uint64(limit))
+  while len(walk):
+    serials[walk] = feistel_batch(serials[walk], half, keys)
+    walk = walk[serials[walk] >= np.uint64(limit)]
+  return serials
+
+def feistel_batch(x, half, keys):
+  mask = np.uint64((1 << half) - 1)
+  left, right = x >> np.uint64(half), x & mask
+  for k in keys:
+    left, right = right, left ^ (mix64_batch(right ^ np.uint64(k)) & mask)
+  return (left << np.uint64(half)) | right
+
+# The SplitMix64 finalizer, where uint64 multiplication wraps just like the & MASK_64
+def mix64_batch(x):
+  x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+  x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+  return x ^ (x >> np.uint64(31))
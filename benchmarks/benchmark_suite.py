@@ -0,0 +1,447 @@
+#
+#  benchmark_suite.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a benchmark suite for every converter, generator, encoder,
+#  batch and decoder path, and the bulk index, dedup, inventory and archive modules,
+#  with a compare mode to gate upgrades on throughput
+#
+#  Each case is run at every input size asked for (1 up to 10M).  Scalar cases are
+#  called once per input, timing every call, so the results have ops/s and the
+#  latency percentiles of one call.  Batch cases encode the whole input in one call,
+#  repeated, so their ops/s is per row and their latencies are per batch.  The peak
+#  memory of the same work is then measured in a separate pass under tracemalloc (so
+#  tracing doesn't slow down the timed pass).
+#
+#  Results are saved as JSON, keyed by "case/size", and two result files can be
+#  compared: any case whose ops/s dropped (or peak memory grew) by more than the
+#  threshold is a regression, and compare exits with status 1.
+#
+#  e.g. rfidencoder> python3 -m benchmarks.benchmark_suite run --output results.json
+#       rfidencoder> python3 -m benchmarks.benchmark_suite run --cases batch_encoder --sizes 1000000,10000000
+#       rfidencoder> python3 -m benchmarks.benchmark_suite compare baseline.json results.json --threshold 0.1
+#
+#  Note: the batch, decoder and bulk cases require numpy, they are only imported when
+#  run.  Cases that need files (the serial allocator and tag archives) keep them in a
+#  temporary directory that is removed on exit.
+#
+
+import argparse
+import array
+import importlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from converter import *
+from epc_encoder import (EPCEncoder, calculate_check_digit, encode_dpci, encode_gtin, encode_gtin_in_gid,
+                         encode_dpci_into)
+from tcin_encoder import TCINEncoder, encode_tcin, encode_tcin_into
+from tiai_encoder import TIAIEncoder, encode_tiai_dec, encode_tiai_char, encode_tiai_hex, encode_tiai_char_into
+from tiai_codec import chars_2_asset_id, asset_id_2_chars
+from serial_number_generator import new_serial_with_seed, new_serial_with_key
+
+DEFAULT_SIZES = (1, 1000, 100000)
+PERCENTILES = (50, 90, 99)
+
+# Scalar cases cycle through this many distinct inputs, so a 10M call run doesn't
+# need 10M inputs in memory (items still vary, so the prefix cache sees some misses)
+POOL_SIZE = 1024
+
+# Memory is traced over at most this many scalar calls
+MEMORY_CALLS = 1000
+
+# The temporary directory for the cases that need files, made on first use
+scratch = None
+
+def scratch_path(name):
+  global scratch
+  if scratch is None:
+    scratch = tempfile.TemporaryDirectory(prefix="benchmark_suite")
+  return os.path.join(scratch.name, name)
+
+# Sample inputs (all strings, as the encoders take them)
+def sample_digits(i, width):
+  return f'{i * 7919 % 10 ** width:0{width}d}'
+
+def sample_gtin(i):
+  return sample_digits(i % 100, 13) + "0"
+
+def sample_asset_chars(i):
+  return f'A{i * 7919:X}'[:12]
+
+# Scalar cases: the function and the arguments of the i'th call
+dict_case_2_scalar = {
+  "converter.dec_2_bin": lambda: (dec_2_bin, lambda i: (sample_digits(i, 21), 72)),
+  "converter.bin_2_dec": lambda: (bin_2_dec, lambda i: (f'{i * 7919:072b}',)),
+  "converter.dec_2_hex": lambda: (dec_2_hex, lambda i: (sample_digits(i, 21), 18)),
+  "converter.hex_2_dec": lambda: (hex_2_dec, lambda i: (f'{i * 7919:018X}',)),
+  "converter.bin_2_hex": lambda: (bin_2_hex, lambda i: (f'{i * 7919:096b}', 24)),
+  "converter.hex_2_bin": lambda: (hex_2_bin, lambda i: (f'{i * 7919:024X}', 96)),
+  "epc_encoder.calculate_check_digit": lambda: (calculate_check_digit, lambda i: (sample_digits(i, 11),)),
+  "serial_number_generator.new_serial_with_seed": lambda: (new_serial_with_seed, lambda i: (str(i),)),
+  "serial_number_generator.new_serial_with_key": lambda: (new_serial_with_key, lambda i: (12345, i)),
+  "tiai_codec.chars_2_asset_id": lambda: (chars_2_asset_id, lambda i: (sample_asset_chars(i),)),
+  "tiai_codec.asset_id_2_chars": lambda: (asset_id_2_chars, lambda i: (chars_2_asset_id(sample_asset_chars(i)),)),
+  "EPCEncoder.with_dpci": lambda: (EPCEncoder().with_dpci,
+                                   lambda i: ("281", "00", str(8570 + i % 100), str(i))),
+  "EPCEncoder.with_gtin_in_gid": lambda: (EPCEncoder().with_gtin_in_gid, lambda i: (sample_gtin(i), str(i))),
+  "EPCEncoder.with_gtin": lambda: (EPCEncoder().with_gtin, lambda i: (sample_gtin(i), str(i), "101")),
+  "TCINEncoder.with_tcin_and_serial_number": lambda: (TCINEncoder().with_tcin_and_serial_number,
+                                                      lambda i: (str(13951442 + i % 100), str(i))),
+  "TCINEncoder.with_tcin": lambda: (TCINEncoder().with_tcin, lambda i: (str(13951442 + i % 100),)),
+  "TCINEncoder.with_tcin_and_seed": lambda: (TCINEncoder().with_tcin_and_seed,
+                                             lambda i: (str(13951442 + i % 100), str(i))),
+  "TCINEncoder.with_tcin_and_allocator": lambda: allocator_case(),
+  "EPCEncoder.with_gtin_and_index": lambda: prefix_index_case(),
+  "TIAIEncoder.with_dec_id": lambda: (TIAIEncoder().with_dec_id, lambda i: (str(i % 1000), str(i))),
+  "TIAIEncoder.with_char_id": lambda: (TIAIEncoder().with_char_id, lambda i: (str(i % 1000), sample_asset_chars(i))),
+  "TIAIEncoder.with_hex_id": lambda: (TIAIEncoder().with_hex_id, lambda i: (str(i % 1000), f'{i * 7919:X}')),
+  "epc_encoder.encode_dpci": lambda: (encode_dpci, lambda i: ("281", "00", str(8570 + i % 100), str(i))),
+  "epc_encoder.encode_gtin_in_gid": lambda: (encode_gtin_in_gid, lambda i: (sample_gtin(i), str(i))),
+  "epc_encoder.encode_gtin": lambda: (encode_gtin, lambda i: (sample_gtin(i), str(i), "101")),
+  "tcin_encoder.encode_tcin": lambda: (encode_tcin, lambda i: (str(13951442 + i % 100), str(i))),
+  "tiai_encoder.encode_tiai_dec": lambda: (encode_tiai_dec, lambda i: (str(i % 1000), str(i))),
+  "tiai_encoder.encode_tiai_char": lambda: (encode_tiai_char, lambda i: (str(i % 1000), sample_asset_chars(i))),
+  "tiai_encoder.encode_tiai_hex": lambda: (encode_tiai_hex, lambda i: (str(i % 1000), f'{i * 7919:X}')),
+  "epc_encoder.encode_dpci_into": lambda: (encode_dpci_into,
+                                           lambda i: (bytearray(12), 0, "281", "00", str(8570 + i % 100), str(i))),
+  "tcin_encoder.encode_tcin_into": lambda: (encode_tcin_into, lambda i: (bytearray(12), 0, str(13951442 + i % 100), str(i))),
+  "tiai_encoder.encode_tiai_char_into": lambda: (encode_tiai_char_into,
+                                                 lambda i: (bytearray(12), 0, str(i % 1000), sample_asset_chars(i))),
+  "decoder.decode_hex": lambda: scalar_decoder_case("decode_hex", lambda tag: (tag.hex,)),
+  "decoder.epc_2_uri": lambda: scalar_decoder_case("epc_2_uri", lambda tag: (tag.value,))
+}
+
+def allocator_case():
+  from serial_allocator import SerialAllocator
+  allocator = SerialAllocator(scratch_path("serials.state"))
+  return TCINEncoder().with_tcin_and_allocator, lambda i: (str(13951442 + i % 100), allocator)
+
+# Every sample GTIN starts with 0, so one prefix resolves them all (to partition 5)
+def prefix_index_case():
+  from company_prefix_index import CompanyPrefixIndex
+  index = CompanyPrefixIndex([("0", 7)])
+  return EPCEncoder().with_gtin_and_index, lambda i: (sample_gtin(i), str(i), index)
+
+def scalar_decoder_case(name, tag_2_args):
+  import decoder
+  return getattr(decoder, name), lambda i: tag_2_args(encode_tcin(str(13951442 + i % 100), str(i)))
+
+# Batch cases: the function and its arguments for n rows
+def batch_dpci_args(n):
+  import numpy as np
+  return (np.full(n, 281, dtype=np.uint64), np.zeros(n, dtype=np.uint64),
+          np.arange(n, dtype=np.uint64) % np.uint64(10000), np.arange(n, dtype=np.uint64))
+
+def batch_tcin_args(n):
+  import numpy as np
+  return np.arange(n, dtype=np.uint64) % np.uint64(100) + np.uint64(13951442), np.arange(n, dtype=np.uint64)
+
+# The same inputs as digit strings, as they come from a manifest
+def batch_dpci_string_args(n):
+  return tuple([str(value) for value in values.tolist()] for values in batch_dpci_args(n))
+
+def batch_tcin_string_args(n):
+  return tuple([str(value) for value in values.tolist()] for values in batch_tcin_args(n))
+
+def batch_tiai_char_args(n):
+  import numpy as np
+  return np.arange(n, dtype=np.uint64) % np.uint64(1000), np.array([sample_asset_chars(i) for i in range(n)])
+
+def batch_tcin_tags(n):
+  from batch_encoder import encode_tcin_batch
+  return encode_tcin_batch(*batch_tcin_args(n))
+
+def batch_dpci_buffer(n):
+  from batch_encoder import encode_dpci_batch
+  return encode_dpci_batch(*batch_dpci_args(n)).tags.tobytes()
+
+def batch_case(module, name, build_args):
+  return getattr(importlib.import_module(module), name), build_args
+
+# A batch case for a function that returns an iterator, run to the end (the module is
+# imported here, not in the timed call)
+def listed_case(module, name, build_args):
+  fn = getattr(importlib.import_module(module), name)
+  return lambda *args: list(fn(*args)), build_args
+
+def batch_asset_id_lanes(n):
+  from batch_encoder import chars_2_asset_id_lanes
+  return chars_2_asset_id_lanes([sample_asset_chars(i) for i in range(n)])
+
+def epc_index_case():
+  from epc_index import EPCIndex
+  return EPCIndex.from_tags, lambda n: (batch_tcin_tags(n).tags,)
+
+# An index of n tags, and the same tags to look up
+def epc_index_args(n):
+  from epc_index import EPCIndex
+  tags = batch_tcin_tags(n).tags
+  return EPCIndex.from_tags(tags), tags
+
+# Each call gets a new deduper, so repeats of the case aren't all suppressed; the
+# buffer reads every tag twice
+def dedup_case():
+  from dedup import ReadDeduper
+  return lambda buf: ReadDeduper().filter_buffer(buf), lambda n: (batch_tcin_tags(n).tags[:, None].repeat(2, axis=1).tobytes(),)
+
+def inventory_case():
+  import numpy as np
+  from inventory import Inventory
+  def count(tags, antennas):
+    inventory = Inventory()
+    inventory.add(tags, reader=1, antenna=antennas)
+    return inventory
+  return count, lambda n: (batch_tcin_tags(n).tags, np.arange(n) % 4)
+
+# Half of the expected tags are read, along with as many strays
+def inventory_diff_args(n):
+  import numpy as np
+  from batch_encoder import encode_tcin_batch
+  expected = batch_tcin_tags(n)
+  strays = encode_tcin_batch(np.full(n // 2, 13951441, dtype=np.uint64), np.arange(n // 2, dtype=np.uint64))
+  return expected, np.concatenate([expected.tags[::2], strays.tags])
+
+# Write n tags to a new archive each call
+def archive_writer_case():
+  from packer import TCIN_96
+  from tag_archive import TagArchiveWriter
+  def write(path, batch):
+    if os.path.exists(path):
+      os.remove(path)
+    with TagArchiveWriter(path, TCIN_96) as writer:
+      writer.append(batch)
+  return write, lambda n: (scratch_path(f'write_{n}.epc'), batch_tcin_tags(n))
+
+# Read the lanes of an archive of n tags
+def archive_reader_case():
+  from packer import TCIN_96
+  from tag_archive import TagArchive, TagArchiveWriter
+  def build_args(n):
+    path = scratch_path(f'read_{n}.epc')
+    if not os.path.exists(path):
+      with TagArchiveWriter(path, TCIN_96) as writer:
+        writer.append(batch_tcin_tags(n))
+    return (path,)
+  def read(path):
+    with TagArchive(path) as archive:
+      return archive.lanes()
+  return read, build_args
+
+dict_case_2_batch = {
+  "batch_encoder.encode_dpci_batch": lambda: batch_case("batch_encoder", "encode_dpci_batch", batch_dpci_args),
+  "batch_encoder.encode_tcin_batch": lambda: batch_case("batch_encoder", "encode_tcin_batch", batch_tcin_args),
+  "batch_encoder.encode_dpci_batch_strings": lambda: batch_case("batch_encoder", "encode_dpci_batch",
+                                                                batch_dpci_string_args),
+  "batch_encoder.encode_tcin_batch_strings": lambda: batch_case("batch_encoder", "encode_tcin_batch",
+                                                                batch_tcin_string_args),
+  "batch_encoder.encode_tiai_char_batch": lambda: batch_case("batch_encoder", "encode_tiai_char_batch",
+                                                             batch_tiai_char_args),
+  "batch_encoder.TagBatch.hexes": lambda: (lambda batch: list(batch.hexes()), lambda n: (batch_tcin_tags(n),)),
+  "batch_serial_generator.serials_with_seed": lambda: batch_case("batch_serial_generator", "serials_with_seed",
+                                                                 lambda n: (12345, n, "tcin-96", 1621234567)),
+  "batch_serial_generator.serials_with_key": lambda: batch_case("batch_serial_generator", "serials_with_key",
+                                                                lambda n: (12345, 0, n)),
+  "decoder.decode_buffer": lambda: batch_case("decoder", "decode_buffer", lambda n: (batch_dpci_buffer(n),)),
+  "decoder.asset_id_lanes_2_chars": lambda: batch_case("decoder", "asset_id_lanes_2_chars", batch_asset_id_lanes),
+  "gtin_normalizer.normalize_gtins": lambda: batch_case("gtin_normalizer", "normalize_gtins",
+                                                        lambda n: ([sample_gtin(i) for i in range(n)],)),
+  "range_encoder.encode_range": lambda: listed_case("range_encoder", "encode_range",
+                                                    lambda n: ("tcin", ("13951442",), 1000, n)),
+  "range_encoder.encode_range_batch": lambda: batch_case("range_encoder", "encode_range",
+                                                         lambda n: ("tcin", ("13951442",), 1000, n, True)),
+  "epc_index.EPCIndex.from_tags": lambda: epc_index_case(),
+  "epc_index.EPCIndex.lookup_tags": lambda: (lambda index, tags: index.lookup_tags(tags), epc_index_args),
+  "dedup.ReadDeduper.filter_buffer": lambda: dedup_case(),
+  "inventory.Inventory.add": lambda: inventory_case(),
+  "inventory_diff.diff_inventory": lambda: batch_case("inventory_diff", "diff_inventory", inventory_diff_args),
+  "tag_archive.TagArchiveWriter.append": lambda: archive_writer_case(),
+  "tag_archive.TagArchive.lanes": lambda: archive_reader_case()
+}
+
+def case_names():
+  return list(dict_case_2_scalar) + list(dict_case_2_batch)
+
+# The p'th percentile of an already sorted sequence (nearest rank)
+def percentile(sorted_values, p):
+  if not sorted_values:
+    return 0.0
+  rank = max(int(-(-p * len(sorted_values) // 100)), 1)
+  return sorted_values[rank - 1]
+
+def latency_stats(latencies_ns):
+  latencies_ns = sorted(latencies_ns)
+  stats = {f'p{p}_us': percentile(latencies_ns, p) / 1000 for p in PERCENTILES}
+  stats["max_us"] = latencies_ns[-1] / 1000 if latencies_ns else 0.0
+  return stats
+
+# Peak bytes allocated while running work (only what it allocates, not its inputs)
+def traced_peak(work):
+  tracemalloc.start()
+  try:
+    start = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    work()
+    return tracemalloc.get_traced_memory()[1] - start
+  finally:
+    tracemalloc.stop()
+
+# Call fn n times, cycling through the argument pool, timing every call
+def run_scalar(fn, make_args, n):
+  pool = [make_args(i) for i in range(min(n, POOL_SIZE))]
+  size = len(pool)
+  for args in pool:
+    fn(*args)
+
+  timer = time.perf_counter_ns
+  latencies = array.array('q', bytes(8 * n))
+  start = time.perf_counter()
+  for i in range(n):
+    args = pool[i % size]
+    call_start = timer()
+    fn(*args)
+    latencies[i] = timer() - call_start
+  seconds = time.perf_counter() - start
+
+  def work():
+    for i in range(min(n, MEMORY_CALLS)):
+      fn(*pool[i % size])
+
+  return {"kind": "scalar", "calls": n, "seconds": seconds, "ops_per_sec": n / seconds if seconds > 0 else 0.0,
+          **latency_stats(latencies), "peak_bytes": traced_peak(work)}
+
+# Call fn on all n rows at once, repeat times (after one warm up call)
+def run_batch(fn, build_args, n, repeat=5):
+  args = build_args(n)
+  fn(*args)
+
+  latencies = []
+  for _ in range(repeat):
+    start = time.perf_counter_ns()
+    fn(*args)
+    latencies.append(time.perf_counter_ns() - start)
+  seconds = min(latencies) / 1e9
+
+  return {"kind": "batch", "calls": repeat, "seconds": seconds, "ops_per_sec": n / seconds if seconds > 0 else 0.0,
+          **latency_stats(latencies), "peak_bytes": traced_peak(lambda: fn(*args))}
+
+def run_case(name, n, repeat=5):
+  if name in dict_case_2_scalar:
+    fn, make_args = dict_case_2_scalar[name]()
+    result = run_scalar(fn, make_args, n)
+  elif name in dict_case_2_batch:
+    fn, build_args = dict_case_2_batch[name]()
+    result = run_batch(fn, build_args, n, repeat)
+  else:
+    raise ValueError(f'Unsupported benchmark case: {name}')
+  return {"case": name, "size": n, **result}
+
+def result_key(name, n):
+  return f'{name}/{n}'
+
+# Run every case whose name contains one of the filters (all cases if there are none)
+def run_suite(sizes=DEFAULT_SIZES, filters=(), repeat=5, progress=None):
+  names = [name for name in case_names() if not filters or any(f in name for f in filters)]
+  results = {}
+  for name in names:
+    for n in sizes:
+      result = run_case(name, n, repeat)
+      results[result_key(name, n)] = result
+      if progress is not None:
+        progress(result)
+  return {"environment": environment(), "results": results}
+
+def environment():
+  return {
+    "python": platform.python_version(),
+    "implementation": platform.python_implementation(),
+    "platform": platform.platform(),
+    "cpus": os.cpu_count(),
+    "created": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+  }
+
+# Compare two suite runs: every case in both where ops/s dropped, or peak memory grew,
+# by more than the threshold (a fraction, e.g. 0.1 for 10%)
+def compare_results(baseline, current, threshold=0.1):
+  regressions = []
+  for key, now in current["results"].items():
+    before = baseline["results"].get(key)
+    if before is None:
+      continue
+    if before["ops_per_sec"] > 0 and now["ops_per_sec"] < before["ops_per_sec"] * (1 - threshold):
+      regressions.append({"key": key, "metric": "ops_per_sec", "baseline": before["ops_per_sec"],
+                          "current": now["ops_per_sec"], "change": now["ops_per_sec"] / before["ops_per_sec"] - 1})
+    if before["peak_bytes"] > 0 and now["peak_bytes"] > before["peak_bytes"] * (1 + threshold):
+      regressions.append({"key": key, "metric": "peak_bytes", "baseline": before["peak_bytes"],
+                          "current": now["peak_bytes"], "change": now["peak_bytes"] / before["peak_bytes"] - 1})
+  return regressions
+
+def print_result(result):
+  print(f'{result["case"]:48} {result["size"]:>9} {result["ops_per_sec"]:>14.0f} ops/s '
+        f'p50 {result["p50_us"]:>10.2f}us p99 {result["p99_us"]:>10.2f}us peak {result["peak_bytes"]:>11} bytes',
+        file=sys.stderr)
+
+def print_regressions(regressions):
+  for regression in regressions:
+    print(f'{regression["key"]}: {regression["metric"]} {regression["baseline"]:.0f} -> {regression["current"]:.0f} '
+          f'({regression["change"]:+.1%})')
+
+def load_results(path):
+  with open(path) as f:
+    return json.load(f)
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Benchmark the rfid encoders")
+  commands = parser.add_subparsers(dest="command", required=True)
+
+  run = commands.add_parser("run", help="run the suite and save the results")
+  run.add_argument("--output", default="-", help="JSON results file (default: stdout)")
+  run.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES),
+                   help="comma separated input sizes, from 1 up to 10000000")
+  run.add_argument("--cases", default="", help="comma separated filters on the case names")
+  run.add_argument("--repeat", type=int, default=5, help="timed calls of each batch case")
+  run.add_argument("--baseline", help="compare against this results file as well")
+  run.add_argument("--threshold", type=float, default=0.1)
+
+  compare = commands.add_parser("compare", help="flag regressions between two results files")
+  compare.add_argument("baseline")
+  compare.add_argument("current")
+  compare.add_argument("--threshold", type=float, default=0.1, help="allowed change, e.g. 0.1 for 10%%")
+
+  commands.add_parser("list", help="list the benchmark cases")
+  args = parser.parse_args(argv)
+
+  if args.command == "list":
+    print("\n".join(case_names()))
+    return 0
+
+  if args.command == "compare":
+    baseline, current = load_results(args.baseline), load_results(args.current)
+  else:
+    sizes = tuple(int(n) for n in args.sizes.split(","))
+    filters = tuple(f for f in args.cases.split(",") if f)
+    current = run_suite(sizes, filters, args.repeat, print_result)
+    text = json.dumps(current, indent=2)
+    if args.output == "-":
+      print(text)
+    else:
+      with open(args.output, "w") as f:
+        f.write(text + "\n")
+    if args.baseline is None:
+      return 0
+    baseline = load_results(args.baseline)
+
+  regressions = compare_results(baseline, current, args.threshold)
+  print_regressions(regressions)
+  return 1 if regressions else 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,111 @@
+#
+#  thread_scaling.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a benchmark of the encode_* functions across a pool of threads
+#
+#  The same rows are encoded with 1, 2, 4 and 8 threads sharing the stateless
+#  encode functions (see pipeline.dict_scheme_2_encoder), and the rows/s and the
+#  speedup over one thread are printed for each.  With the GIL the speedup stays
+#  around 1x, on a free threaded (no-GIL) build it should follow the number of cores.
+#
+#  e.g. rfidencoder> python3 -m benchmarks.thread_scaling --schemes dpci,tcin --rows 200000
+#
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline import *
+
+# The output fields rendered for each row, the same as the pipeline's default
+DEFAULT_FIELDS = ("hex", "uri")
+
+# Sample input columns for row i of each scheme
+dict_scheme_2_sample_row = {
+  "dpci": lambda i: ["281", "00", str(8570 + i % 100), str(i)],
+  "gtin": lambda i: [str(12345678901 + i % 100).zfill(13) + "0", str(i), "101"],
+  "gtin_in_gid": lambda i: [str(12345678901 + i % 100).zfill(13) + "0", str(i)],
+  "tcin": lambda i: [str(13951442 + i % 100), str(i)],
+  "tiai_dec": lambda i: [str(i % 1000), str(i)],
+  "tiai_char": lambda i: [str(i % 1000), f'A{i:X}'],
+  "tiai_hex": lambda i: [str(i % 1000), f'{i:X}']
+}
+
+# Encode a slice of rows, rendering the output fields so the work isn't left to the caller
+def encode_slice(scheme, rows, fields=DEFAULT_FIELDS):
+  return len(encode_values(scheme, rows, fields))
+
+# Encode the rows in chunks across a pool of threads, returning the seconds taken
+def time_threads(scheme, rows, threads, chunk_size=1000, fields=DEFAULT_FIELDS):
+  chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+  start = time.perf_counter()
+  with ThreadPoolExecutor(threads) as executor:
+    encoded = sum(executor.map(lambda chunk: encode_slice(scheme, chunk, fields), chunks))
+  seconds = time.perf_counter() - start
+  if encoded != len(rows):
+    raise RuntimeError(f'{scheme}: encoded {encoded} of {len(rows)} rows')
+  return seconds
+
+# The best of repeat runs for each thread count, with rows/s and speedup over one thread
+def run_scaling(schemes, num_rows=100000, thread_counts=(1, 2, 4, 8), repeat=3, chunk_size=1000,
+                fields=DEFAULT_FIELDS):
+  results = {}
+  for scheme in schemes:
+    rows = [dict_scheme_2_sample_row[scheme](i) for i in range(num_rows)]
+    # Warm up the encoders (each pool thread still fills its own prefix cache, once per item)
+    encode_values(scheme, rows[:chunk_size], fields)
+    scheme_results = []
+    for threads in thread_counts:
+      seconds = min(time_threads(scheme, rows, threads, chunk_size, fields) for _ in range(repeat))
+      scheme_results.append({"threads": threads, "seconds": seconds, "rows_per_sec": num_rows / seconds})
+    for result in scheme_results:
+      result["speedup"] = result["rows_per_sec"] / scheme_results[0]["rows_per_sec"]
+    results[scheme] = scheme_results
+  return results
+
+def gil_enabled():
+  is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+  return True if is_gil_enabled is None else is_gil_enabled()
+
+def print_results(results):
+  print(f'python {sys.version.split()[0]}, {os.cpu_count()} CPUs, GIL {"enabled" if gil_enabled() else "disabled"}')
+  for scheme, scheme_results in results.items():
+    for result in scheme_results:
+      print(f'{scheme:12} {result["threads"]:3} threads {result["rows_per_sec"]:12.0f} rows/s {result["speedup"]:6.2f}x')
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Benchmark the encode functions across a pool of threads")
+  parser.add_argument("--schemes", default="dpci,tcin,tiai_char", help="comma separated list of schemes")
+  parser.add_argument("--rows", type=int, default=100000)
+  parser.add_argument("--threads", default="1,2,4,8", help="comma separated list of thread counts")
+  parser.add_argument("--repeat", type=int, default=3)
+  parser.add_argument("--chunk-size", type=int, default=1000)
+  parser.add_argument("--fields", default="hex,uri", help="comma separated list of hex, uri and bin to render")
+  parser.add_argument("--json", help="also write the results to this file")
+  args = parser.parse_args(argv)
+
+  schemes = args.schemes.split(",")
+  for scheme in schemes:
+    if scheme not in dict_scheme_2_sample_row:
+      parser.error(f'Unsupported scheme: {scheme}')
+  thread_counts = tuple(int(threads) for threads in args.threads.split(","))
+  fields = tuple(args.fields.split(","))
+  for field in fields:
+    if field not in OUTPUT_FIELDS:
+      parser.error(f'Unsupported field: {field}')
+
+  results = run_scaling(schemes, args.rows, thread_counts, args.repeat, args.chunk_size, fields)
+  print_results(results)
+  if args.json:
+    with open(args.json, "w") as f:
+      json.dump({"gil_enabled": gil_enabled(), "cpus": os.cpu_count(), "results": results}, f, indent=2)
+
+if __name__ == '__main__':
+  main()
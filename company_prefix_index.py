@@ -0,0 +1,157 @@
+#
+#  company_prefix_index.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  A python class to look up the SGTIN partition for a GTIN
+#
+#  The partition depends on the length of the GS1 company prefix, which is
+#  assigned by GS1 and can't be worked out from the GTIN itself.  This index is
+#  loaded from a local GCP length file, either GS1's gcpprefixformatlist.xml
+#  (<entry prefix="0614141" gcpLength="7"/>) or a text file with a prefix and
+#  a length on each line.  The longest matching prefix wins.
+#
+#  A single GTIN is resolved with one dict lookup per prefix length in the file,
+#  and a batch of GTINs with a binary search of a sorted prefix array per length.
+#
+#  Note: this module requires numpy (for the batch lookups).
+#
+
+import re
+import xml.etree.ElementTree as ElementTree
+
+import numpy as np
+
+from packer import *
+from lanes import *
+
+# The company prefix (and item reference) are GTIN-14 digits 1 to 12
+GTIN_PREFIX_DIGITS = 12
+
+# company_prefix_index python class to encapsulate the prefix tables in an instance
+class CompanyPrefixIndex:
+
+  # Pass (prefix, gcp_length) pairs of digit strings or ints
+  def __init__(self, entries=()):
+    # Instance variables
+    self.dict_prefix_2_gcp_length = {}
+    self.lengths = ()
+    self.arrays = None
+    for prefix, gcp_length in entries:
+      self.add(prefix, gcp_length)
+
+  # Load a GS1 gcpprefixformatlist.xml, or a text file of "prefix,length" lines
+  @classmethod
+  def load(cls, path):
+    with open(path, "rb") as f:
+      is_xml = f.read(256).lstrip().startswith(b'<')
+    if is_xml:
+      return cls(read_gcp_xml(path))
+    with open(path, "r") as f:
+      return cls(read_gcp_text(f))
+
+  def __len__(self):
+    return sum(len(prefixes) for prefixes in self.dict_prefix_2_gcp_length.values())
+
+  def add(self, prefix, gcp_length):
+    prefix = str(prefix).strip()
+    gcp_length = int(gcp_length)
+    if not prefix.isdigit() or len(prefix) > GTIN_PREFIX_DIGITS:
+      raise ValueError(f'Invalid GS1 prefix: {prefix}')
+    self.dict_prefix_2_gcp_length.setdefault(len(prefix), {})[prefix] = gcp_length
+    # Longest prefixes are tried first
+    self.lengths = tuple(sorted(self.dict_prefix_2_gcp_length, reverse=True))
+    self.arrays = None
+
+  # The company prefix length for a GTIN, or None if no prefix matches
+  def gcp_length(self, gtin):
+    key = gtin_2_key(gtin)
+    for length in self.lengths:
+      gcp_length = self.dict_prefix_2_gcp_length[length].get(key[:length])
+      if gcp_length is not None:
+        return gcp_length
+    return None
+
+  # The SGTIN partition for a GTIN, or None if the GTIN's company prefix isn't known
+  # (or is a length SGTIN-96 can't hold)
+  def partition(self, gtin):
+    gcp_length = self.gcp_length(gtin)
+    if gcp_length is None:
+      return None
+    return gcp_length_2_partition(gcp_length)
+
+  # The company prefix lengths for an array of GTINs (digit strings or ints), 0 where
+  # no prefix matches
+  def gcp_lengths(self, gtins):
+    keys = gtins_2_keys(gtins)
+    gcp_lengths = np.zeros(len(keys), dtype=np.uint8)
+    unresolved = np.ones(len(keys), dtype=bool)
+    for length, (prefixes, lengths) in self.prefix_arrays().items():
+      candidates = np.flatnonzero(unresolved)
+      if len(candidates) == 0:
+        break
+      values = keys[candidates] // np.uint64(10 ** (GTIN_PREFIX_DIGITS - length))
+      found = np.searchsorted(prefixes, values)
+      found[found == len(prefixes)] = 0
+      matched = prefixes[found] == values
+      gcp_lengths[candidates[matched]] = lengths[found[matched]]
+      unresolved[candidates[matched]] = False
+    return gcp_lengths
+
+  # The SGTIN partitions for an array of GTINs, -1 where the company prefix isn't known
+  def partitions(self, gtins):
+    gcp_lengths = self.gcp_lengths(gtins).astype(np.int8)
+    partitions = GTIN_PREFIX_DIGITS - gcp_lengths
+    partitions[(partitions < 0) | (partitions >= len(SGTIN_96_PARTITIONS))] = -1
+    return partitions
+
+  # Sorted prefix and gcp length arrays for each prefix length (longest first), built on first use
+  def prefix_arrays(self):
+    if self.arrays is None:
+      self.arrays = {}
+      for length in self.lengths:
+        prefixes = self.dict_prefix_2_gcp_length[length]
+        values = np.fromiter((int(prefix) for prefix in prefixes), dtype=np.uint64, count=len(prefixes))
+        lengths = np.fromiter(prefixes.values(), dtype=np.uint8, count=len(prefixes))
+        order = np.argsort(values)
+        self.arrays[length] = (values[order], lengths[order])
+    return self.arrays
+
+def gcp_length_2_partition(gcp_length):
+  part = GTIN_PREFIX_DIGITS - gcp_length
+  if 0 <= part < len(SGTIN_96_PARTITIONS):
+    return part
+  return None
+
+# The GTIN-14 digits the company prefix is matched against (padded and cut like EPCEncoder.with_gtin)
+def gtin_2_key(gtin):
+  return str(gtin)[:14].zfill(14)[1:1 + GTIN_PREFIX_DIGITS]
+
+def gtins_2_keys(gtins):
+  gtins = np.asarray(gtins)
+  if gtins.dtype.kind in 'USO':
+    # Digit strings are cut to 14 characters before they lose their leading zeros
+    gtins = gtins.astype('U14')
+  gtins = as_uint64(gtins)
+  # and ints to their first 14 digits, so a long GTIN keys the same as gtin_2_key
+  cut = gtins >= np.uint64(10 ** 14)
+  while cut.any():
+    gtins[cut] //= np.uint64(10)
+    cut = gtins >= np.uint64(10 ** 14)
+  return (gtins // np.uint64(10)) % np.uint64(10 ** GTIN_PREFIX_DIGITS)
+
+def read_gcp_xml(path):
+  for event, element in ElementTree.iterparse(path):
+    if element.tag.rsplit("}", 1)[-1] == "entry":
+      yield element.get("prefix"), element.get("gcpLength")
+    element.clear()
+
+# One "prefix,length" (or whitespace separated) pair per line, # starts a comment
+def read_gcp_text(lines):
+  for line in lines:
+    line = line.split("#", 1)[0].strip()
+    if line:
+      prefix, gcp_length = re.split(r'[\s,;]+', line)[:2]
+      yield prefix, gcp_length
@@ -10,21 +10,24 @@
 #  If you pass an optional 'num' argument, the return is prepended with zeroes
 #  till the total length of 'num'
 #
+#  Each conversion goes straight through a python int, rather than through an
+#  intermediate string in another base.
+#
 
 def dec_2_bin(dec, num=0):
-  return hex_2_bin(dec_2_hex(dec), num)
+  return f'{int(dec):b}'.zfill(num)
 
 def bin_2_dec(bin, num=0):
-   return hex_2_dec(bin_2_hex(bin), num)
+  return str(int(bin,2)).zfill(num)
 
 def dec_2_hex(dec, num=0):
-  return f'{str(hex(int(dec))[2:].upper()).zfill(num)}'
+  return f'{int(dec):X}'.zfill(num)
 
 def hex_2_dec(hex, num=0):
-  return f'{str(int(hex,16)).zfill(num)}'
+  return str(int(hex,16)).zfill(num)
 
 def bin_2_hex(bin, num=0):
-  return f'{str(hex(int(bin,2))[2:].upper()).zfill(num)}'
+  return f'{int(bin,2):X}'.zfill(num)
 
 def hex_2_bin(hex, num=0):
-  return f'{str(bin(int(hex,16))[2:]).zfill(num)}'
+  return f'{int(hex,16):b}'.zfill(num)
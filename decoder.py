@@ -0,0 +1,262 @@
+#
+#  decoder.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains functions to decode the EPC encodings built by the encoders
+#
+#  Decoding dispatches on the 8 bit header (GID-96 0x35, SGTIN-96 0x30, TCIN-96 0x08
+#  and TIAI-A-96 0x0A) through a table, and returns a dict of the fields along with
+#  the URI form, built the same way as each encoder's *_uri.  There is also a bulk
+#  mode, which splits a whole buffer of concatenated 12 byte EPCs into numpy arrays
+#  of fields without building a python object per EPC.
+#
+#  Note: the bulk mode requires numpy.
+#
+
+import numpy as np
+
+from packer import *
+from lanes import *
+from epc_encoder import calculate_check_digit
+from tiai_codec import *
+
+# Decode an EPC from its hex, bytes or packed integer form
+def decode_hex(epc_hex):
+  return decode_epc(int(epc_hex, 16))
+
+def decode_bytes(epc_bytes):
+  return decode_epc(int.from_bytes(epc_bytes, 'big'))
+
+def decode_epc(epc):
+  decoder = dict_header_2_decoder.get(epc >> 88)
+  if decoder is None:
+    raise ValueError(f'Unsupported EPC header: 0x{epc >> 88:02X}')
+  return decoder(epc)
+
+# Build just the URI form of a packed EPC
+def epc_2_uri(epc):
+  uri = dict_header_2_uri.get(epc >> 88)
+  if uri is None:
+    raise ValueError(f'Unsupported EPC header: 0x{epc >> 88:02X}')
+  return uri(epc)
+
+# GID-96 - e.g. urn:epc:tag:gid-96:04928100.0085702.12345
+#          8 bit header, 28 bit manager, 24 bit object class, 36 bit serial
+def decode_gid_96(epc):
+  return {
+    "scheme": GID_96,
+    "manager": (epc >> 60) & 0xFFFFFFF,
+    "object_class": (epc >> 36) & 0xFFFFFF,
+    "serial": epc & 0xFFFFFFFFF,
+    "uri": gid_96_uri(epc)
+  }
+
+def gid_96_uri(epc):
+  mgr = (epc >> 60) & 0xFFFFFFF
+  itm = (epc >> 36) & 0xFFFFFF
+  return f'urn:epc:tag:gid-96:{mgr:08d}.{itm:07d}.{epc & 0xFFFFFFFFF}'
+
+# SGTIN-96 - e.g. urn:epc:tag:sgtin-96:1.0043935.046062.12345
+#            8 bit header, 3 bit filter, 3 bit partition, 20-40 bit manager,
+#            24-4 bit item, 38 bit serial
+#
+# The GTIN is rebuilt as: first digit of the item + manager + rest of the item + check digit
+def decode_sgtin_96(epc):
+  part = (epc >> 82) & 0x7
+  mgr, mgr_dec_len, itm, itm_dec_len = sgtin_96_company_and_item(epc)
+  mgr_dec = f'{mgr:0{mgr_dec_len}d}'
+  itm_dec = f'{itm:0{itm_dec_len}d}'
+  gtin = itm_dec[0] + mgr_dec + itm_dec[1:]
+
+  return {
+    "scheme": SGTIN_96,
+    "filter": (epc >> 85) & 0x7,
+    "partition": part,
+    "company_prefix": mgr,
+    "item_reference": itm,
+    "serial": epc & 0x3FFFFFFFFF,
+    "gtin": gtin + calculate_check_digit(gtin),
+    "uri": sgtin_96_uri(epc)
+  }
+
+def sgtin_96_uri(epc):
+  mgr, mgr_dec_len, itm, itm_dec_len = sgtin_96_company_and_item(epc)
+  return f'urn:epc:tag:sgtin-96:{(epc >> 85) & 0x7}.{mgr:0{mgr_dec_len}d}.{itm:0{itm_dec_len}d}.{epc & 0x3FFFFFFFFF}'
+
+def sgtin_96_company_and_item(epc):
+  part = (epc >> 82) & 0x7
+  if part >= len(SGTIN_96_PARTITIONS):
+    raise ValueError(f'Invalid SGTIN-96 partition: {part}')
+  mgr_bin_len, mgr_dec_len, itm_bin_len, itm_dec_len = SGTIN_96_PARTITIONS[part]
+  mgr = (epc >> (38 + itm_bin_len)) & ((1 << mgr_bin_len) - 1)
+  itm = (epc >> 38) & ((1 << itm_bin_len) - 1)
+  return mgr, mgr_dec_len, itm, itm_dec_len
+
+# TCIN-96 - e.g. urn:epc:tag:tcin-96:0.13951442.123456789012345
+#           8 bit header, 3 bit filter, 35 bit TCIN, 50 bit serial
+def decode_tcin_96(epc):
+  return {
+    "scheme": TCIN_96,
+    "filter": (epc >> 85) & 0x7,
+    "tcin": (epc >> 50) & 0x7FFFFFFFF,
+    "serial": epc & 0x3FFFFFFFFFFFF,
+    "uri": tcin_96_uri(epc)
+  }
+
+# Leading zeros are stripped, like TCINEncoder does
+def tcin_96_uri(epc):
+  tcin = str((epc >> 50) & 0x7FFFFFFFF).lstrip('0')
+  ser = str(epc & 0x3FFFFFFFFFFFF).lstrip('0')
+  return f'urn:epc:tag:tcin-96:{(epc >> 85) & 0x7}.' + tcin + "." + ser
+
+# TIAI-A-96 - e.g. urn:epc:tag:tiai-a-96:0.17.12345678901234567890
+#             8 bit header, 3 bit filter, 13 bit asset reference, 72 bit asset ID
+#
+# The asset ID may have been encoded as a decimal, hex or 6-bit character code, and
+# there is no way to tell which from the tag.  So all three forms are returned, with
+# 'asset_id_char' set to None if the asset ID isn't a valid 6-bit character code.
+def decode_tiai_a_96(epc):
+  asset_id = epc & 0xFFFFFFFFFFFFFFFFFF
+  return {
+    "scheme": TIAI_A_96,
+    "filter": (epc >> 85) & 0x7,
+    "asset_ref": (epc >> 72) & 0x1FFF,
+    "asset_id": asset_id,
+    "asset_id_dec": str(asset_id).lstrip('0'),
+    "asset_id_hex": f'{asset_id:X}'.lstrip('0'),
+    "asset_id_char": asset_id_2_char(asset_id),
+    "uri": tiai_a_96_uri(epc)
+  }
+
+# Pass an optional form of "dec", "hex" or "char" for the asset ID (default is "dec")
+def tiai_a_96_uri(epc, form="dec"):
+  asset_ref = str((epc >> 72) & 0x1FFF).lstrip('0')
+  asset_id = epc & 0xFFFFFFFFFFFFFFFFFF
+  if form == "hex":
+    asset_id = f'{asset_id:X}'.lstrip('0')
+  elif form == "char":
+    asset_id = asset_id_2_char(asset_id)
+    if asset_id is None:
+      raise ValueError('TIAI-A-96 asset ID is not a 6-bit character code')
+  else:
+    asset_id = str(asset_id).lstrip('0')
+  return f'urn:epc:tag:tiai-a-96:{(epc >> 85) & 0x7}.' + asset_ref + "." + asset_id
+
+# Split the 72 bit asset ID into 12 6-bit characters (see tiai_codec.py), or None
+def asset_id_2_char(asset_id):
+  try:
+    return asset_id_2_chars(asset_id)
+  except ValueError:
+    return None
+
+# Decoders by header
+dict_header_2_decoder = {
+  GID_96_HEADER: decode_gid_96,
+  SGTIN_96_HEADER: decode_sgtin_96,
+  TCIN_96_HEADER: decode_tcin_96,
+  TIAI_A_96_HEADER: decode_tiai_a_96
+}
+
+dict_header_2_uri = {
+  GID_96_HEADER: gid_96_uri,
+  SGTIN_96_HEADER: sgtin_96_uri,
+  TCIN_96_HEADER: tcin_96_uri,
+  TIAI_A_96_HEADER: tiai_a_96_uri
+}
+
+# Bulk mode: decode a buffer of concatenated 12 byte EPCs (bytes, bytearray, memoryview
+# or an (N, 12) uint8 array)
+#
+# Returns a dict keyed by scheme, where each entry is a dict of numpy arrays: 'rows'
+# (the index of each EPC in the buffer) and one array per field.  Any EPCs with a header
+# that isn't supported are listed in the 'rows' of the "unknown" entry.
+def decode_buffer(buf):
+  tags = np.frombuffer(buf, dtype=np.uint8).reshape(-1, EPC_BYTES)
+  hi, lo = tags_2_lanes(tags)
+  headers = hi >> np.uint64(24)
+  known = np.zeros(len(headers), dtype=bool)
+
+  decoded = {}
+  for header, (scheme, decode_lanes) in dict_header_2_lanes.items():
+    match = headers == np.uint64(header)
+    rows = np.flatnonzero(match)
+    if len(rows):
+      known |= match
+      decoded[scheme] = {"rows": rows, **decode_lanes(hi[rows], lo[rows])}
+
+  unknown = np.flatnonzero(~known)
+  if len(unknown):
+    decoded["unknown"] = {"rows": unknown}
+
+  return decoded
+
+def decode_gid_96_lanes(hi, lo):
+  return {
+    "manager": unpack_lanes(hi, lo, 8, GID_96_MANAGER_BITS),
+    "object_class": unpack_lanes(hi, lo, 36, GID_96_OBJECT_BITS),
+    "serial": unpack_lanes(hi, lo, 60, GID_96_SERIAL_BITS)
+  }
+
+def decode_sgtin_96_lanes(hi, lo):
+  part = unpack_lanes(hi, lo, 11, SGTIN_96_PARTITION_BITS)
+  company_item = unpack_lanes(hi, lo, 14, SGTIN_96_COMPANY_ITEM_BITS)
+  itm_bin_len = sgtin_96_item_bits[part]
+  return {
+    "filter": unpack_lanes(hi, lo, 8, SGTIN_96_FILTER_BITS),
+    "partition": part,
+    "company_prefix": company_item >> itm_bin_len,
+    "item_reference": company_item & ((np.uint64(1) << itm_bin_len) - np.uint64(1)),
+    "serial": unpack_lanes(hi, lo, 58, SGTIN_96_SERIAL_BITS)
+  }
+
+# Item bits by partition, where the invalid partition 7 leaves the whole field as the item
+sgtin_96_item_bits = np.array([p[2] for p in SGTIN_96_PARTITIONS] + [SGTIN_96_COMPANY_ITEM_BITS], dtype=np.uint64)
+
+def decode_tcin_96_lanes(hi, lo):
+  return {
+    "filter": unpack_lanes(hi, lo, 8, TCIN_96_FILTER_BITS),
+    "tcin": unpack_lanes(hi, lo, 11, TCIN_96_TCIN_BITS),
+    "serial": unpack_lanes(hi, lo, 46, TCIN_96_SERIAL_BITS)
+  }
+
+# The 72 bit asset ID is split into its top 8 bits and bottom 64 bits
+def decode_tiai_a_96_lanes(hi, lo):
+  return {
+    "filter": unpack_lanes(hi, lo, 8, TIAI_A_96_FILTER_BITS),
+    "asset_ref": unpack_lanes(hi, lo, 11, TIAI_A_96_ASSET_REF_BITS),
+    "asset_id_hi": unpack_lanes(hi, lo, 24, 8),
+    "asset_id_lo": lo.copy()
+  }
+
+# Character of each TIAI 6 bit code, 0 for code 0 (nothing) and 0xFFFFFFFF if the code isn't assigned
+code_2_char_table = np.full(64, 0xFFFFFFFF, dtype=np.uint32)
+code_2_char_table[list(dict_code_2_char)] = [ord(c) if c else 0 for c in dict_code_2_char.values()]
+
+# Use this to decode the (hi, lo) lanes of an array of TIAI asset IDs (asset_id_hi and
+# asset_id_lo from decode_buffer, see tiai_codec.py), returns an array of
+# strings ("" where the asset ID isn't a 6 bit character code) and an array of which
+# asset IDs are character codes
+def asset_id_lanes_2_chars(hi, lo):
+  hi = np.asarray(hi, dtype=np.uint64)
+  lo = np.asarray(lo, dtype=np.uint64)
+  offset = EPC_BITS - 6 * TIAI_ASSET_ID_CHARS
+  codes = np.array([unpack_lanes(hi, lo, offset + 6 * i, 6) for i in range(TIAI_ASSET_ID_CHARS)])
+
+  chars = code_2_char_table[codes.T]
+  valid = ~np.any(chars == 0xFFFFFFFF, axis=1) & (hi >> np.uint64(8) == 0)
+  chars[~valid] = 0
+
+  # Code 0 decodes to nothing, so squeeze out the gaps (keeping the order)
+  order = np.argsort(chars == 0, axis=1, kind='stable')
+  chars = np.ascontiguousarray(np.take_along_axis(chars, order, axis=1))
+  return chars.view(f'U{TIAI_ASSET_ID_CHARS}').reshape(-1), valid
+
+dict_header_2_lanes = {
+  GID_96_HEADER: (GID_96, decode_gid_96_lanes),
+  SGTIN_96_HEADER: (SGTIN_96, decode_sgtin_96_lanes),
+  TCIN_96_HEADER: (TCIN_96, decode_tcin_96_lanes),
+  TIAI_A_96_HEADER: (TIAI_A_96, decode_tiai_a_96_lanes)
+}
@@ -0,0 +1,140 @@
+#
+#  dedup.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  A python class to drop repeated reads from a reader's EPC stream
+#
+#  A portal or handheld reports the same tag hundreds of times a second.  ReadDeduper
+#  passes on the first read of each EPC (or of each EPC on each antenna, with
+#  per_antenna=True), and suppresses every repeat until that first read leaves the
+#  window, which is bounded by time (window seconds), by count (the max_keys most
+#  recently reported EPCs), or both.
+#
+#  The window is an OrderedDict keyed on the packed 96 bit EPC (shifted up past the
+#  antenna, per antenna), holding when the key was reported and how many repeats were
+#  suppressed since.  Keys are only added when reported, so they are in time order, and
+#  expiring is popping from the front: insert and expire are O(1), and the memory is
+#  bounded by the window.  When a key expires, on_expire(epc, antenna, suppressed) is
+#  called, if given.
+#
+#  e.g. deduper = ReadDeduper(window=2.0, per_antenna=True)
+#       decode_buffer(deduper.filter_buffer(raw_reads, antenna=3))
+#
+
+import collections
+import time
+
+from packer import *
+
+ANTENNA_BITS = 16
+
+DedupInfo = collections.namedtuple("DedupInfo", ["reads", "reported", "suppressed", "window_size"])
+
+# read_deduper python class to encapsulate the window of reported reads in an instance
+class ReadDeduper:
+
+  # Pass window=None for a window bounded only by max_keys, or max_keys=None (the
+  # default) for one bounded only by time
+  def __init__(self, window=1.0, max_keys=None, per_antenna=False, on_expire=None, clock=time.monotonic):
+    if window is None and max_keys is None:
+      raise ValueError("The window must be bounded by time, count or both")
+    if max_keys is not None and max_keys < 1:
+      raise ValueError(f'max_keys must be at least 1, not {max_keys}')
+
+    # Instance variables
+    self.window = window
+    self.max_keys = max_keys
+    self.per_antenna = per_antenna
+    self.on_expire = on_expire
+    self.clock = clock
+    self.seen = collections.OrderedDict()
+    self.reads = 0
+    self.reported = 0
+    self.now = None
+
+  def __len__(self):
+    return len(self.seen)
+
+  # Whether this read is the first of its EPC (per antenna) in the window.  epc is a
+  # packed int or its 12 bytes, and timestamp defaults to the clock (timestamps must
+  # not go backwards, any that do are taken as the latest so far)
+  def add(self, epc, antenna=0, timestamp=None):
+    if timestamp is None:
+      timestamp = self.clock()
+    if self.now is None or timestamp > self.now:
+      self.now = timestamp
+    self.expire(self.now)
+
+    key = self.key(epc, antenna)
+    self.reads += 1
+    entry = self.seen.get(key)
+    if entry is not None:
+      entry[1] += 1
+      return False
+
+    self.seen[key] = [self.now, 0]
+    self.reported += 1
+    if self.max_keys is not None and len(self.seen) > self.max_keys:
+      self.pop_oldest()
+    return True
+
+  # The first reads of a stream of (epc, antenna, timestamp) reads, as they arrive
+  def dedup(self, reads):
+    for read in reads:
+      if self.add(*read):
+        yield read
+
+  # The records of a buffer of concatenated 12 byte EPCs (all from one antenna and at
+  # one time) that are first reads, as bytes
+  def filter_buffer(self, buf, antenna=0, timestamp=None):
+    if timestamp is None:
+      timestamp = self.clock()
+    data = memoryview(buf).cast('B')
+    if len(data) % EPC_BYTES:
+      raise ValueError(f'{len(data)} bytes is not a whole number of {EPC_BYTES} byte records')
+    records = [data[offset:offset + EPC_BYTES] for offset in range(0, len(data), EPC_BYTES)]
+    return b''.join(record for record in records if self.add(bytes(record), antenna, timestamp))
+
+  # The repeats of a read suppressed so far, while it is in the window (None once it isn't)
+  def suppressed(self, epc, antenna=0):
+    entry = self.seen.get(self.key(epc, antenna))
+    return None if entry is None else entry[1]
+
+  # Expire every read reported more than window seconds before now
+  def expire(self, now=None):
+    if self.window is None:
+      return
+    if now is None:
+      now = self.clock()
+    cutoff = now - self.window
+    while self.seen:
+      key, (timestamp, suppressed) = next(iter(self.seen.items()))
+      if timestamp > cutoff:
+        break
+      self.pop_oldest()
+
+  # Expire every read, e.g. at the end of a pass
+  def flush(self):
+    while self.seen:
+      self.pop_oldest()
+
+  def info(self):
+    return DedupInfo(self.reads, self.reported, self.reads - self.reported, len(self.seen))
+
+  def key(self, epc, antenna):
+    if not isinstance(epc, int):
+      epc = int.from_bytes(epc, 'big')
+    if self.per_antenna and not 0 <= antenna < 1 << ANTENNA_BITS:
+      raise ValueError(f'Antenna {antenna} is out of range')
+    return (epc << ANTENNA_BITS) | antenna if self.per_antenna else epc
+
+  def pop_oldest(self):
+    key, (timestamp, suppressed) = self.seen.popitem(last=False)
+    if self.on_expire is not None:
+      if self.per_antenna:
+        self.on_expire(key >> ANTENNA_BITS, key & ((1 << ANTENNA_BITS) - 1), suppressed)
+      else:
+        self.on_expire(key, None, suppressed)
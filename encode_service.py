@@ -0,0 +1,298 @@
+#
+#  encode_service.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a local asyncio service that encodes tags for print stations
+#
+#  Each request is one line of JSON over TCP, with the scheme and the same input
+#  columns as a pipeline manifest (see pipeline.py), and an optional "id" and
+#  "fields" (any of hex, uri and bin, default hex and uri):
+#
+#    {"id": 7, "scheme": "tcin", "tcin": "13951442", "ser": "123456789012345"}
+#
+#  and each response is one line of JSON, in the same order as the requests on that
+#  connection (so a client can send many requests without waiting):
+#
+#    {"id": 7, "hex": "0800035387487048860DDF79", "uri": "urn:epc:tag:tcin-96:0.13951442.123456789012345"}
+#
+#  or {"id": 7, "error": "..."} if the request can't be encoded.  {"command": "stats"}
+#  returns the service statistics instead.
+#
+#  Requests from every connection are coalesced into micro batches by a MicroBatcher,
+#  of at most max_batch_size requests, waiting at most max_wait seconds for a batch to
+#  fill, and each batch is encoded in one go with the stateless encode functions.  The
+#  batcher's queue and each connection's requests in flight are bounded, so when the
+#  encoder falls behind, the service stops reading from the sockets and TCP pushes back
+#  on the clients.  The latency of every request is recorded (see stats()).
+#
+#  e.g. rfidencoder> python3 encode_service.py --port 7878 --max-batch-size 256 --max-wait-ms 2
+#
+
+import argparse
+import asyncio
+import collections
+import json
+import time
+
+from pipeline import dict_scheme_2_encoder, OUTPUT_FIELDS
+from instrumentation import Metrics
+
+DEFAULT_FIELDS = ("hex", "uri")
+
+# Latency histogram bucket upper bounds, in seconds (requests wait for a batch, so
+# they take a lot longer than one encode)
+SERVICE_BUCKETS = (1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 1e-1, 1.0)
+
+# Encode a batch of (scheme, row) requests, returning an EncodedTag, or the exception,
+# for each one
+def encode_requests(requests):
+  results = []
+  for scheme, row in requests:
+    try:
+      results.append(dict_scheme_2_encoder[scheme][0](*row))
+    except (ValueError, TypeError, IndexError) as e:
+      results.append(e)
+  return results
+
+# micro_batcher python class to coalesce concurrent requests into batches
+class MicroBatcher:
+
+  # encode_batch takes a list of items and returns a list of results (or exceptions)
+  def __init__(self, encode_batch, max_batch_size=256, max_wait=0.002, max_pending=4096, metrics=None):
+    # Instance variables
+    self.encode_batch = encode_batch
+    self.max_batch_size = max_batch_size
+    self.max_wait = max_wait
+    self.max_pending = max_pending
+    self.metrics = metrics
+    self.queue = None
+    self.task = None
+    self.batch = []
+    self.batches = 0
+    self.items = 0
+
+  def start(self):
+    self.queue = asyncio.Queue(self.max_pending)
+    self.task = asyncio.get_running_loop().create_task(self.run())
+
+  async def stop(self):
+    if self.task is not None:
+      self.task.cancel()
+      try:
+        await self.task
+      except asyncio.CancelledError:
+        pass
+      self.task = None
+    # Fail the requests in the batch that was still filling up, and those still queued
+    stopped = self.batch
+    self.batch = []
+    while self.queue is not None and not self.queue.empty():
+      stopped.append(self.queue.get_nowait())
+    for item, future, enqueued in stopped:
+      if not future.done():
+        future.set_exception(ConnectionAbortedError("Service stopped"))
+
+  def pending(self):
+    return self.queue.qsize() if self.queue is not None else 0
+
+  # Wait for the item's result, waiting first for room in the queue when it is full
+  async def submit(self, item):
+    future = asyncio.get_running_loop().create_future()
+    await self.queue.put((item, future, time.perf_counter()))
+    return await future
+
+  # The batch being filled is kept on the instance, so stop can fail its requests
+  async def run(self):
+    loop = asyncio.get_running_loop()
+    while True:
+      self.batch = [await self.queue.get()]
+      deadline = loop.time() + self.max_wait
+      while len(self.batch) < self.max_batch_size:
+        if not self.queue.empty():
+          self.batch.append(self.queue.get_nowait())
+          continue
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+          break
+        try:
+          self.batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+        except asyncio.TimeoutError:
+          break
+      batch, self.batch = self.batch, []
+      self.run_batch(batch)
+
+  def run_batch(self, batch):
+    start = time.perf_counter()
+    try:
+      results = self.encode_batch([item for item, future, enqueued in batch])
+    except Exception as e:
+      results = [e] * len(batch)
+    if self.metrics is not None:
+      self.metrics.observe_since("batch", start)
+      for item, future, enqueued in batch:
+        self.metrics.observe("queue_wait", start - enqueued)
+    self.batches += 1
+    self.items += len(batch)
+
+    for (item, future, enqueued), result in zip(batch, results):
+      if future.done():
+        continue
+      if isinstance(result, Exception):
+        future.set_exception(result)
+      else:
+        future.set_result(result)
+
+# encode_service python class to encapsulate the server and its statistics in an instance
+class EncodeService:
+
+  def __init__(self, max_batch_size=256, max_wait=0.002, max_pending=4096, max_in_flight=64, latency_window=10000):
+    # Instance variables
+    self.max_in_flight = max_in_flight
+    self.metrics = Metrics(buckets=SERVICE_BUCKETS)
+    self.metrics.enable()
+    self.batcher = MicroBatcher(encode_requests, max_batch_size, max_wait, max_pending, self.metrics)
+    self.latencies = collections.deque(maxlen=latency_window)
+    self.requests = 0
+    self.errors = 0
+    self.server = None
+
+  # Start listening (port 0 picks a free port), returns the port
+  async def start(self, host="127.0.0.1", port=0):
+    self.batcher.start()
+    self.server = await asyncio.start_server(self.handle, host, port)
+    return self.server.sockets[0].getsockname()[1]
+
+  async def stop(self):
+    if self.server is not None:
+      self.server.close()
+      await self.server.wait_closed()
+      self.server = None
+    await self.batcher.stop()
+
+  # One connection: read request lines, and write their responses in order as they finish
+  async def handle(self, reader, writer):
+    responses = asyncio.Queue(self.max_in_flight)
+    writer_task = asyncio.get_running_loop().create_task(self.write_responses(responses, writer))
+    try:
+      async for line in reader:
+        if line.strip():
+          await responses.put(asyncio.ensure_future(self.respond(line)))
+    except ConnectionError:
+      pass
+    finally:
+      await responses.put(None)
+      await writer_task
+      writer.close()
+
+  async def write_responses(self, responses, writer):
+    while True:
+      response = await responses.get()
+      if response is None:
+        return
+      writer.write(await response)
+      try:
+        await writer.drain()
+      except ConnectionError:
+        pass
+
+  # The response line for one request line
+  async def respond(self, line):
+    start = time.perf_counter()
+    response = {}
+    try:
+      request = json.loads(line)
+      if not isinstance(request, dict):
+        raise ValueError("Request must be a JSON object")
+      if "id" in request:
+        response["id"] = request["id"]
+      if request.get("command") == "stats":
+        response["stats"] = self.stats()
+        return json.dumps(response).encode("utf-8") + b'\n'
+      response.update(await self.encode_request(request))
+    except KeyError as e:
+      response["error"] = f'Missing field: {e.args[0]}'
+      self.errors += 1
+    except (ValueError, TypeError, IndexError) as e:
+      response["error"] = str(e)
+      self.errors += 1
+    except ConnectionAbortedError as e:
+      # The service stopped with the request still waiting for a batch
+      response["error"] = str(e)
+      self.errors += 1
+
+    seconds = time.perf_counter() - start
+    self.requests += 1
+    self.latencies.append(seconds)
+    self.metrics.observe("request", seconds)
+    return json.dumps(response).encode("utf-8") + b'\n'
+
+  async def encode_request(self, request):
+    scheme = request.get("scheme")
+    if scheme not in dict_scheme_2_encoder:
+      raise ValueError(f'Unsupported scheme: {scheme}')
+    fields = request.get("fields", DEFAULT_FIELDS)
+    for field in fields:
+      if field not in OUTPUT_FIELDS:
+        raise ValueError(f'Unsupported field: {field}')
+    row = [str(request[column]) for column in dict_scheme_2_encoder[scheme][1]]
+
+    self.metrics.count_encode(scheme)
+    tag = await self.batcher.submit((scheme, row))
+    return {field: getattr(tag, field) for field in fields}
+
+  # Request counts, batch sizes and latency percentiles (of the most recent requests),
+  # plus the histograms of the request, queue wait and batch times
+  def stats(self):
+    latencies = sorted(self.latencies)
+    return {
+      "requests": self.requests,
+      "errors": self.errors,
+      "batches": self.batcher.batches,
+      "mean_batch_size": self.batcher.items / self.batcher.batches if self.batcher.batches else 0.0,
+      "pending": self.batcher.pending(),
+      "latency_ms": {f'p{p}': 1000 * latency_percentile(latencies, p) for p in (50, 90, 99, 100)},
+      "metrics": self.metrics.snapshot()
+    }
+
+# The p'th percentile of an already sorted list (nearest rank)
+def latency_percentile(sorted_values, p):
+  if not sorted_values:
+    return 0.0
+  return sorted_values[max(-(-p * len(sorted_values) // 100), 1) - 1]
+
+async def serve(host="127.0.0.1", port=7878, max_batch_size=256, max_wait=0.002, max_pending=4096,
+                max_in_flight=64, metrics_port=None):
+  service = EncodeService(max_batch_size, max_wait, max_pending, max_in_flight)
+  port = await service.start(host, port)
+  metrics_server = None
+  if metrics_port is not None:
+    metrics_server = service.metrics.serve_prometheus(metrics_port, host)
+  print(f'Encoding on {host}:{port}', flush=True)
+  try:
+    await asyncio.Event().wait()
+  finally:
+    if metrics_server is not None:
+      metrics_server.shutdown()
+    await service.stop()
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Serve the rfid encoders over a local TCP line protocol")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=7878)
+  parser.add_argument("--max-batch-size", type=int, default=256)
+  parser.add_argument("--max-wait-ms", type=float, default=2.0, help="longest wait for a batch to fill")
+  parser.add_argument("--max-pending", type=int, default=4096, help="requests queued before clients are pushed back")
+  parser.add_argument("--max-in-flight", type=int, default=64, help="requests in flight on each connection")
+  parser.add_argument("--metrics-port", type=int, help="serve the latency metrics in Prometheus text format")
+  args = parser.parse_args(argv)
+  try:
+    asyncio.run(serve(args.host, args.port, args.max_batch_size, args.max_wait_ms / 1000, args.max_pending,
+                      args.max_in_flight, args.metrics_port))
+  except KeyboardInterrupt:
+    pass
+
+if __name__ == '__main__':
+  main()
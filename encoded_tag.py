@@ -0,0 +1,106 @@
+#
+#  encoded_tag.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  A python class to hold one encoded tag
+#
+#  An EncodedTag is immutable (its fields are read only properties over slots),
+#  and only holds the packed 96 bit value and its scheme (plus what it needs to
+#  rebuild the encoder's URI).  The hex, binary, URI and bytes forms are each
+#  rendered the first time they are asked for, and kept, so a job that only wants
+#  hex never builds the other strings.
+#
+#  The encode_* functions in epc_encoder, tcin_encoder and tiai_encoder return one
+#  of these, and the encoder classes set their attributes from it.
+#
+
+import time
+
+from packer import *
+from instrumentation import metrics
+
+# encoded_tag python class to encapsulate an encoded tag in an instance
+class EncodedTag:
+  __slots__ = ("_value", "_scheme", "_form", "_uri_prefix", "_uri_serial", "_hex", "_bin", "_uri", "_bytes")
+
+  # The encoders pass the start of the URI and the serial (or asset ID) text, as the
+  # URI keeps them as they were given.  Otherwise the URI is rebuilt from the value,
+  # with the TIAI-A-96 asset ID in the given form ("dec", "hex" or "char").
+  def __init__(self, value, scheme, form=None, uri_prefix=None, uri_serial=""):
+    # Instance variables (read only, through the properties below)
+    self._value = value
+    self._scheme = scheme
+    self._form = form
+    self._uri_prefix = uri_prefix
+    self._uri_serial = uri_serial
+    self._hex = None
+    self._bin = None
+    self._uri = None
+    self._bytes = None
+
+  def __eq__(self, other):
+    if not isinstance(other, EncodedTag):
+      return NotImplemented
+    return self._value == other._value and self._scheme == other._scheme
+
+  def __hash__(self):
+    return hash((self._value, self._scheme))
+
+  def __repr__(self):
+    return f'EncodedTag({self._scheme}, {self.hex})'
+
+  @property
+  def value(self):
+    return self._value
+
+  @property
+  def scheme(self):
+    return self._scheme
+
+  @property
+  def form(self):
+    return self._form
+
+  # Rendered on first use, then cached
+  @property
+  def hex(self):
+    if self._hex is None:
+      self._hex = self.timed("hex", epc_2_hex, self._value) if metrics.enabled else epc_2_hex(self._value)
+    return self._hex
+
+  @property
+  def bin(self):
+    if self._bin is None:
+      self._bin = self.timed("bin", epc_2_bin, self._value) if metrics.enabled else epc_2_bin(self._value)
+    return self._bin
+
+  @property
+  def bytes(self):
+    if self._bytes is None:
+      self._bytes = self.timed("bytes", epc_2_bytes, self._value) if metrics.enabled else epc_2_bytes(self._value)
+    return self._bytes
+
+  @property
+  def uri(self):
+    if self._uri is None:
+      self._uri = self.timed("uri", self.render_uri) if metrics.enabled else self.render_uri()
+    return self._uri
+
+  # Render one form, timing it for the instrumentation (see instrumentation.py)
+  def timed(self, stage, render, *args):
+    start = time.perf_counter()
+    rendered = render(*args)
+    metrics.observe_since(stage, start)
+    return rendered
+
+  def render_uri(self):
+    if self._uri_prefix is not None:
+      return self._uri_prefix + self._uri_serial
+    # Imported here, as the decoder imports the encoders (and numpy)
+    from decoder import epc_2_uri, tiai_a_96_uri
+    if self._scheme == TIAI_A_96 and self._form is not None:
+      return tiai_a_96_uri(self._value, self._form)
+    return epc_2_uri(self._value)
@@ -11,8 +11,18 @@
 #  and encodes it in GS1's GID format, or a GTIN and encodes it in GS1's SGTIN format.
 #  Output available in binary, hex, and URI formats
 #
+#  The encode_* functions below return an immutable EncodedTag, which only renders
+#  the binary, hex and URI forms when they are asked for.  The EPCEncoder class is
+#  kept for its attributes, which it sets from the EncodedTag.
+#
+
+import time
 
 from converter import *
+from packer import *
+from prefix_cache import prefix_cache
+from encoded_tag import EncodedTag
+from instrumentation import metrics
 
 # epc_encoder python class to encapsulate the data in an instance
 class EPCEncoder:
@@ -63,23 +73,10 @@ class EPCEncoder:
     # 36 bits are the serial number (guaranteed 10 digits)
     # = 96 bits
 
-    dpt_cls_dec = "049" + self.dpt + self.cls # Leading zeroes not technically valid...
-    dpt_cls_bin = dec_2_bin(dpt_cls_dec, 28)
-    if len(dpt_cls_bin) > 28:
-      dpt_cls_bin = dpt_cls_bin[-28:]
-    upc = "49" + dpt + cls + itm
-    chk_dgt = calculate_check_digit(upc)
-    itm_chk_dec = "00" + self.itm + chk_dgt # Leading zeroes not technically valid
-    itm_chk_bin = dec_2_bin(itm_chk_dec,24)
-    if len(itm_chk_bin) > 24:
-      itm_chk_bin = itm_chk_bin[-24:]
-    ser_bin = dec_2_bin(self.ser, 36)
-    if len(ser_bin) > 36:
-      ser_bin = ser_bin[-36:]
-
-    self.gid_bin = "00110101" + dpt_cls_bin + itm_chk_bin + ser_bin
-    self.gid_hex = bin_2_hex(self.gid_bin, 24)
-    self.gid_uri = "urn:epc:tag:gid-96:" + dpt_cls_dec + "." + itm_chk_dec + "." + self.ser
+    tag = encode_dpci(dpt, cls, itm, ser)
+    self.gid_bin = tag.bin
+    self.gid_hex = tag.hex
+    self.gid_uri = tag.uri
     
     return self.gid_uri
 
@@ -100,7 +97,6 @@ class EPCEncoder:
     self.gtin = self.gtin.zfill(14)
     if len(self.ser) > 10:
       self.ser = self.ser[0:10]
-    ser = ser.zfill(10)
     
     # GID - e.g. urn:epc:tag:gid-96:4928100.85702.12345
     #            35007850A014EC6000003039
@@ -114,20 +110,20 @@ class EPCEncoder:
     # 36 bits are the serial number (guaranteed 10 digits)
     # = 96 bits
     
-    mgr_dec = self.gtin[0:8]
-    mgr_bin = dec_2_bin(mgr_dec,28) # Note: there will be leading zeroes (not technically valid)
-    
-    # Include the check digit!!
-    itm_dec = self.gtin[8:].zfill(7) # Prepend leading zeroes (not technically valid)
-    itm_bin = dec_2_bin(itm_dec, 24)
-    ser_bin = dec_2_bin(self.ser, 36)
-    
-    self.gid_bin = "00110101" + mgr_bin + itm_bin + ser_bin
-    self.gid_hex = bin_2_hex(self.gid_bin, 24)
-    self.gid_uri = "urn:epc:tag:gid-96:" + mgr_dec + "." + itm_dec + "." + self.ser
+    tag = encode_gtin_in_gid(gtin, ser)
+    self.gid_bin = tag.bin
+    self.gid_hex = tag.hex
+    self.gid_uri = tag.uri
     
     return self.gid_uri
     
+  # Encode with GTIN, looking up the partition in a CompanyPrefixIndex
+  def with_gtin_and_index(self, gtin, ser, prefix_index):
+    part = prefix_index.partition(gtin)
+    if part is None:
+      raise ValueError(f'No GS1 company prefix found for GTIN {gtin}')
+    return self.with_gtin(gtin, ser, f'{part:03b}')
+
   # Encode with GTIN
   def with_gtin(self, gtin, ser, part_bin):
     self.dpt = ""
@@ -139,48 +135,6 @@ class EPCEncoder:
     self.gid_hex = ""
     self.gid_uri = ""
   
-    mgr_gin_len = int(0)
-    mgr_dec_len = int(0)
-    itm_bin_len = int(0)
-    itm_dec_len = int(0)
-    
-    # GS1 Tag Data Standard parition values for SGTIN
-    if part_bin == "000":
-      mgr_bin_len = 40
-      mgr_dec_len = 12
-      itm_bin_len = 4
-      itm_dec_len = 1
-    elif part_bin == "001":
-      mgr_bin_len = 37
-      mgr_dec_len = 11
-      itm_bin_len = 7
-      itm_dec_len = 2
-    elif part_bin == "010":
-      mgr_bin_len = 34
-      mgr_dec_len = 10
-      itm_bin_len = 10
-      itm_dec_len = 3
-    elif part_bin == "011":
-      mgr_bin_len = 30
-      mgr_dec_len = 9
-      itm_bin_len = 14
-      itm_dec_len = 4
-    elif part_bin == "100":
-      mgr_bin_len = 27
-      mgr_dec_len = 8
-      itm_bin_len = 17
-      itm_dec_len = 5
-    elif part_bin == "101":
-      mgr_bin_len = 24
-      mgr_dec_len = 7
-      itm_bin_len = 20
-      itm_dec_len = 6
-    else: #part_bin == "110"
-      mgr_bin_len = 20
-      mgr_dec_len = 6
-      itm_bin_len = 24
-      itm_dec_len = 7
-  
     # Make sure the inputs are not too long (especially the serial number)
     if len(self.gtin) > 14:
       self.gtin = self.gtin[0:14]
@@ -205,39 +159,150 @@ class EPCEncoder:
     # 38 bits are the serial number (guaranteed 11 digits)
     # = 96 bits
     
-    mgr_dec = "0" + self.gtin[2:2+(mgr_dec_len-1)]
-    mgr_bin = dec_2_bin(mgr_dec, mgr_bin_len)
-    
-    # Drop the check digit!!
-    itm_dec = "0" + self.gtin[2+(mgr_dec_len-1):2+(mgr_dec_len-1) + itm_dec_len-1]
-    itm_bin = dec_2_bin(itm_dec, itm_bin_len)
-    
-    ser_bin = dec_2_bin(self.ser, 38)
-    
-    # Make sure none are too long
-    if len(mgr_bin) > mgr_bin_len:
-      mgr_bin = mgr_bin[-mgr_bin_len:]
-    if len(itm_bin) > itm_bin_len:
-      itm_bin = itm_bin[-itm_bin_len:]
-    if len(ser_bin) > 38:
-      ser_bin = ser_bin[-38:]
-    
-    self.gtin_bin = "00110000001" + part_bin + mgr_bin + itm_bin + ser_bin
-    self.gtin_hex = bin_2_hex(self.gtin_bin, 24)
-    self.gtin_uri = "urn:epc:tag:sgtin-96:1." + mgr_dec + "." + itm_dec + "." + self.ser
+    tag = encode_gtin(gtin, ser, part_bin)
+    self.gtin_bin = tag.bin
+    self.gtin_hex = tag.hex
+    self.gtin_uri = tag.uri
 
     return self.gtin_uri
     
   
+# Use this to encode with DPCI, returns an EncodedTag (see EPCEncoder.with_dpci)
+def encode_dpci(dpt, cls, itm, ser):
+  timed = metrics.enabled
+  if timed:
+    count_dpci_inputs(dpt, cls, itm, ser)
+    start = time.perf_counter()
+
+  ser = ser[0:10]
+
+  # Everything but the serial is cached, see dpci_prefix below
+  gid_prefix, uri_prefix = prefix_cache.lookup(dpci_prefix, dpt, cls, itm)
+  tag = EncodedTag(gid_prefix | (int(ser) & GID_96_SERIAL_MASK), GID_96, None, uri_prefix, ser)
+  if timed:
+    metrics.observe_since("pack", start)
+  return tag
+
+# Use this to encode GID with GTIN, returns an EncodedTag (see EPCEncoder.with_gtin_in_gid)
+def encode_gtin_in_gid(gtin, ser):
+  timed = metrics.enabled
+  if timed:
+    count_gtin_inputs(GID_96, gtin, ser, 10)
+    start = time.perf_counter()
+
+  ser = ser[0:10]
+
+  # Everything but the serial is cached, see gtin_in_gid_prefix below
+  gid_prefix, uri_prefix = prefix_cache.lookup(gtin_in_gid_prefix, gtin)
+  tag = EncodedTag(gid_prefix | (int(ser) & GID_96_SERIAL_MASK), GID_96, None, uri_prefix, ser)
+  if timed:
+    metrics.observe_since("pack", start)
+  return tag
+
+# Use this to encode with GTIN, returns an EncodedTag (see EPCEncoder.with_gtin)
+def encode_gtin(gtin, ser, part_bin):
+  timed = metrics.enabled
+  if timed:
+    count_gtin_inputs(SGTIN_96, gtin, ser, 11)
+    start = time.perf_counter()
+
+  ser = ser[0:11]
+
+  # Everything but the serial is cached, see gtin_prefix below
+  sgtin_prefix, uri_prefix = prefix_cache.lookup(gtin_prefix, gtin, part_bin)
+  tag = EncodedTag(sgtin_prefix | (int(ser) & SGTIN_96_SERIAL_MASK), SGTIN_96, None, uri_prefix, ser)
+  if timed:
+    metrics.observe_since("pack", start)
+  return tag
+
+# Use these to write the 12 bytes of a tag straight into a caller's buffer (a
+# bytearray, memoryview, mmap or shared memory) at offset, without building any of
+# the strings or the EncodedTag, returns nothing.  The serial is always in the bottom
+# 64 bits, so it is OR'd into the low word of the cached prefix lanes.
+def encode_dpci_into(buffer, offset, dpt, cls, itm, ser):
+  if metrics.enabled:
+    count_dpci_inputs(dpt, cls, itm, ser)
+  hi, lo = prefix_cache.lookup_lanes(dpci_prefix, (dpt, cls, itm))
+  EPC_STRUCT.pack_into(buffer, offset, hi, lo | (int(ser[0:10]) & GID_96_SERIAL_MASK))
+
+def encode_gtin_in_gid_into(buffer, offset, gtin, ser):
+  if metrics.enabled:
+    count_gtin_inputs(GID_96, gtin, ser, 10)
+  hi, lo = prefix_cache.lookup_lanes(gtin_in_gid_prefix, gtin)
+  EPC_STRUCT.pack_into(buffer, offset, hi, lo | (int(ser[0:10]) & GID_96_SERIAL_MASK))
+
+def encode_gtin_into(buffer, offset, gtin, ser, part_bin):
+  if metrics.enabled:
+    count_gtin_inputs(SGTIN_96, gtin, ser, 11)
+  hi, lo = prefix_cache.lookup_lanes(gtin_prefix, (gtin, part_bin))
+  EPC_STRUCT.pack_into(buffer, offset, hi, lo | (int(ser[0:11]) & SGTIN_96_SERIAL_MASK))
+
+# Count an encode, and any inputs that are truncated or zero filled (see instrumentation.py)
+def count_dpci_inputs(dpt, cls, itm, ser):
+  metrics.count_encode(GID_96)
+  metrics.check_length(GID_96, "dpt", dpt, 3)
+  metrics.check_length(GID_96, "cls", cls, 2)
+  metrics.check_length(GID_96, "itm", itm, 4)
+  metrics.check_length(GID_96, "ser", ser, 10)
+
+def count_gtin_inputs(scheme, gtin, ser, ser_dec_len):
+  metrics.count_encode(scheme)
+  metrics.check_length(scheme, "gtin", gtin, 14, zero_fill=True)
+  metrics.check_length(scheme, "ser", ser, ser_dec_len)
+
 # Quick Check Digit calculator
 def calculate_check_digit(upc):
-  sum_odd = int(0)
-  sum_even = int(0)
-  
-  for index, digit in enumerate(upc):
-    if index % 2 != 0:
-      sum_even += int(digit)
-    else:
-      sum_odd += int(digit)
-    
-  return str((10 - ((3*sum_odd + sum_even)%10))%10)
+  timed = metrics.enabled
+  if timed:
+    start = time.perf_counter()
+
+  sum_odd = sum(map(int, upc[0::2]))
+  sum_even = sum(map(int, upc[1::2]))
+  chk_dgt = str((10 - ((3*sum_odd + sum_even)%10))%10)
+
+  if timed:
+    metrics.observe_since("check_digit", start)
+  return chk_dgt
+
+# Prefixes (everything but the serial) of each encoding, as the packed value and the
+# start of the URI, for the PrefixCache.  These take the same inputs as the methods
+# above, and truncate them the same way.
+
+# GID-96 with DPCI (see with_dpci)
+def dpci_prefix(dpt, cls, itm):
+  dpt_cls_dec = "049" + dpt[0:3] + cls[0:2] # Leading zeroes not technically valid...
+  upc = "49" + dpt + cls + itm
+  chk_dgt = calculate_check_digit(upc)
+  itm_chk_dec = "00" + itm[0:4] + chk_dgt # Leading zeroes not technically valid
+
+  # The packer chops off any leading bits that don't fit in each field
+  gid = pack_gid_96(int(dpt_cls_dec), int(itm_chk_dec), 0)
+  return gid, "urn:epc:tag:gid-96:" + dpt_cls_dec + "." + itm_chk_dec + "."
+
+# GID-96 with GTIN (see with_gtin_in_gid)
+def gtin_in_gid_prefix(gtin):
+  gtin = gtin[0:14].zfill(14)
+  mgr_dec = gtin[0:8] # Note: there will be leading zeroes (not technically valid)
+
+  # Include the check digit!!
+  itm_dec = gtin[8:].zfill(7) # Prepend leading zeroes (not technically valid)
+
+  gid = pack_gid_96(int(mgr_dec), int(itm_dec), 0)
+  return gid, "urn:epc:tag:gid-96:" + mgr_dec + "." + itm_dec + "."
+
+# SGTIN-96 (see with_gtin)
+def gtin_prefix(gtin, part_bin):
+  gtin = gtin[0:14].zfill(14)
+
+  # GS1 Tag Data Standard parition values for SGTIN (anything past "110" is treated as "110")
+  part = int(part_bin, 2)
+  mgr_bin_len, mgr_dec_len, itm_bin_len, itm_dec_len = SGTIN_96_PARTITIONS[min(part, len(SGTIN_96_PARTITIONS) - 1)]
+
+  mgr_dec = "0" + gtin[2:2+(mgr_dec_len-1)]
+
+  # Drop the check digit!!
+  itm_dec = "0" + gtin[2+(mgr_dec_len-1):2+(mgr_dec_len-1) + itm_dec_len-1]
+
+  # The packer chops off any leading bits that don't fit in each field
+  sgtin = pack_sgtin_96(1, part, mgr_bin_len, int(mgr_dec), int(itm_dec), 0)
+  return sgtin, "urn:epc:tag:sgtin-96:1." + mgr_dec + "." + itm_dec + "."
@@ -0,0 +1,193 @@
+#
+#  epc_index.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  A python class to resolve EPC reads back to the tags (and items) they were issued for
+#
+#  The index holds each issued EPC as its two uint64 lanes (see lanes.py), plus a
+#  value for each, e.g. a row in the caller's item table (by default its position in
+#  the batches or archive it was built from).  A read buffer is resolved all at once:
+#
+#   - every EPC gets a 64 bit hash, the low lane XOR'd with a mix of the high lane,
+#     and the index is sorted on that hash, so a lookup is a binary search of plain
+#     uint64s (a search of 12 byte void keys is about 5x slower), followed by a check
+#     of both lanes.  The rare keys that share a hash are kept sorted by EPC next to
+#     each other, and walked one by one
+#   - the reads are sorted before they are searched, so the binary searches walk
+#     through the index in order instead of missing the cache on every read
+#
+#  A second index of the same form is keyed on each EPC with its serial masked off
+#  (the serial field of each scheme, or the whole asset ID of a TIAI), so a read of a
+#  serial that was never issued still resolves to its item with lookup_prefix.
+#
+#  Note: this module requires numpy.
+#
+
+import numpy as np
+
+from packer import *
+from lanes import *
+from batch_serial_generator import mix64_batch
+
+# The bits below the item (the serial field), by header
+dict_header_2_serial_bits = {
+  GID_96_HEADER: GID_96_SERIAL_BITS,
+  SGTIN_96_HEADER: SGTIN_96_SERIAL_BITS,
+  TCIN_96_HEADER: TCIN_96_SERIAL_BITS,
+  TIAI_A_96_HEADER: TIAI_A_96_ASSET_ID_BITS
+}
+
+# Per header masks that keep everything but the serial, in both lanes (unknown headers
+# keep every bit)
+header_2_hi_mask = np.full(256, 0xFFFFFFFF, dtype=np.uint64)
+header_2_lo_mask = np.full(256, 0xFFFFFFFFFFFFFFFF, dtype=np.uint64)
+for header, serial_bits in dict_header_2_serial_bits.items():
+  header_2_hi_mask[header] = 0xFFFFFFFF & ~((1 << max(serial_bits - 64, 0)) - 1)
+  header_2_lo_mask[header] = 0xFFFFFFFFFFFFFFFF & ~((1 << min(serial_bits, 64)) - 1)
+del header, serial_bits
+
+# Mask off the serial of each EPC
+def drop_serials(hi, lo):
+  headers = hi >> np.uint64(24)
+  return hi & header_2_hi_mask[headers], lo & header_2_lo_mask[headers]
+
+def hash_lanes(hi, lo):
+  return lo ^ mix64_batch(hi)
+
+# epc_index python class to encapsulate the sorted lanes and values in an instance
+class EPCIndex:
+
+  # Build from the lanes of the issued EPCs, and a value for each (by default its
+  # position), where a repeated EPC keeps its last value
+  def __init__(self, hi, lo, values=None):
+    hi = np.asarray(hi, dtype=np.uint64)
+    lo = np.asarray(lo, dtype=np.uint64)
+    if values is None:
+      values = np.arange(len(lo), dtype=np.int64)
+    values = np.asarray(values, dtype=np.int64)
+    if not len(hi) == len(lo) == len(values):
+      raise ValueError(f'Expected as many values as EPCs, not {len(values)} for {len(lo)}')
+
+    # Instance variables
+    self.hashes, self.hi, self.lo, self.values = sorted_by_hash(hi, lo, values)
+    # An item resolves to the last tag given for it
+    self.items = sorted_by_hash(*drop_serials(hi, lo), values)
+
+  # Build from an (N, 12) uint8 array of tags, or a buffer of concatenated 12 byte EPCs
+  @classmethod
+  def from_tags(cls, tags, values=None):
+    return cls(*buffer_2_lanes(tags), values)
+
+  @classmethod
+  def from_batches(cls, batches, values=None):
+    tags = [batch.tags for batch in batches]
+    return cls.from_tags(np.concatenate(tags) if tags else np.empty((0, EPC_BYTES), dtype=np.uint8), values)
+
+  # Build from a TagArchive (or the path of one)
+  @classmethod
+  def from_archive(cls, archive, values=None):
+    if isinstance(archive, str):
+      from tag_archive import TagArchive
+      with TagArchive(archive) as opened:
+        return cls(*opened.lanes(), values)
+    return cls(*archive.lanes(), values)
+
+  def __len__(self):
+    return len(self.values)
+
+  # The value of each read (lanes), or default if it was never issued
+  def lookup(self, hi, lo, default=-1):
+    return search_sorted_hashes(self.hashes, self.hi, self.lo, self.values, hi, lo, default)
+
+  # The value of each read in an (N, 12) array or buffer of 12 byte EPCs
+  def lookup_tags(self, tags, default=-1):
+    return self.lookup(*buffer_2_lanes(tags), default)
+
+  # The value of a tag with the same item as each read (any serial), or default
+  def lookup_prefix(self, hi, lo, default=-1):
+    item_hashes, item_hi, item_lo, item_values = self.items
+    return search_sorted_hashes(item_hashes, item_hi, item_lo, item_values, *drop_serials(hi, lo), default)
+
+  # The value of each read, falling back on its item for serials that were never issued,
+  # and how each was resolved: 2 for the EPC itself, 1 for its item, 0 for neither
+  def resolve(self, hi, lo, default=-1):
+    hi = np.asarray(hi, dtype=np.uint64)
+    lo = np.asarray(lo, dtype=np.uint64)
+    values = self.lookup(hi, lo, default)
+    found = np.where(values != default, np.int8(2), np.int8(0))
+    missing = np.flatnonzero(found == 0)
+    if len(missing):
+      item_values = self.lookup_prefix(hi[missing], lo[missing], default)
+      values[missing] = item_values
+      found[missing[item_values != default]] = 1
+    return values, found
+
+  # The value of one packed EPC, or None
+  def get(self, epc):
+    value = self.lookup(np.array([epc >> 64], dtype=np.uint64), np.array([epc & EPC_LO_MASK], dtype=np.uint64))[0]
+    return None if value == -1 else int(value)
+
+# Both lanes of an (N, 12) uint8 array or a buffer of concatenated 12 byte EPCs
+def buffer_2_lanes(tags):
+  if not isinstance(tags, np.ndarray):
+    tags = np.frombuffer(tags, dtype=np.uint8)
+  return tags_2_lanes(tags.reshape(-1, EPC_BYTES))
+
+# Sort the lanes (and values, if given) on the hash of each EPC, with any EPCs that share
+# a hash sorted by EPC (so repeats of an EPC end up side by side) and repeats dropped
+def sorted_by_hash(hi, lo, values=None):
+  hashes = hash_lanes(hi, lo)
+  order = np.argsort(hashes, kind='stable')
+  hashes = hashes[order]
+
+  shared = np.flatnonzero(hashes[1:] == hashes[:-1])
+  if len(shared):
+    rows = np.unique(np.concatenate([shared, shared + 1]))
+    sub = order[rows]
+    order[rows] = sub[np.lexsort((lo[sub], hi[sub], hashes[rows]))]
+
+  hi, lo = hi[order], lo[order]
+  # Keep the last of each repeated EPC (the sorts are stable, so that is the last given)
+  keep = np.ones(len(hashes), dtype=bool)
+  keep[:-1] = (hashes[1:] != hashes[:-1]) | (hi[1:] != hi[:-1]) | (lo[1:] != lo[:-1])
+  if values is None:
+    return hashes[keep], hi[keep], lo[keep]
+  return hashes[keep], hi[keep], lo[keep], values[order][keep]
+
+# Binary search sorted hashes for each read, in sorted order, checking both lanes,
+# returns the position of each read in the index, or -1
+def find_sorted_hashes(hashes, index_hi, index_lo, hi, lo):
+  hi = np.asarray(hi, dtype=np.uint64)
+  lo = np.asarray(lo, dtype=np.uint64)
+  found = np.full(len(lo), -1, dtype=np.int64)
+  if len(hashes) == 0 or len(lo) == 0:
+    return found
+
+  read_hashes = hash_lanes(hi, lo)
+  rows = np.argsort(read_hashes)
+  positions = np.searchsorted(hashes, read_hashes[rows])
+  positions = np.minimum(positions, len(hashes) - 1)
+  matched = (index_hi[positions] == hi[rows]) & (index_lo[positions] == lo[rows])
+  found[rows[matched]] = positions[matched]
+
+  # Reads whose hash is shared with another EPC, walked one by one
+  walk = np.flatnonzero(~matched & (hashes[positions] == read_hashes[rows]))
+  for i in walk:
+    row, position = rows[i], positions[i] + 1
+    while position < len(hashes) and hashes[position] == read_hashes[row]:
+      if index_hi[position] == hi[row] and index_lo[position] == lo[row]:
+        found[row] = position
+        break
+      position += 1
+  return found
+
+# The value of each read in the index, or default
+def search_sorted_hashes(hashes, index_hi, index_lo, index_values, hi, lo, default=-1):
+  found = find_sorted_hashes(hashes, index_hi, index_lo, hi, lo)
+  values = np.full(len(found), default, dtype=np.int64)
+  hits = found >= 0
+  values[hits] = index_values[found[hits]]
+  return values
@@ -0,0 +1,88 @@
+#
+#  gtin_normalizer.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains functions to validate and normalize whole catalogs of GTINs
+#
+#  GTIN-8, UPC-A (GTIN-12), EAN-13 (GTIN-13) and GTIN-14 strings are zero filled
+#  to GTIN-14 and their check digits verified, all at once as an array of digits.
+#  Nothing is raised for a bad GTIN, every row gets a status instead, so a feed can
+#  be checked before it is encoded (EPCEncoder.with_gtin just truncates or zero
+#  fills whatever it is given).
+#
+#  Note: this module requires numpy.
+#
+
+import numpy as np
+
+from epc_encoder import calculate_check_digit
+
+# Row status values
+GTIN_OK = 0
+GTIN_BAD_LENGTH = 1
+GTIN_NOT_NUMERIC = 2
+GTIN_BAD_CHECK_DIGIT = 3
+
+dict_status_2_name = {
+  GTIN_OK: "ok",
+  GTIN_BAD_LENGTH: "bad length",
+  GTIN_NOT_NUMERIC: "not numeric",
+  GTIN_BAD_CHECK_DIGIT: "bad check digit"
+}
+
+GTIN_LENGTHS = (8, 12, 13, 14)
+
+# One character more than a GTIN-14, so anything longer still shows up as too long
+GTIN_WIDTH = 15
+
+# Check digit weights of the first 13 digits of a GTIN-14 (3, 1, 3, ... from the left)
+gtin_14_weights = np.array([3, 1] * 6 + [3], dtype=np.uint32)
+
+# Use this to normalize an array (or list) of GTIN strings, returns an array of
+# GTIN-14 strings ("" where the GTIN isn't valid) and an array of row statuses
+def normalize_gtins(gtins):
+  codes = np.asarray(gtins, dtype=f'U{GTIN_WIDTH}')
+  codes = np.ascontiguousarray(codes).view(np.uint32).reshape(-1, GTIN_WIDTH)
+  num = len(codes)
+
+  # Strings are padded with NULs, and anything below "0" wraps around to a large digit
+  lengths = np.count_nonzero(codes, axis=1)
+  digits = codes - np.uint32(ord("0"))
+  in_string = np.arange(GTIN_WIDTH) < lengths[:, None]
+  numeric = np.all((digits <= 9) | ~in_string, axis=1)
+  good_length = np.isin(lengths, GTIN_LENGTHS)
+
+  # Right align the digits into 14 columns, zero filling on the left
+  columns = np.arange(14) - (14 - lengths[:, None])
+  gtin_14 = np.where(columns >= 0, np.take_along_axis(digits, np.clip(columns, 0, None), axis=1), 0)
+  gtin_14 = np.where(numeric[:, None] & good_length[:, None], gtin_14, 0).astype(np.uint8)
+
+  check_digits = (10 - (gtin_14[:, :13] @ gtin_14_weights) % 10) % 10
+
+  status = np.full(num, GTIN_OK, dtype=np.uint8)
+  status[check_digits != gtin_14[:, 13]] = GTIN_BAD_CHECK_DIGIT
+  status[~numeric] = GTIN_NOT_NUMERIC
+  status[~good_length] = GTIN_BAD_LENGTH
+
+  normalized = (gtin_14 + np.uint8(ord("0"))).view('S14').reshape(num).astype('U14')
+  normalized[status != GTIN_OK] = ""
+  return normalized, status
+
+# Use this to normalize one GTIN string, returns the GTIN-14 ("" if it isn't valid) and its status
+def normalize_gtin(gtin):
+  if len(gtin) not in GTIN_LENGTHS:
+    return "", GTIN_BAD_LENGTH
+  if not (gtin.isascii() and gtin.isdigit()):
+    return "", GTIN_NOT_NUMERIC
+  gtin_14 = gtin.zfill(14)
+  if calculate_check_digit(gtin_14[:13]) != gtin_14[13]:
+    return "", GTIN_BAD_CHECK_DIGIT
+  return gtin_14, GTIN_OK
+
+# Count the rows of each status, by name
+def status_counts(status):
+  counts = np.bincount(status, minlength=len(dict_status_2_name))
+  return {name: int(counts[value]) for value, name in dict_status_2_name.items()}
@@ -0,0 +1,178 @@
+#
+#  instrumentation.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  A python class to collect opt-in metrics from the encoders
+#
+#  Metrics are off by default, and the encoders only check metrics.enabled on each
+#  call, so they cost next to nothing until metrics.enable() is called.  Once enabled:
+#   - every encode_* function (and so every with_* method) counts its scheme
+#   - every input that is silently truncated or zero filled to fit its field is counted
+#     by scheme, field and event ("truncated" or "zero_filled")
+#   - the time spent in each stage goes into a histogram: "serial" (serial number
+#     generation), "check_digit", "pack" (everything but rendering, so mostly packing
+#     the fields), "hex", "bin" and "bytes" (rendering the bits) and "uri"
+#
+#  A snapshot is available as a dict, or as Prometheus text, which can be written
+#  to a file (e.g. for the node exporter's textfile collector) or served over http.
+#
+#  e.g. metrics.enable()
+#       ... encode ...
+#       metrics.write_prometheus("/var/lib/node_exporter/rfid_encoder.prom")
+#
+
+import http.server
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Histogram bucket upper bounds, in seconds (plus +Inf)
+DEFAULT_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3, 1e-2)
+
+TRUNCATED = "truncated"
+ZERO_FILLED = "zero_filled"
+
+# metrics python class to encapsulate the counters and histograms in an instance
+class Metrics:
+
+  def __init__(self, buckets=DEFAULT_BUCKETS):
+    # Instance variables
+    self.enabled = False
+    self.buckets = tuple(buckets)
+    self.lock = threading.Lock()
+    self.encodes = {}
+    self.events = {}
+    self.stages = {}
+
+  def enable(self):
+    self.enabled = True
+
+  def disable(self):
+    self.enabled = False
+
+  def reset(self):
+    with self.lock:
+      self.encodes = {}
+      self.events = {}
+      self.stages = {}
+
+  def count_encode(self, scheme):
+    with self.lock:
+      self.encodes[scheme] = self.encodes.get(scheme, 0) + 1
+
+  def count_event(self, scheme, field, event):
+    key = (scheme, field, event)
+    with self.lock:
+      self.events[key] = self.events.get(key, 0) + 1
+
+  # Count an input that is longer than length (so truncated), or shorter when it is zero filled
+  def check_length(self, scheme, field, value, length, zero_fill=False):
+    if len(value) > length:
+      self.count_event(scheme, field, TRUNCATED)
+    elif zero_fill and len(value) < length:
+      self.count_event(scheme, field, ZERO_FILLED)
+
+  def observe(self, stage, seconds):
+    bucket = bisect_left(self.buckets, seconds)
+    with self.lock:
+      histogram = self.stages.get(stage)
+      if histogram is None:
+        histogram = self.stages[stage] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+      histogram[0][bucket] += 1
+      histogram[1] += seconds
+      histogram[2] += 1
+
+  # Observe the time since start (a time.perf_counter())
+  def observe_since(self, stage, start):
+    self.observe(stage, time.perf_counter() - start)
+
+  # The metrics as a dict, with cumulative histogram buckets keyed by their upper bound
+  def snapshot(self):
+    with self.lock:
+      encodes = dict(self.encodes)
+      events = dict(self.events)
+      stages = {stage: (list(counts), total, count) for stage, (counts, total, count) in self.stages.items()}
+
+    snapshot = {"enabled": self.enabled, "encodes": encodes, "events": {}, "stages": {}}
+    for (scheme, field, event), count in sorted(events.items()):
+      snapshot["events"].setdefault(scheme, {}).setdefault(event, {})[field] = count
+    for stage, (counts, total, count) in sorted(stages.items()):
+      cumulative = 0
+      buckets = {}
+      for bound, bucket_count in zip(self.bucket_labels(), counts):
+        cumulative += bucket_count
+        buckets[bound] = cumulative
+      snapshot["stages"][stage] = {"count": count, "sum": total, "buckets": buckets}
+    return snapshot
+
+  def bucket_labels(self):
+    return [repr(float(bound)) for bound in self.buckets] + ["+Inf"]
+
+  # The metrics in the Prometheus text exposition format
+  def prometheus_text(self, prefix="rfid_encoder"):
+    snapshot = self.snapshot()
+    lines = [f'# HELP {prefix}_encodes_total Tags encoded, by scheme',
+             f'# TYPE {prefix}_encodes_total counter']
+    for scheme, count in sorted(snapshot["encodes"].items()):
+      lines.append(f'{prefix}_encodes_total{{scheme="{scheme}"}} {count}')
+
+    lines += [f'# HELP {prefix}_input_events_total Inputs truncated or zero filled to fit their field',
+              f'# TYPE {prefix}_input_events_total counter']
+    for scheme, events in snapshot["events"].items():
+      for event, fields in events.items():
+        for field, count in fields.items():
+          lines.append(f'{prefix}_input_events_total{{scheme="{scheme}",field="{field}",event="{event}"}} {count}')
+
+    lines += [f'# HELP {prefix}_stage_seconds Time spent in each stage of encoding',
+              f'# TYPE {prefix}_stage_seconds histogram']
+    for stage, histogram in snapshot["stages"].items():
+      for bound, count in histogram["buckets"].items():
+        lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+      lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]!r}')
+      lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+    return "\n".join(lines) + "\n"
+
+  # Write the Prometheus text to a file, replacing it in one step so a scraper never
+  # reads half a file
+  def write_prometheus(self, path):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+      f.write(self.prometheus_text())
+    os.replace(temp_path, path)
+
+  # Serve /metrics (Prometheus text) and /metrics.json (the snapshot) from a background
+  # thread, returns the server (call shutdown() to stop it, port 0 picks a free port)
+  def serve_prometheus(self, port=9464, host="127.0.0.1"):
+    server = http.server.ThreadingHTTPServer((host, port), metrics_handler(self))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def metrics_handler(metrics):
+  class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+      if self.path == "/metrics":
+        body, content_type = metrics.prometheus_text(), "text/plain; version=0.0.4"
+      elif self.path == "/metrics.json":
+        body, content_type = json.dumps(metrics.snapshot()), "application/json"
+      else:
+        self.send_error(404)
+        return
+      body = body.encode("utf-8")
+      self.send_response(200)
+      self.send_header("Content-Type", content_type)
+      self.send_header("Content-Length", str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+    def log_message(self, format, *args):
+      pass
+
+  return MetricsHandler
+
+# The metrics shared by every encoder
+metrics = Metrics()
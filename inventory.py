@@ -0,0 +1,194 @@
+#
+#  inventory.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  A python class to count raw EPC reads by item, reader and antenna for cycle counts
+#
+#  Reads are never decoded into strings.  Each batch of raw 12 byte EPCs is split into
+#  its two uint64 lanes, classified by header, and the serial free item of each read is
+#  pulled out with bit masks:
+#
+#    tcin     TCIN-96, the 35 bit TCIN
+#    dpci     GID-96 with a 049 + department + class manager (see EPCEncoder.with_dpci),
+#             the manager and object class
+#    gid      any other GID-96, the manager and object class
+#    gtin     SGTIN-96, the partition, company prefix and item reference (not the filter)
+#    tiai     TIAI-A-96, the asset reference
+#    unknown  any other header, the header
+#
+#  Each read's kind and item make one uint64 key, and its reader and antenna another,
+#  and the counts of each (key, location) pair are a numpy group by (unique, then
+#  bincount).  Each batch is grouped on its own and merged into the running totals, so
+#  the totals only ever hold one row per item per antenna, whatever the number of reads.
+#  The items are only rendered (as a TCIN, DPCI, GTIN-14 etc.) for the report.
+#
+#  e.g. inventory = Inventory()
+#       inventory.add(raw_reads, reader=7, antenna=antennas)
+#       inventory.counts("tcin"), inventory.rows("dpci", by="reader")
+#
+#  Note: this module requires numpy.
+#
+
+import numpy as np
+
+from packer import *
+from lanes import *
+from decoder import decode_sgtin_96
+from epc_index import buffer_2_lanes
+
+KINDS = ["tcin", "dpci", "gid", "gtin", "tiai", "unknown"]
+dict_kind_2_code = {kind: code for code, kind in enumerate(KINDS)}
+
+# The kind takes the top byte of each key, above up to 52 bits of item
+KIND_SHIFT = np.uint64(56)
+ITEM_MASK = np.uint64((1 << 56) - 1)
+ANTENNA_BITS = 16
+
+# DPCI managers are 049 + 3 digit department + 2 digit class
+DPCI_MANAGER_PREFIX = 49
+DPCI_MANAGER_DIGITS = 5
+
+BY_FIELDS = ("item", "reader", "antenna")
+
+# The kind and item key of each read (see above)
+def classify(hi, lo):
+  headers = hi >> np.uint64(24)
+  kinds = np.full(len(lo), dict_kind_2_code["unknown"], dtype=np.uint64)
+  items = headers.copy()
+
+  def set_kind(match, kind, offset, num):
+    rows = np.flatnonzero(match)
+    kinds[rows] = dict_kind_2_code[kind]
+    items[rows] = unpack_lanes(hi[rows], lo[rows], offset, num)
+
+  set_kind(headers == TCIN_96_HEADER, "tcin", 11, TCIN_96_TCIN_BITS)
+  set_kind(headers == SGTIN_96_HEADER, "gtin", 11, SGTIN_96_PARTITION_BITS + SGTIN_96_COMPANY_ITEM_BITS)
+  set_kind(headers == TIAI_A_96_HEADER, "tiai", 11, TIAI_A_96_ASSET_REF_BITS)
+
+  gid = headers == GID_96_HEADER
+  managers = unpack_lanes(hi, lo, 8, GID_96_MANAGER_BITS)
+  dpci = gid & (managers // np.uint64(10 ** DPCI_MANAGER_DIGITS) == DPCI_MANAGER_PREFIX)
+  set_kind(dpci, "dpci", 8, GID_96_MANAGER_BITS + GID_96_OBJECT_BITS)
+  set_kind(gid & ~dpci, "gid", 8, GID_96_MANAGER_BITS + GID_96_OBJECT_BITS)
+  return kinds, items
+
+# Sum the weights of each (key, location) pair, returns the unique pairs and their sums
+def group_counts(keys, locations, weights=None):
+  if len(keys) == 0:
+    return keys, locations, np.zeros(0, dtype=np.int64)
+  unique_keys, key_rows = np.unique(keys, return_inverse=True)
+  unique_locations, location_rows = np.unique(locations, return_inverse=True)
+  pairs = key_rows.astype(np.int64) * len(unique_locations) + location_rows
+  unique_pairs, pair_rows = np.unique(pairs, return_inverse=True)
+  counts = np.bincount(pair_rows, weights=weights, minlength=len(unique_pairs)).astype(np.int64)
+  return unique_keys[unique_pairs // len(unique_locations)], unique_locations[unique_pairs % len(unique_locations)], counts
+
+# inventory python class to encapsulate the running counts in an instance
+class Inventory:
+
+  def __init__(self):
+    # Instance variables
+    self.keys = np.empty(0, dtype=np.uint64)
+    self.locations = np.empty(0, dtype=np.uint64)
+    self.totals = np.empty(0, dtype=np.int64)
+    self.reads = 0
+
+  def __len__(self):
+    return len(self.totals)
+
+  # Count a batch of reads: an (N, 12) uint8 array or a buffer of concatenated 12 byte
+  # EPCs, where reader and antenna are a number for the whole batch or an array per read
+  def add(self, tags, reader=0, antenna=0):
+    hi, lo = buffer_2_lanes(tags)
+    if len(lo) == 0:
+      return
+    kinds, items = classify(hi, lo)
+    keys = (kinds << KIND_SHIFT) | items
+    readers = location_values(reader, 64 - ANTENNA_BITS, "Reader", len(lo))
+    antennas = location_values(antenna, ANTENNA_BITS, "Antenna", len(lo))
+    locations = (readers << np.uint64(ANTENNA_BITS)) | antennas
+    self.merge_counts(*group_counts(keys, locations))
+    self.reads += len(lo)
+
+  # Add the counts of another inventory, e.g. one counted in another process
+  def merge(self, other):
+    self.merge_counts(other.keys, other.locations, other.totals)
+    self.reads += other.reads
+
+  def merge_counts(self, keys, locations, totals):
+    if len(self.totals) == 0:
+      self.keys, self.locations, self.totals = keys, locations, totals
+      return
+    self.keys, self.locations, self.totals = group_counts(np.concatenate([self.keys, keys]),
+                                                          np.concatenate([self.locations, locations]),
+                                                          np.concatenate([self.totals, totals]))
+
+  # The unique items of one kind, their readers and antennas and counts, as arrays,
+  # summed over the readers and antennas left out of by
+  def group(self, kind, by=BY_FIELDS):
+    for field in by:
+      if field not in BY_FIELDS:
+        raise ValueError(f'Unsupported group by: {field}')
+    if kind not in dict_kind_2_code:
+      raise ValueError(f'Unsupported kind: {kind}')
+    rows = np.flatnonzero(self.keys >> KIND_SHIFT == dict_kind_2_code[kind])
+    keys = self.keys[rows] & ITEM_MASK
+    locations = self.locations[rows]
+    readers = locations >> np.uint64(ANTENNA_BITS)
+    antennas = locations & np.uint64((1 << ANTENNA_BITS) - 1)
+    if "antenna" not in by:
+      antennas = np.zeros_like(antennas)
+    if "reader" not in by:
+      readers = np.zeros_like(readers)
+    if "item" not in by:
+      keys = np.zeros_like(keys)
+    keys, locations, counts = group_counts(keys, (readers << np.uint64(ANTENNA_BITS)) | antennas, self.totals[rows])
+    return keys, locations >> np.uint64(ANTENNA_BITS), locations & np.uint64((1 << ANTENNA_BITS) - 1), counts
+
+  # Total reads of each item of one kind, keyed by its label
+  def counts(self, kind):
+    keys, readers, antennas, counts = self.group(kind, ("item",))
+    return {item_label(kind, key): int(count) for key, count in zip(keys.tolist(), counts.tolist())}
+
+  # (item, reader, antenna, count) rows of one kind, broken down by item and by reader,
+  # or by reader and antenna (the default)
+  def rows(self, kind, by="antenna"):
+    by = {"item": ("item",), "reader": ("item", "reader"), "antenna": BY_FIELDS}.get(by, (by,))
+    keys, readers, antennas, counts = self.group(kind, by)
+    return [(item_label(kind, key), reader if "reader" in by else None, antenna if "antenna" in by else None, count)
+            for key, reader, antenna, count in zip(keys.tolist(), readers.tolist(), antennas.tolist(), counts.tolist())]
+
+  # Total reads of each kind
+  def kind_counts(self):
+    totals = np.bincount((self.keys >> KIND_SHIFT).astype(np.int64), weights=self.totals, minlength=len(KINDS))
+    return {kind: int(total) for kind, total in zip(KINDS, totals) if total}
+
+# A reader or antenna number (or array of them) for every read, as uint64, checking it
+# fits in its bits of the location like ReadDeduper.key
+def location_values(values, bits, name, n):
+  values = np.asarray(values)
+  if values.size and (values.min() < 0 or values.max() >= 1 << bits):
+    bad = values.min() if values.min() < 0 else values.max()
+    raise ValueError(f'{name} {bad} is out of range')
+  return np.broadcast_to(values.astype(np.uint64), n)
+
+# Render an item key (see classify) the way its encoder takes it
+def item_label(kind, key):
+  if kind == "tcin":
+    return str(key)
+  elif kind == "dpci":
+    mgr, obj = key >> GID_96_OBJECT_BITS, key & ((1 << GID_96_OBJECT_BITS) - 1)
+    return f'{(mgr // 100) % 1000:03d}-{mgr % 100:02d}-{obj // 10:04d}'
+  elif kind == "gid":
+    return f'{key >> GID_96_OBJECT_BITS:08d}.{key & ((1 << GID_96_OBJECT_BITS) - 1):07d}'
+  elif kind == "gtin":
+    try:
+      return decode_sgtin_96((SGTIN_96_HEADER << 88) | (key << SGTIN_96_SERIAL_BITS))["gtin"]
+    except ValueError:
+      return f'partition-{key >> SGTIN_96_COMPANY_ITEM_BITS}.{key & ((1 << SGTIN_96_COMPANY_ITEM_BITS) - 1)}'
+  elif kind == "tiai":
+    return str(key)
+  return f'0x{key:02X}'
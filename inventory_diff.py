@@ -0,0 +1,131 @@
+#
+#  inventory_diff.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains functions to reconcile the tags shipped to a store with the reads there
+#
+#  The expected EPCs (archives of issued tags, see tag_archive.py, or batches) and the
+#  observed EPCs (raw reads, repeats and all) are each held as two uint64 lanes and
+#  sorted on the same 64 bit hash as epc_index.py, with repeats dropped.  Then one bulk
+#  binary search of the observed EPCs in the expected ones splits them into matched
+#  and unexpected, and the expected EPCs that weren't hit are the missing ones.  That
+#  is three uint64s (24 bytes) per EPC, plus the sort, so 50M expected tags against
+#  40M reads fits in a few GB, and takes seconds rather than minutes.
+#
+#  The sets come back as lanes in hash order (lanes_2_tags turns them into tags), and
+#  the rollup counts them per item (see inventory.py), e.g. per TCIN:
+#
+#    ("tcin", "13951442", expected, matched, missing, unexpected)
+#
+#  e.g. diff = diff_inventory(["shipped-1.epc", "shipped-2.epc"], raw_reads)
+#       diff.counts(), diff.tags("missing"), diff.rollup("tcin")
+#
+#  Note: this module requires numpy.
+#
+
+import numpy as np
+
+from packer import *
+from lanes import *
+from epc_index import sorted_by_hash, find_sorted_hashes, buffer_2_lanes
+from inventory import KINDS, KIND_SHIFT, ITEM_MASK, dict_kind_2_code, classify, item_label
+
+SETS = ("matched", "missing", "unexpected")
+
+# Both lanes of every EPC in a source, or a list of sources: a TagArchive or the path
+# of one, a TagBatch, an (N, 12) uint8 array or a buffer of concatenated 12 byte EPCs
+def source_lanes(sources):
+  if not isinstance(sources, (list, tuple)):
+    sources = [sources]
+  his, los = [np.empty(0, dtype=np.uint64)], [np.empty(0, dtype=np.uint64)]
+  for source in sources:
+    if isinstance(source, str):
+      from tag_archive import TagArchive
+      with TagArchive(source) as archive:
+        hi, lo = archive.lanes()
+    elif hasattr(source, "lanes"):
+      hi, lo = source.lanes()
+    else:
+      hi, lo = buffer_2_lanes(source)
+    his.append(hi)
+    los.append(lo)
+  return np.concatenate(his), np.concatenate(los)
+
+# inventory_diff python class to encapsulate the matched, missing and unexpected EPCs in an instance
+class InventoryDiff:
+
+  def __init__(self, matched, missing, unexpected, reads):
+    # Instance variables
+    self.sets = {"matched": matched, "missing": missing, "unexpected": unexpected}
+    self.reads = reads
+
+  # Both lanes of one set
+  def lanes(self, name):
+    if name not in self.sets:
+      raise ValueError(f'Unsupported set: {name}')
+    return self.sets[name]
+
+  # One set as an (N, 12) uint8 array of tags
+  def tags(self, name):
+    return lanes_2_tags(*self.lanes(name))
+
+  # One set as packed ints (small sets only)
+  def values(self, name):
+    hi, lo = self.lanes(name)
+    return {(h << 64) | l for h, l in zip(hi.tolist(), lo.tolist())}
+
+  # The size of each set, plus the expected and observed (unique) EPCs and raw reads
+  def counts(self):
+    counts = {name: len(lo) for name, (hi, lo) in self.sets.items()}
+    counts["expected"] = counts["matched"] + counts["missing"]
+    counts["observed"] = counts["matched"] + counts["unexpected"]
+    counts["reads"] = self.reads
+    return counts
+
+  # (kind, item, expected, matched, missing, unexpected) for each item, of one kind or
+  # all of them, in key order
+  def rollup(self, kind=None):
+    if kind is not None and kind not in dict_kind_2_code:
+      raise ValueError(f'Unsupported kind: {kind}')
+    keys = {}
+    for name in SETS:
+      kinds, items = classify(*self.sets[name])
+      keys[name] = (kinds << KIND_SHIFT) | items
+      if kind is not None:
+        keys[name] = keys[name][kinds == dict_kind_2_code[kind]]
+
+    unique = np.unique(np.concatenate([keys[name] for name in SETS]))
+    columns = {}
+    for name in SETS:
+      set_keys, counts = np.unique(keys[name], return_counts=True)
+      columns[name] = np.zeros(len(unique), dtype=np.int64)
+      columns[name][np.searchsorted(unique, set_keys)] = counts
+
+    rows = []
+    for i, key in enumerate(unique.tolist()):
+      kind_name = KINDS[key >> int(KIND_SHIFT)]
+      matched, missing, unexpected = (int(columns[name][i]) for name in SETS)
+      rows.append((kind_name, item_label(kind_name, key & int(ITEM_MASK)), matched + missing, matched, missing, unexpected))
+    return rows
+
+# Diff the expected EPCs against the observed ones (see source_lanes for both)
+def diff_inventory(expected, observed):
+  return diff_lanes(*source_lanes(expected), *source_lanes(observed))
+
+def diff_lanes(expected_hi, expected_lo, observed_hi, observed_lo):
+  reads = len(observed_lo)
+  hashes, expected_hi, expected_lo = sorted_by_hash(np.asarray(expected_hi, dtype=np.uint64),
+                                                    np.asarray(expected_lo, dtype=np.uint64))
+  observed_hi, observed_lo = sorted_by_hash(np.asarray(observed_hi, dtype=np.uint64),
+                                            np.asarray(observed_lo, dtype=np.uint64))[1:]
+
+  found = find_sorted_hashes(hashes, expected_hi, expected_lo, observed_hi, observed_lo)
+  matched = found >= 0
+  hit = np.zeros(len(hashes), dtype=bool)
+  hit[found[matched]] = True
+  return InventoryDiff((observed_hi[matched], observed_lo[matched]),
+                       (expected_hi[~hit], expected_lo[~hit]),
+                       (observed_hi[~matched], observed_lo[~matched]), reads)
@@ -0,0 +1,94 @@
+#
+#  lanes.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains functions to work on arrays of EPCs with numpy
+#
+#  A 96 bit EPC doesn't fit in any numpy integer, so arrays of EPCs are held as two
+#  uint64 lanes: 'hi' with the top 32 bits of each EPC and 'lo' with the bottom 64.
+#  Tags themselves are laid out as an (N, 12) uint8 array of big endian bytes.
+#
+#  Note: this module requires numpy.
+#
+
+import numpy as np
+
+from packer import *
+
+# A 12 byte big endian EPC, viewed as its top 32 bits and bottom 64 bits
+EPC_DTYPE = np.dtype([('hi', '>u4'), ('lo', '>u8')])
+
+# Convert a sequence of ints or decimal strings to a uint64 array
+def as_uint64(values):
+  values = np.asarray(values)
+  if values.dtype.kind == 'U' and values.ndim == 1:
+    parsed = digits_2_uint64(values)
+    if parsed is not None:
+      return parsed
+  return values.astype(np.uint64)
+
+# Parse an array of strings of plain decimal digits a column of characters at a time,
+# which is several times faster than numpy's own conversion.  Returns None for anything
+# else (signs, spaces, empty strings or more than 19 digits), which is left to numpy.
+def digits_2_uint64(values):
+  width = values.dtype.itemsize // 4
+  if not 0 < width <= 19:
+    return None
+  chars = np.ascontiguousarray(values).view(np.uint32).reshape(-1, width)
+  # Strings are left aligned and padded with NULs
+  padding = chars == 0
+  digits = chars - np.uint32(ord('0'))
+  if not ((digits < 10) | padding).all() or padding[:, 0].any() or (padding[:, :-1] & ~padding[:, 1:]).any():
+    return None
+
+  parsed = np.zeros(len(chars), dtype=np.uint64)
+  for column in range(width):
+    parsed = np.where(padding[:, column], parsed, parsed * np.uint64(10) + digits[:, column])
+  return parsed
+
+# Pack a list of (values, bit length) fields, most significant first, into the two
+# uint64 lanes of n EPCs.  Values may be arrays or a constant for every row, and any
+# field that is too long is truncated to its lowest bits.
+def pack_lanes(fields, n):
+  hi = np.zeros(n, dtype=np.uint64)
+  lo = np.zeros(n, dtype=np.uint64)
+  shift = EPC_BITS
+
+  for values, num in fields:
+    values = np.asarray(values, dtype=np.uint64) & np.uint64((1 << num) - 1)
+    shift -= num
+    if shift >= 64:
+      hi |= values << np.uint64(shift - 64)
+    elif shift + num <= 64:
+      lo |= values << np.uint64(shift)
+    else:
+      # The field straddles the two lanes
+      lo |= values << np.uint64(shift)
+      hi |= values >> np.uint64(64 - shift)
+
+  return hi, lo
+
+# Extract a field of num bits, which starts at bit offset (from the top of the EPC)
+def unpack_lanes(hi, lo, offset, num):
+  shift = EPC_BITS - offset - num
+  mask = np.uint64((1 << num) - 1)
+  if shift >= 64:
+    return (hi >> np.uint64(shift - 64)) & mask
+  elif shift + num <= 64:
+    return (lo >> np.uint64(shift)) & mask
+  else:
+    return ((hi << np.uint64(64 - shift)) | (lo >> np.uint64(shift))) & mask
+
+# Convert between the two uint64 lanes and an (N, 12) uint8 array of tags
+def lanes_2_tags(hi, lo):
+  epcs = np.empty(len(lo), dtype=EPC_DTYPE)
+  epcs['hi'] = hi
+  epcs['lo'] = lo
+  return epcs.view(np.uint8).reshape(len(lo), EPC_BYTES)
+
+def tags_2_lanes(tags):
+  epcs = np.ascontiguousarray(tags, dtype=np.uint8).view(EPC_DTYPE).reshape(-1)
+  return epcs['hi'].astype(np.uint64), epcs['lo'].astype(np.uint64)
@@ -0,0 +1,132 @@
+#
+#  packer.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains functions to pack EPC fields into a single 96 bit integer
+#
+#  Each field is shifted into place and OR'd onto a python int, and the bytes, hex
+#  and binary forms of the tag are all rendered from that one value.  Any field that
+#  is too long is truncated to its lowest bits, the same way the encoders always have.
+#
+
+import struct
+
+# Sizes of an EPC
+EPC_BITS = 96
+EPC_BYTES = 12
+
+# A packed EPC as 12 big endian bytes: the top 32 bits, then the bottom 64
+EPC_STRUCT = struct.Struct('>IQ')
+EPC_LO_MASK = (1 << 64) - 1
+
+# Scheme names, as they appear in the URI forms
+GID_96 = "gid-96"
+SGTIN_96 = "sgtin-96"
+TCIN_96 = "tcin-96"
+TIAI_A_96 = "tiai-a-96"
+
+# 8 bit headers for each scheme
+GID_96_HEADER = 0x35
+SGTIN_96_HEADER = 0x30
+TCIN_96_HEADER = 0x08
+TIAI_A_96_HEADER = 0x0A
+
+# Field lengths (in bits) for each scheme
+GID_96_MANAGER_BITS = 28
+GID_96_OBJECT_BITS = 24
+GID_96_SERIAL_BITS = 36
+
+SGTIN_96_FILTER_BITS = 3
+SGTIN_96_PARTITION_BITS = 3
+SGTIN_96_COMPANY_ITEM_BITS = 44
+SGTIN_96_SERIAL_BITS = 38
+
+# GS1 Tag Data Standard partition values for SGTIN, indexed by partition:
+# (manager bits, manager digits, item bits, item digits)
+SGTIN_96_PARTITIONS = [
+  (40, 12, 4, 1),
+  (37, 11, 7, 2),
+  (34, 10, 10, 3),
+  (30, 9, 14, 4),
+  (27, 8, 17, 5),
+  (24, 7, 20, 6),
+  (20, 6, 24, 7)
+]
+
+TCIN_96_FILTER_BITS = 3
+TCIN_96_TCIN_BITS = 35
+TCIN_96_SERIAL_BITS = 50
+
+TIAI_A_96_FILTER_BITS = 3
+TIAI_A_96_ASSET_REF_BITS = 13
+TIAI_A_96_ASSET_ID_BITS = 72
+
+# Serial field masks, to OR a serial onto a packed prefix
+GID_96_SERIAL_MASK = (1 << GID_96_SERIAL_BITS) - 1
+SGTIN_96_SERIAL_MASK = (1 << SGTIN_96_SERIAL_BITS) - 1
+TCIN_96_SERIAL_MASK = (1 << TCIN_96_SERIAL_BITS) - 1
+
+# Serial field width (in bits) for each scheme
+dict_scheme_2_serial_bits = {
+  GID_96: GID_96_SERIAL_BITS,
+  SGTIN_96: SGTIN_96_SERIAL_BITS,
+  TCIN_96: TCIN_96_SERIAL_BITS
+}
+
+# Number of serials each scheme can hold: the serial field's bit width, capped by the
+# number of decimal digits the encoders keep from a serial string (10, 11 and 15)
+dict_scheme_2_serial_limit = {
+  GID_96: min(1 << GID_96_SERIAL_BITS, 10 ** 10),
+  SGTIN_96: min(1 << SGTIN_96_SERIAL_BITS, 10 ** 11),
+  TCIN_96: min(1 << TCIN_96_SERIAL_BITS, 10 ** 15)
+}
+
+# GID-96: 8 bit header, 28 bit manager, 24 bit object class, 36 bit serial
+def pack_gid_96(mgr, itm, ser):
+  return ((GID_96_HEADER << 88)
+          | ((mgr & 0xFFFFFFF) << 60)
+          | ((itm & 0xFFFFFF) << 36)
+          | (ser & 0xFFFFFFFFF))
+
+# SGTIN-96: 8 bit header, 3 bit filter, 3 bit partition, 20-40 bit manager,
+# 24-4 bit item (manager + item = 44 bits), 38 bit serial
+def pack_sgtin_96(fltr, part, mgr_bin_len, mgr, itm, ser):
+  itm_bin_len = SGTIN_96_COMPANY_ITEM_BITS - mgr_bin_len
+  return ((SGTIN_96_HEADER << 88)
+          | ((fltr & 0x7) << 85)
+          | ((part & 0x7) << 82)
+          | ((mgr & ((1 << mgr_bin_len) - 1)) << (38 + itm_bin_len))
+          | ((itm & ((1 << itm_bin_len) - 1)) << 38)
+          | (ser & 0x3FFFFFFFFF))
+
+# TCIN-96: 8 bit header, 3 bit filter, 35 bit TCIN, 50 bit serial
+def pack_tcin_96(fltr, tcin, ser):
+  return ((TCIN_96_HEADER << 88)
+          | ((fltr & 0x7) << 85)
+          | ((tcin & 0x7FFFFFFFF) << 50)
+          | (ser & 0x3FFFFFFFFFFFF))
+
+# TIAI-A-96: 8 bit header, 3 bit filter, 13 bit asset reference, 72 bit asset ID
+def pack_tiai_a_96(fltr, asset_ref, asset_id):
+  return ((TIAI_A_96_HEADER << 88)
+          | ((fltr & 0x7) << 85)
+          | ((asset_ref & 0x1FFF) << 72)
+          | (asset_id & 0xFFFFFFFFFFFFFFFFFF))
+
+# Render a packed EPC as 12 bytes, 24 hex digits or 96 bits
+def epc_2_bytes(epc):
+  return epc.to_bytes(EPC_BYTES, 'big')
+
+def epc_2_hex(epc):
+  return f'{epc:024X}'
+
+def epc_2_bin(epc):
+  return f'{epc:096b}'
+
+# Write a packed EPC's 12 bytes straight into a buffer (a bytearray, memoryview, mmap
+# or shared memory), without building a bytes object
+def pack_epc_into(buffer, offset, epc):
+  EPC_STRUCT.pack_into(buffer, offset, epc >> 64, epc & EPC_LO_MASK)
@@ -0,0 +1,161 @@
+#
+#  parallel.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains functions to spread bulk encoding across a pool of processes
+#
+#  Encoding is pure CPU work, so one process is capped at one core by the GIL.  Here
+#  the input is cut into chunks, and each chunk goes to a ProcessPoolExecutor worker
+#  in one message.  For manifests, the workers are sent the raw input lines and send
+#  back the formatted output text, so the parent only has to split lines and write
+#  text.  Only a bounded window of chunks is ever in flight, and results are always
+#  yielded in input order.  A WorkerReport tracks the throughput of each worker.
+#
+#  e.g. rfidencoder> python3 parallel.py dpci --input manifest.csv --output tags.csv --workers 32
+#
+#  Note: manifest lines are split on newlines, so CSV fields can't contain quoted newlines.
+#
+
+import collections
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from pipeline import *
+
+# Tracks the chunks, rows and busy time of each worker process
+class WorkerReport:
+
+  def __init__(self):
+    # Instance variables
+    self.workers = {}
+
+  def add(self, pid, rows, seconds):
+    chunks, total_rows, total_seconds = self.workers.get(pid, (0, 0, 0.0))
+    self.workers[pid] = (chunks + 1, total_rows + rows, total_seconds + seconds)
+
+  def snapshot(self):
+    return {
+      pid: {
+        "chunks": chunks,
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds if seconds > 0 else 0.0
+      }
+      for pid, (chunks, rows, seconds) in self.workers.items()
+    }
+
+# Run in the workers: encode a chunk of rows, timing it
+def encode_chunk_in_worker(scheme, chunk, fields=OUTPUT_FIELDS):
+  start = time.perf_counter()
+  encoded = encode_chunk(scheme, chunk, fields)
+  return os.getpid(), len(encoded), time.perf_counter() - start, encoded
+
+# Run in the workers: parse, encode and format a chunk of raw manifest lines, timing it
+def encode_lines_in_worker(scheme, in_format, header, lines, out_format, fields):
+  start = time.perf_counter()
+  columns = dict_scheme_2_encoder[scheme][1]
+  if in_format == "ndjson":
+    rows = [json.loads(line) for line in lines if line.strip()]
+    values = [[str(row[column]) for column in columns] for row in rows]
+  else:
+    indexes = [header.index(column) for column in columns]
+    values = [[row[i] for i in indexes] for row in csv.reader(lines) if row]
+  encoded = encode_values(scheme, values, fields)
+  text = format_chunk(encoded, out_format, fields)
+  return os.getpid(), len(encoded), time.perf_counter() - start, text
+
+# Submit each set of arguments to the executor, keeping at most max_pending in flight,
+# and yield the results in the same order
+def ordered_map(executor, function, args_list, max_pending):
+  pending = collections.deque()
+  for args in args_list:
+    pending.append(executor.submit(function, *args))
+    if len(pending) >= max_pending:
+      yield pending.popleft().result()
+  while pending:
+    yield pending.popleft().result()
+
+# Encode rows (dicts of the scheme's input columns) across a pool of processes,
+# lazily yielding the encoded chunks in input order (see pipeline.encode_rows)
+def encode_parallel(rows, scheme, chunk_size=10000, workers=None, report=None, fields=OUTPUT_FIELDS):
+  if scheme not in dict_scheme_2_encoder:
+    raise ValueError(f'Unsupported scheme: {scheme}')
+  if report is None:
+    report = WorkerReport()
+  workers = workers or os.cpu_count() or 1
+
+  with ProcessPoolExecutor(workers) as executor:
+    args_list = ((scheme, chunk, fields) for chunk in chunked(rows, chunk_size))
+    for pid, num_rows, seconds, encoded in ordered_map(executor, encode_chunk_in_worker, args_list,
+                                                       2 * workers):
+      report.add(pid, num_rows, seconds)
+      yield encoded
+
+# Run the whole pipeline from one stream to another across a pool of processes
+# (see pipeline.run_pipeline)
+def run_parallel(in_stream, out_stream, scheme, in_format="csv", out_format="csv",
+                 fields=("hex", "uri"), chunk_size=10000, workers=None,
+                 counter=None, report=None, progress=None):
+  if scheme not in dict_scheme_2_encoder:
+    raise ValueError(f'Unsupported scheme: {scheme}')
+  if counter is None:
+    counter = ThroughputCounter()
+  if report is None:
+    report = WorkerReport()
+  workers = workers or os.cpu_count() or 1
+
+  header = None
+  if in_format == "csv":
+    header = next(csv.reader([in_stream.readline()]), [])
+  if out_format == "csv":
+    text = ",".join(fields) + "\n"
+    out_stream.write(text)
+    counter.add(0, len(text))
+
+  with ProcessPoolExecutor(workers) as executor:
+    args_list = ((scheme, in_format, header, lines, out_format, fields)
+                 for lines in chunked(in_stream, chunk_size))
+    for pid, num_rows, seconds, text in ordered_map(executor, encode_lines_in_worker, args_list,
+                                                    2 * workers):
+      report.add(pid, num_rows, seconds)
+      out_stream.write(text)
+      counter.add(num_rows, len(text))
+      if progress is not None:
+        progress(counter)
+
+  return counter, report
+
+def print_report(report):
+  for pid, worker in sorted(report.snapshot().items()):
+    print(f'worker {pid}: {worker["chunks"]} chunks, {worker["rows"]} rows, {worker["rows_per_sec"]:.0f} rows/s',
+          file=sys.stderr)
+
+def main(argv=None):
+  parser = build_parser()
+  parser.description = "Stream a manifest through the rfid encoders across a pool of processes"
+  parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: one per CPU)")
+  args = parse_args(argv, parser)
+
+  in_stream = open_stream(args.input, "r", sys.stdin)
+  out_stream = open_stream(args.output, "w", sys.stdout)
+  try:
+    counter, report = run_parallel(in_stream, out_stream, args.scheme, args.in_format, args.out_format,
+                                   args.fields, args.chunk_size, args.workers,
+                                   progress=print_progress if args.progress else None)
+  finally:
+    if in_stream is not sys.stdin:
+      in_stream.close()
+    if out_stream is not sys.stdout:
+      out_stream.close()
+  print_report(report)
+  print_progress(counter)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,246 @@
+#
+#  pipeline.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a streaming pipeline to encode large manifests with bounded memory
+#
+#  Rows are read lazily from a CSV or NDJSON file (or stdin), encoded in fixed size
+#  chunks with the stateless encode_* functions, and written straight back out as hex,
+#  URI and/or binary rows.  Only one chunk is ever held in memory, no matter how big
+#  the manifest is.  A ThroughputCounter tracks rows/s and bytes/s as it runs.
+#
+#  e.g. rfidencoder> python3 pipeline.py dpci --input manifest.csv --output tags.csv
+#
+#  Input columns for each scheme:
+#   - dpci - dpt, cls, itm, ser
+#   - gtin - gtin, ser, part_bin
+#   - gtin_in_gid - gtin, ser
+#   - tcin - tcin, ser
+#   - tiai_dec, tiai_char, tiai_hex - asset_ref, asset_id
+#
+
+import argparse
+import csv
+import io
+import itertools
+import json
+import sys
+import time
+
+from packer import EPC_BYTES
+from epc_encoder import (encode_dpci, encode_gtin, encode_gtin_in_gid, encode_dpci_into, encode_gtin_into,
+                         encode_gtin_in_gid_into)
+from tcin_encoder import encode_tcin, encode_tcin_into
+from tiai_encoder import (encode_tiai_dec, encode_tiai_char, encode_tiai_hex, encode_tiai_dec_into,
+                          encode_tiai_char_into, encode_tiai_hex_into)
+from instrumentation import metrics
+
+# For each scheme: (encode function, input columns)
+# The encode functions keep no state, so they can be shared by any number of threads
+dict_scheme_2_encoder = {
+  "dpci": (encode_dpci, ("dpt", "cls", "itm", "ser")),
+  "gtin": (encode_gtin, ("gtin", "ser", "part_bin")),
+  "gtin_in_gid": (encode_gtin_in_gid, ("gtin", "ser")),
+  "tcin": (encode_tcin, ("tcin", "ser")),
+  "tiai_dec": (encode_tiai_dec, ("asset_ref", "asset_id")),
+  "tiai_char": (encode_tiai_char, ("asset_ref", "asset_id")),
+  "tiai_hex": (encode_tiai_hex, ("asset_ref", "asset_id"))
+}
+
+# For each scheme: the function that writes a tag's 12 bytes into a buffer, with the
+# same input columns
+dict_scheme_2_encode_into = {
+  "dpci": encode_dpci_into,
+  "gtin": encode_gtin_into,
+  "gtin_in_gid": encode_gtin_in_gid_into,
+  "tcin": encode_tcin_into,
+  "tiai_dec": encode_tiai_dec_into,
+  "tiai_char": encode_tiai_char_into,
+  "tiai_hex": encode_tiai_hex_into
+}
+
+OUTPUT_FIELDS = ("hex", "uri", "bin")
+
+# Tracks how many rows and bytes have gone through, and how fast
+class ThroughputCounter:
+
+  def __init__(self):
+    # Instance variables
+    self.rows = 0
+    self.bytes = 0
+    self.start = time.perf_counter()
+
+  def add(self, rows, num_bytes):
+    self.rows += rows
+    self.bytes += num_bytes
+
+  def elapsed(self):
+    return time.perf_counter() - self.start
+
+  def rows_per_sec(self):
+    elapsed = self.elapsed()
+    return self.rows / elapsed if elapsed > 0 else 0.0
+
+  def bytes_per_sec(self):
+    elapsed = self.elapsed()
+    return self.bytes / elapsed if elapsed > 0 else 0.0
+
+  def snapshot(self):
+    return {
+      "rows": self.rows,
+      "bytes": self.bytes,
+      "seconds": self.elapsed(),
+      "rows_per_sec": self.rows_per_sec(),
+      "bytes_per_sec": self.bytes_per_sec()
+    }
+
+# Lazily read rows as dicts from a CSV (with a header line) or NDJSON stream
+def read_rows(stream, fmt="csv"):
+  if fmt == "ndjson":
+    return (json.loads(line) for line in stream if line.strip())
+  return csv.DictReader(stream)
+
+# Split any iterable into lists of at most chunk_size items, without reading ahead
+def chunked(rows, chunk_size):
+  rows = iter(rows)
+  while True:
+    chunk = list(itertools.islice(rows, chunk_size))
+    if not chunk:
+      return
+    yield chunk
+
+# Encode one chunk of rows, returning a dict of the output fields ("hex", "uri" and
+# "bin") per row.  Columns are taken as strings, as NDJSON rows may hold numbers.
+def encode_chunk(scheme, chunk, fields=OUTPUT_FIELDS):
+  columns = dict_scheme_2_encoder[scheme][1]
+  return encode_values(scheme, ([str(row[column]) for column in columns] for row in chunk), fields)
+
+# Encode rows that are already lists of the scheme's input columns, in order, only
+# rendering the fields asked for (each EncodedTag renders its forms lazily)
+def encode_values(scheme, values, fields=OUTPUT_FIELDS):
+  encode = dict_scheme_2_encoder[scheme][0]
+
+  encoded = []
+  for row in values:
+    tag = encode(*row)
+    encoded.append({field: getattr(tag, field) for field in fields})
+  return encoded
+
+# Encode rows of the scheme's input columns straight into a buffer (e.g. a shared
+# memory ring or a socket send buffer), 12 bytes per row from offset, returns the
+# number of rows written
+def encode_values_into(scheme, values, buffer, offset=0):
+  encode_into = dict_scheme_2_encode_into[scheme]
+  start = offset
+  for row in values:
+    encode_into(buffer, offset, *row)
+    offset += EPC_BYTES
+  return (offset - start) // EPC_BYTES
+
+# Lazily encode rows, one chunk at a time
+def encode_rows(rows, scheme, chunk_size=10000, fields=OUTPUT_FIELDS):
+  if scheme not in dict_scheme_2_encoder:
+    raise ValueError(f'Unsupported scheme: {scheme}')
+  for chunk in chunked(rows, chunk_size):
+    yield encode_chunk(scheme, chunk, fields)
+
+# Render one chunk of encoded rows as CSV (without the header) or NDJSON text
+def format_chunk(chunk, fmt="csv", fields=("hex", "uri")):
+  if fmt == "ndjson":
+    return "".join(json.dumps({field: row[field] for field in fields}) + "\n" for row in chunk)
+  out = io.StringIO()
+  writer = csv.writer(out, lineterminator="\n")
+  writer.writerows([row[field] for field in fields] for row in chunk)
+  return out.getvalue()
+
+# Write the encoded chunks to a stream as they arrive, counting rows and bytes
+def write_chunks(chunks, stream, fmt="csv", fields=("hex", "uri"), counter=None, progress=None):
+  if counter is None:
+    counter = ThroughputCounter()
+  if fmt == "csv":
+    header = ",".join(fields) + "\n"
+    stream.write(header)
+    counter.add(0, len(header))
+
+  for chunk in chunks:
+    text = format_chunk(chunk, fmt, fields)
+    stream.write(text)
+    counter.add(len(chunk), len(text))
+    if progress is not None:
+      progress(counter)
+
+  return counter
+
+# Run the whole pipeline from one stream to another
+def run_pipeline(in_stream, out_stream, scheme, in_format="csv", out_format="csv",
+                 fields=("hex", "uri"), chunk_size=10000, counter=None, progress=None):
+  rows = read_rows(in_stream, in_format)
+  chunks = encode_rows(rows, scheme, chunk_size, fields)
+  return write_chunks(chunks, out_stream, out_format, fields, counter, progress)
+
+def print_progress(counter):
+  print(f'{counter.rows} rows, {counter.rows_per_sec():.0f} rows/s, {counter.bytes_per_sec():.0f} bytes/s',
+        file=sys.stderr)
+
+def build_parser():
+  parser = argparse.ArgumentParser(description="Stream a manifest through the rfid encoders")
+  parser.add_argument("scheme", choices=sorted(dict_scheme_2_encoder))
+  parser.add_argument("--input", default="-", help="input file (default: stdin)")
+  parser.add_argument("--output", default="-", help="output file (default: stdout)")
+  parser.add_argument("--in-format", choices=("csv", "ndjson"), default="csv")
+  parser.add_argument("--out-format", choices=("csv", "ndjson"), default="csv")
+  parser.add_argument("--fields", default="hex,uri", help="comma separated list of hex, uri and bin")
+  parser.add_argument("--chunk-size", type=int, default=10000)
+  parser.add_argument("--progress", action="store_true", help="print throughput to stderr after each chunk")
+  return parser
+
+def parse_args(argv=None, parser=None):
+  if parser is None:
+    parser = build_parser()
+  args = parser.parse_args(argv)
+
+  args.fields = tuple(args.fields.split(","))
+  for field in args.fields:
+    if field not in OUTPUT_FIELDS:
+      parser.error(f'Unsupported field: {field}')
+  return args
+
+def open_stream(path, mode, default):
+  if path == "-":
+    return default
+  return open(path, mode, newline="")
+
+def main(argv=None):
+  parser = build_parser()
+  parser.add_argument("--metrics-file", help="enable metrics, and write them to this file in Prometheus text format")
+  parser.add_argument("--metrics-port", type=int, help="enable metrics, and serve them on this local port while running")
+  args = parse_args(argv, parser)
+
+  server = None
+  if args.metrics_file or args.metrics_port is not None:
+    metrics.enable()
+  if args.metrics_port is not None:
+    server = metrics.serve_prometheus(args.metrics_port)
+
+  in_stream = open_stream(args.input, "r", sys.stdin)
+  out_stream = open_stream(args.output, "w", sys.stdout)
+  try:
+    counter = run_pipeline(in_stream, out_stream, args.scheme, args.in_format, args.out_format,
+                           args.fields, args.chunk_size,
+                           progress=print_progress if args.progress else None)
+  finally:
+    if in_stream is not sys.stdin:
+      in_stream.close()
+    if out_stream is not sys.stdout:
+      out_stream.close()
+    if server is not None:
+      server.shutdown()
+  print_progress(counter)
+  if args.metrics_file:
+    metrics.write_prometheus(args.metrics_file)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,233 @@
+#
+#  prefix_cache.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  A python class to cache the serial free part of each tag
+#
+#  A print job encodes thousands of serials for the same DPCI, TCIN or GTIN, and
+#  everything but the serial (header, filter, partition, manager and item, and the
+#  matching start of the URI) is the same every time.  The encoders build that
+#  prefix once with a prefix function (e.g. epc_encoder.dpci_prefix), and keep it
+#  in a cache keyed on the function and its inputs, so each tag is then just the
+#  prefix OR'd with the serial.
+#
+#  The encoders share a ThreadPrefixCache, which keeps a plain dict per thread, so
+#  a lookup takes no lock and touches no state another thread writes to (threads
+#  encoding side by side on a free threaded build don't queue on each other).  Each
+#  thread's dict is emptied when it fills up, instead of keeping a least recently
+#  used order.  A PrefixCache is one bounded LRU cache behind a lock, which every
+#  thread can opt in to sharing with prefix_cache.use_shared(PrefixCache()).
+#
+#  The encode_*_into functions look their prefix up with lookup_lanes, keyed on the
+#  item alone, which keeps it split into the two words written to the buffer (see
+#  packer.pack_epc_into), so a hit builds no key tuple and no 96 bit int.
+#
+
+import collections
+import threading
+import weakref
+
+from packer import EPC_LO_MASK
+
+PrefixCacheInfo = collections.namedtuple("PrefixCacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+# prefix_cache python class to encapsulate the cached prefixes in an instance
+class PrefixCache:
+
+  # Pass maxsize=None for no limit, or 0 to turn caching off
+  def __init__(self, maxsize=4096):
+    # Instance variables
+    self.maxsize = maxsize
+    self.prefixes = collections.OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    self.lock = threading.Lock()
+
+  # The prefix for build(*args), built and cached on a miss
+  def lookup(self, build, *args):
+    key = (build, args)
+    with self.lock:
+      prefix = self.prefixes.get(key)
+      if prefix is not None:
+        self.prefixes.move_to_end(key)
+        self.hits += 1
+        return prefix
+      self.misses += 1
+
+    prefix = build(*args)
+    with self.lock:
+      if self.maxsize is None or self.maxsize > 0:
+        self.prefixes[key] = prefix
+        self.evict()
+    return prefix
+
+  # Drop the cached prefix for build(*args), e.g. after a change to the item master
+  def invalidate(self, build, *args):
+    with self.lock:
+      self.prefixes.pop((build, args), None)
+
+  # Drop every cached prefix built with build, or every prefix at all
+  def clear(self, build=None):
+    with self.lock:
+      if build is None:
+        self.prefixes.clear()
+        self.hits = 0
+        self.misses = 0
+      else:
+        for key in [key for key in self.prefixes if key[0] is build]:
+          del self.prefixes[key]
+
+  def resize(self, maxsize):
+    with self.lock:
+      self.maxsize = maxsize
+      self.evict()
+
+  # Hit and miss statistics, like functools.lru_cache
+  def cache_info(self):
+    with self.lock:
+      return PrefixCacheInfo(self.hits, self.misses, self.maxsize, len(self.prefixes))
+
+  def evict(self):
+    if self.maxsize is not None:
+      while len(self.prefixes) > self.maxsize:
+        self.prefixes.popitem(last=False)
+
+# The prefixes cached by one thread (and their lanes, by build function), and its hit
+# and miss counts
+class ThreadPrefixes:
+
+  def __init__(self):
+    # Instance variables
+    self.prefixes = {}
+    self.lanes = {}
+    self.hits = 0
+    self.misses = 0
+
+# thread_prefix_cache python class to encapsulate a cache per thread in an instance
+class ThreadPrefixCache:
+
+  # maxsize is per thread, pass None for no limit, or 0 to turn caching off
+  def __init__(self, maxsize=4096):
+    # Instance variables
+    self.maxsize = maxsize
+    self.local = threading.local()
+    self.threads = weakref.WeakSet()
+    self.shared = None
+    # Only taken to add a thread, or by the methods that reach every thread's cache
+    self.lock = threading.Lock()
+
+  # The prefix for build(*args), built and cached (for this thread) on a miss
+  def lookup(self, build, *args):
+    if self.shared is not None:
+      return self.shared.lookup(build, *args)
+    try:
+      cache = self.local.cache
+    except AttributeError:
+      cache = self.thread_prefixes()
+
+    key = (build, args)
+    prefix = cache.prefixes.get(key)
+    if prefix is not None:
+      cache.hits += 1
+      return prefix
+    cache.misses += 1
+
+    prefix = build(*args)
+    self.store(cache.prefixes, key, prefix)
+    return prefix
+
+  # The packed prefix of an item as its top 32 and bottom 64 bits, where item is the
+  # one input of build, or a tuple of its inputs
+  def lookup_lanes(self, build, item):
+    if self.shared is not None:
+      prefix = self.shared.lookup(build, *item) if type(item) is tuple else self.shared.lookup(build, item)
+      return prefix[0] >> 64, prefix[0] & EPC_LO_MASK
+    try:
+      cache = self.local.cache
+      item_lanes = cache.lanes[build][item]
+    except (AttributeError, KeyError):
+      return self.build_lanes(build, item)
+    cache.hits += 1
+    return item_lanes
+
+  def build_lanes(self, build, item):
+    try:
+      cache = self.local.cache
+    except AttributeError:
+      cache = self.thread_prefixes()
+    cache.misses += 1
+
+    prefix = (build(*item) if type(item) is tuple else build(item))[0]
+    item_lanes = (prefix >> 64, prefix & EPC_LO_MASK)
+    self.store(cache.lanes.setdefault(build, {}), item, item_lanes)
+    return item_lanes
+
+  # Keep a prefix, emptying the dict first when it is full
+  def store(self, prefixes, key, prefix):
+    if self.maxsize != 0:
+      if self.maxsize is not None and len(prefixes) >= self.maxsize:
+        prefixes.clear()
+      prefixes[key] = prefix
+
+  def thread_prefixes(self):
+    cache = ThreadPrefixes()
+    self.local.cache = cache
+    with self.lock:
+      self.threads.add(cache)
+    return cache
+
+  # Look every prefix up in one locked cache shared by every thread (e.g. a
+  # PrefixCache, to bound the memory of many threads), or None for a cache per thread
+  def use_shared(self, cache):
+    self.shared = cache
+
+  # Drop the cached prefix for build(*args) from every thread's cache
+  def invalidate(self, build, *args):
+    if self.shared is not None:
+      self.shared.invalidate(build, *args)
+    for cache in self.thread_caches():
+      cache.prefixes.pop((build, args), None)
+      cache.lanes.get(build, {}).pop(args[0] if len(args) == 1 else args, None)
+
+  # Drop every cached prefix built with build, or every prefix at all
+  def clear(self, build=None):
+    if self.shared is not None:
+      self.shared.clear(build)
+    for cache in self.thread_caches():
+      if build is None:
+        cache.prefixes.clear()
+        cache.lanes.clear()
+        cache.hits = 0
+        cache.misses = 0
+      else:
+        for key in [key for key in list(cache.prefixes) if key[0] is build]:
+          cache.prefixes.pop(key, None)
+        cache.lanes.pop(build, None)
+
+  def resize(self, maxsize):
+    self.maxsize = maxsize
+    for cache in self.thread_caches():
+      for prefixes in [cache.prefixes] + list(cache.lanes.values()):
+        if maxsize is not None and len(prefixes) > maxsize:
+          prefixes.clear()
+
+  # Hit and miss statistics summed over the running threads (a thread's cache goes when
+  # it ends, currsize is the prefixes held by them all, maxsize is per thread), or those
+  # of the shared cache
+  def cache_info(self):
+    if self.shared is not None:
+      return self.shared.cache_info()
+    caches = self.thread_caches()
+    currsize = sum(len(cache.prefixes) + sum(len(lanes) for lanes in list(cache.lanes.values())) for cache in caches)
+    return PrefixCacheInfo(sum(cache.hits for cache in caches), sum(cache.misses for cache in caches),
+                           self.maxsize, currsize)
+
+  def thread_caches(self):
+    with self.lock:
+      return list(self.threads)
+
+# The cache used by every encoder
+prefix_cache = ThreadPrefixCache()
@@ -0,0 +1,101 @@
+#
+#  range_encoder.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains functions to encode a run of consecutive serials for one item
+#
+#  A roll of tags is one DPCI, TCIN or GTIN with count serials from start_serial, so
+#  everything but the serial is the same on every tag.  The item is packed once, with
+#  the same prefix function (and prefix cache) as the scheme's encode function, and
+#  each tag is then the prefix plus its serial, as the serial is the bottom field of
+#  the EPC.  The run is checked up front against the serials the scheme can hold (the
+#  36, 38 or 50 bit field, capped by the digits its encoder keeps from a serial string,
+#  see dict_scheme_2_serial_limit), so it never wraps into the item.
+#
+#  Schemes and item fields are the pipeline's (see pipeline.py), without the serial:
+#
+#    dpci         (dpt, cls, itm)
+#    gtin         (gtin, part_bin)
+#    gtin_in_gid  (gtin,)
+#    tcin         (tcin,)
+#
+#  either as a tuple in that order, or a dict keyed by those names.  The run comes
+#  back as a lazy iterator of EncodedTags (the same tags as the encode function), or as
+#  a TagBatch (with batch=True), or written straight into a buffer by encode_range_into.
+#
+#  e.g. encode_range("tcin", ("13951442",), 1000, 10000, batch=True)
+#       block = allocator.allocate_block(10000)
+#       encode_range("dpci", ("281", "00", "8570"), block.start, len(block))
+#
+#  Note: the batch and buffer forms require numpy.
+#
+
+from packer import *
+from encoded_tag import EncodedTag
+from prefix_cache import prefix_cache
+from epc_encoder import dpci_prefix, gtin_prefix, gtin_in_gid_prefix
+from tcin_encoder import tcin_prefix
+
+# For each scheme: the prefix function, its item fields, the EPC scheme, and whether
+# the encoder strips leading zeros from the serial in the URI
+dict_scheme_2_range = {
+  "dpci": (dpci_prefix, ("dpt", "cls", "itm"), GID_96, False),
+  "gtin": (gtin_prefix, ("gtin", "part_bin"), SGTIN_96, False),
+  "gtin_in_gid": (gtin_in_gid_prefix, ("gtin",), GID_96, False),
+  "tcin": (tcin_prefix, ("tcin",), TCIN_96, True)
+}
+
+# The packed prefix and URI prefix of the item, and the EPC scheme, after checking the
+# run fits in the serial field
+def range_prefix(scheme, item_fields, start_serial, count):
+  if scheme not in dict_scheme_2_range:
+    raise ValueError(f'Unsupported scheme for serial ranges: {scheme}')
+  prefix, fields, epc_scheme, strip_serial = dict_scheme_2_range[scheme]
+  if isinstance(item_fields, dict):
+    item_fields = [item_fields[field] for field in fields]
+  if len(item_fields) != len(fields):
+    raise ValueError(f'Expected the {scheme} fields {", ".join(fields)}')
+
+  limit = dict_scheme_2_serial_limit[epc_scheme]
+  if start_serial < 0 or count < 0:
+    raise ValueError(f'Serial ranges must start and count from 0, not {start_serial} and {count}')
+  if start_serial + count > limit:
+    raise OverflowError(f'Serial range overflows {epc_scheme}: {start_serial} + {count} > {limit}')
+
+  epc_prefix, uri_prefix = prefix_cache.lookup(prefix, *item_fields)
+  return epc_prefix, uri_prefix, epc_scheme, strip_serial
+
+# Encode count serials from start_serial, as a lazy iterator of EncodedTags, or a TagBatch
+def encode_range(scheme, item_fields, start_serial, count, batch=False):
+  epc_prefix, uri_prefix, epc_scheme, strip_serial = range_prefix(scheme, item_fields, start_serial, count)
+  if batch:
+    # Imported here, so the iterator doesn't need numpy
+    from batch_encoder import TagBatch
+    return TagBatch(epc_scheme, range_tags(epc_prefix, start_serial, count))
+  return range_iterator(epc_prefix, uri_prefix, epc_scheme, strip_serial, start_serial, count)
+
+def range_iterator(epc_prefix, uri_prefix, epc_scheme, strip_serial, start_serial, count):
+  for serial in range(start_serial, start_serial + count):
+    uri_serial = str(serial).lstrip('0') if strip_serial else str(serial)
+    yield EncodedTag(epc_prefix + serial, epc_scheme, None, uri_prefix, uri_serial)
+
+# Write count serials from start_serial straight into a buffer, 12 bytes per tag from
+# offset, returns the number of tags written
+def encode_range_into(buffer, offset, scheme, item_fields, start_serial, count):
+  import numpy as np
+  epc_prefix = range_prefix(scheme, item_fields, start_serial, count)[0]
+  out = np.frombuffer(buffer, dtype=np.uint8, count=count * EPC_BYTES, offset=offset).reshape(count, EPC_BYTES)
+  out[:] = range_tags(epc_prefix, start_serial, count)
+  return count
+
+# The (count, 12) uint8 tags of the prefix plus each serial (the serial is always in
+# the low lane, so the high lane is the same for every tag)
+def range_tags(epc_prefix, start_serial, count):
+  import numpy as np
+  from lanes import lanes_2_tags
+  hi = np.full(count, epc_prefix >> 64, dtype=np.uint64)
+  lo = np.uint64(epc_prefix & EPC_LO_MASK) + np.arange(start_serial, start_serial + count, dtype=np.uint64)
+  return lanes_2_tags(hi, lo)
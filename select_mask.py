@@ -0,0 +1,190 @@
+#
+#  select_mask.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains functions to build Gen2 Select masks for reader side filtering
+#
+#  A Gen2 Select command matches a run of bits of a tag's memory: the EPC bank (01),
+#  a bit pointer, a length in bits and the mask bits (left aligned in whole bytes).
+#  The EPC itself starts at bit 0x20 of the EPC bank, after the CRC and PC words, so
+#  a field at bit offset n of the EPC is at pointer 0x20 + n.  A reader that ORs a
+#  list of Selects together only reports the tags that match one of them.
+#
+#  Each function here returns the fewest SelectMasks that match exactly the values
+#  given, using the same field layouts as the encoders:
+#
+#    tcin_masks            TCIN-96 TCINs (TCINEncoder)
+#    department_masks      GID-96 DPCI departments, class_masks classes, dpci_masks
+#                          whole DPCIs (EPCEncoder.with_dpci)
+#    company_prefix_masks  SGTIN-96 company prefixes, gtin_masks whole GTINs
+#                          (EPCEncoder.with_gtin, for the given partition)
+#    asset_ref_masks       TIAI-A-96 asset refs (TIAIEncoder)
+#
+#  Values can be listed, or given as a range.  Runs of consecutive values are split
+#  into the fewest aligned power of two blocks, each of which is one mask of the field's
+#  top bits (e.g. TCINs 1000 to 1999 are 7 masks, not 1000).  The masks start at the
+#  header, so they only match the scheme asked for, with the filter each encoder packs
+#  (0, or 1 for SGTIN-96), or pass fltr=None to skip the header and filter, for tags
+#  that were encoded with other filter values.
+#
+#  e.g. for mask in tcin_masks(range(13951400, 13951500)):
+#         reader.select(bank=1, pointer=mask.pointer, length=mask.length, mask=mask.mask)
+#
+
+import collections
+
+from packer import *
+from epc_encoder import dpci_prefix, gtin_prefix
+
+# The EPC starts at bit 0x20 of the EPC memory bank
+EPC_BANK = 1
+EPC_POINTER = 0x20
+
+SelectMask = collections.namedtuple("SelectMask", ["pointer", "length", "mask"])
+
+# DPCI managers are 049 + 3 digit department + 2 digit class (see EPCEncoder.with_dpci)
+DPCI_MANAGER_BASE = 4900000
+
+# The filter each encoder packs
+TCIN_96_FILTER = 0
+SGTIN_96_FILTER = 1
+TIAI_A_96_FILTER = 0
+
+# Build one mask of the num bits of value at bit offset (from the top of the EPC)
+def select_mask(offset, num, value):
+  pad = -num % 8
+  return SelectMask(EPC_POINTER + offset, num, (value << pad).to_bytes((num + pad) // 8, 'big'))
+
+# Whether an EPC (a packed int) matches a mask
+def mask_matches(mask, epc):
+  offset = mask.pointer - EPC_POINTER
+  value = int.from_bytes(mask.mask, 'big') >> (-mask.length % 8)
+  return (epc >> (EPC_BITS - offset - mask.length)) & ((1 << mask.length) - 1) == value
+
+# Sorted, merged (first, last) runs of the values: an int (or decimal string), a range,
+# or a list of them
+def value_runs(values):
+  if isinstance(values, (int, str, range)):
+    values = [values]
+  runs = []
+  for value in values:
+    if isinstance(value, range):
+      if value.step != 1:
+        raise ValueError(f'Ranges of values must have a step of 1, not {value.step}')
+      if len(value):
+        runs.append((value.start, value.stop - 1))
+    else:
+      runs.append((int(value), int(value)))
+
+  merged = []
+  for first, last in sorted(runs):
+    if merged and first <= merged[-1][1] + 1:
+      merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+    else:
+      merged.append((first, last))
+  return merged
+
+# Split first to last (inclusive) into the fewest aligned blocks of a num bit field,
+# as (top bits, number of top bits) prefixes
+def range_2_prefixes(first, last, num):
+  if first < 0 or last >= 1 << num:
+    raise ValueError(f'Values {first} to {last} don\'t fit in {num} bits')
+  prefixes = []
+  while first <= last:
+    # The biggest block that starts at first and doesn't go past last
+    size = first & -first if first else 1 << num
+    while first + size - 1 > last:
+      size >>= 1
+    bits = size.bit_length() - 1
+    prefixes.append((first >> bits, num - bits))
+    first += size
+  return prefixes
+
+# The masks for the runs of a num bit field at offset, led by the lead_num bits of lead
+# (the fields just before it, e.g. the header and filter)
+def field_masks(runs, offset, num, lead=0, lead_num=0):
+  masks = []
+  for first, last in runs:
+    for prefix, bits in range_2_prefixes(first, last, num):
+      masks.append(select_mask(offset - lead_num, lead_num + bits, (lead << bits) | prefix))
+  return masks
+
+# The header and filter bits to lead with, or none
+def header_lead(header, fltr):
+  if fltr is None:
+    return 0, 0
+  return (header << 3) | (fltr & 0x7), 8 + 3
+
+# TCIN-96: TCINs (ints or decimal strings) or ranges of them
+def tcin_masks(tcins, fltr=TCIN_96_FILTER):
+  return field_masks(value_runs(tcins), 11, TCIN_96_TCIN_BITS, *header_lead(TCIN_96_HEADER, fltr))
+
+# GID-96 DPCI: every class of each department (3 digit numbers) or range of departments
+def department_masks(dpts):
+  check_digits(dpts, 3, "department")
+  runs = [(DPCI_MANAGER_BASE + first * 100, DPCI_MANAGER_BASE + last * 100 + 99) for first, last in value_runs(dpts)]
+  return field_masks(runs, 8, GID_96_MANAGER_BITS, GID_96_HEADER, 8)
+
+# GID-96 DPCI: classes (2 digit numbers) or ranges of classes, all in one department
+def class_masks(dpt, clss):
+  check_digits(dpt, 3, "department")
+  check_digits(clss, 2, "class")
+  runs = [(DPCI_MANAGER_BASE + int(dpt) * 100 + first, DPCI_MANAGER_BASE + int(dpt) * 100 + last)
+          for first, last in value_runs(clss)]
+  return field_masks(runs, 8, GID_96_MANAGER_BITS, GID_96_HEADER, 8)
+
+# GID-96 DPCI: whole DPCIs, as (department, class, item) strings like EPCEncoder.with_dpci
+# (the item's check digit means consecutive items aren't consecutive in the tag)
+def dpci_masks(dpcis):
+  num = 8 + GID_96_MANAGER_BITS + GID_96_OBJECT_BITS
+  values = sorted({dpci_prefix(dpt, cls, itm)[0] >> GID_96_SERIAL_BITS for dpt, cls, itm in dpcis})
+  return [select_mask(0, num, value) for value in values]
+
+def check_digits(values, digits, name):
+  for first, last in value_runs(values):
+    if first < 0 or last >= 10 ** digits:
+      raise ValueError(f'A DPCI {name} is {digits} digits, not {last if last >= 10 ** digits else first}')
+
+# SGTIN-96: company prefixes, as strings of the digits in the tag (their length picks the
+# partition), or ranges of them with the number of digits
+def company_prefix_masks(company_prefixes, digits=None, fltr=SGTIN_96_FILTER):
+  if isinstance(company_prefixes, (str, range)):
+    company_prefixes = [company_prefixes]
+  by_digits = {}
+  for prefix in company_prefixes:
+    prefix_digits = digits if isinstance(prefix, range) else len(prefix)
+    if prefix_digits is None:
+      raise ValueError("Ranges of company prefixes need the number of digits")
+    by_digits.setdefault(prefix_digits, []).append(prefix)
+
+  masks = []
+  lead, lead_num = header_lead(SGTIN_96_HEADER, fltr)
+  for prefix_digits, prefixes in sorted(by_digits.items()):
+    part = company_prefix_partition(prefix_digits)
+    mgr_bin_len = SGTIN_96_PARTITIONS[part][0]
+    masks += field_masks(value_runs(prefixes), 14, mgr_bin_len,
+                         (lead << SGTIN_96_PARTITION_BITS) | part, lead_num + SGTIN_96_PARTITION_BITS)
+  return masks
+
+def company_prefix_partition(digits):
+  for part, (mgr_bin_len, mgr_dec_len, itm_bin_len, itm_dec_len) in enumerate(SGTIN_96_PARTITIONS):
+    if mgr_dec_len == digits:
+      return part
+  raise ValueError(f'No SGTIN-96 partition has a {digits} digit company prefix')
+
+# SGTIN-96: whole GTINs, encoded with the partition part_bin like EPCEncoder.with_gtin
+def gtin_masks(gtins, part_bin, fltr=SGTIN_96_FILTER):
+  if isinstance(gtins, str):
+    gtins = [gtins]
+  num = 8 + 3 + SGTIN_96_PARTITION_BITS + SGTIN_96_COMPANY_ITEM_BITS
+  values = sorted({gtin_prefix(gtin, part_bin)[0] >> SGTIN_96_SERIAL_BITS for gtin in gtins})
+  if fltr is None:
+    return [select_mask(11, num - 11, value & ((1 << (num - 11)) - 1)) for value in values]
+  return [select_mask(0, num, (value & ~(0x7 << (num - 11))) | ((fltr & 0x7) << (num - 11))) for value in values]
+
+# TIAI-A-96: asset refs (ints or decimal strings) or ranges of them
+def asset_ref_masks(asset_refs, fltr=TIAI_A_96_FILTER):
+  return field_masks(value_runs(asset_refs), 11, TIAI_A_96_ASSET_REF_BITS, *header_lead(TIAI_A_96_HEADER, fltr))
@@ -0,0 +1,164 @@
+#
+#  serial_allocator.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  A python class to hand out serial numbers that are never reissued
+#
+#  Each allocator reserves a block of serial numbers at a time from a small state
+#  file, and then hands them out from memory.  Reservations are locked across
+#  processes, so every worker or process gets its own disjoint block.  The state
+#  file is memory-mapped and flushed to disk before a block is handed out, so a
+#  restart after a crash never reissues a serial (it may skip the rest of a block).
+#
+#  The state file holds two copies of the state, each with a sequence number and a
+#  checksum, and a reservation always overwrites the older copy.  So a torn write
+#  can only ever damage the copy that wasn't current yet.
+#
+#  Note: the cross process lock uses fcntl, so this is for POSIX systems.
+#
+
+import fcntl
+import itertools
+import mmap
+import os
+import struct
+import threading
+import weakref
+import zlib
+
+from packer import *
+
+# State file: header (magic, limit) then two slots of (sequence, next serial, crc32)
+STATE_MAGIC = b'RFIDSER1'
+STATE_HEADER = struct.Struct('<8sQ')
+STATE_SLOT = struct.Struct('<QQI4x')
+STATE_SLOT_OFFSETS = (STATE_HEADER.size, STATE_HEADER.size + STATE_SLOT.size)
+STATE_SIZE = STATE_HEADER.size + 2 * STATE_SLOT.size
+
+# serial_allocator python class to encapsulate the state file in an instance
+class SerialAllocator:
+
+  # Pass the scheme (GID_96, SGTIN_96 or TCIN_96) to fit its serial width, or an explicit limit
+  def __init__(self, path, scheme=TCIN_96, block_size=1000000, limit=None):
+    # Instance variables
+    self.path = path
+    self.block_size = block_size
+    self.limit = dict_scheme_2_serial_limit[scheme] if limit is None else limit
+    self.block = iter(())
+    self.lock = threading.Lock()
+
+    self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+      fcntl.flock(self.fd, fcntl.LOCK_EX)
+      try:
+        if os.fstat(self.fd).st_size < STATE_SIZE:
+          os.pwrite(self.fd, STATE_HEADER.pack(STATE_MAGIC, self.limit), 0)
+          os.ftruncate(self.fd, STATE_SIZE)
+          os.fsync(self.fd)
+        self.mm = mmap.mmap(self.fd, STATE_SIZE)
+      finally:
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+    except BaseException:
+      os.close(self.fd)
+      raise
+    allocators.add(self)
+
+    magic, limit = STATE_HEADER.unpack_from(self.mm, 0)
+    if magic != STATE_MAGIC:
+      self.close()
+      raise ValueError(f'Not a serial allocator state file: {path}')
+    if limit != self.limit:
+      self.close()
+      raise ValueError(f'State file {path} is for serials below {limit}, not {self.limit}')
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def close(self):
+    if self.fd is not None:
+      self.mm.close()
+      os.close(self.fd)
+      self.fd = None
+
+  # The next serial that has never been reserved (by any allocator on this file)
+  def next_unreserved(self):
+    return self.read_slot()[1]
+
+  # Reserve a block of count serials, returned as a range
+  def allocate_block(self, count=None):
+    if count is None:
+      count = self.block_size
+    with self.lock:
+      fcntl.flock(self.fd, fcntl.LOCK_EX)
+      try:
+        seq, start = self.read_slot()
+        if start + count > self.limit:
+          raise OverflowError(f'Serial numbers exhausted: {start} + {count} > {self.limit}')
+        self.write_slot(seq + 1, start + count)
+      finally:
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+    return range(start, start + count)
+
+  # Hand out one serial, reserving a new block when the current one runs out
+  def next_serial(self):
+    try:
+      return next(self.block)
+    except StopIteration:
+      pass
+    self.refill()
+    return next(self.block)
+
+  # Hand out the next count serials as a list
+  def take(self, count):
+    serials = list(itertools.islice(self.block, count))
+    while len(serials) < count:
+      self.refill()
+      serials.extend(itertools.islice(self.block, count - len(serials)))
+    return serials
+
+  def refill(self):
+    self.block = iter(self.allocate_block())
+
+  # After a fork the child reopens the state file, as flock locks are shared by every
+  # process using the same open file, and it must never hand out the rest of its
+  # parent's block
+  def reopen(self):
+    if self.fd is None:
+      return
+    self.mm.close()
+    os.close(self.fd)
+    self.fd = os.open(self.path, os.O_RDWR)
+    self.mm = mmap.mmap(self.fd, STATE_SIZE)
+    self.block = iter(())
+    self.lock = threading.Lock()
+
+  def read_slot(self):
+    slots = []
+    for offset in STATE_SLOT_OFFSETS:
+      seq, start, crc = STATE_SLOT.unpack_from(self.mm, offset)
+      if crc == slot_crc(seq, start):
+        slots.append((seq, start))
+    return max(slots, default=(0, 0))
+
+  def write_slot(self, seq, start):
+    offset = STATE_SLOT_OFFSETS[seq % 2]
+    STATE_SLOT.pack_into(self.mm, offset, seq, start, slot_crc(seq, start))
+    self.mm.flush()
+
+def slot_crc(seq, start):
+  return zlib.crc32(struct.pack('<QQ', seq, start))
+
+# Every open allocator in this process, so they can all be reopened after a fork
+allocators = weakref.WeakSet()
+
+def reopen_allocators():
+  for allocator in list(allocators):
+    allocator.reopen()
+
+os.register_at_fork(after_in_child=reopen_allocators)
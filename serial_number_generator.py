@@ -7,10 +7,22 @@
 #
 #  This file contains functions to generate pseudo randomized serial numbers
 #
+#  new_serial_with_seed runs a linear congruential generator, seeded with the current
+#  time.  new_serial_with_key gives the index'th serial of a keyed permutation instead,
+#  which never repeats and can be computed for any index directly.
+#
 
+import functools
 import time
 
+from packer import TCIN_96, dict_scheme_2_serial_limit
+from instrumentation import metrics
+
 def new_serial_with_seed(initial_seed):
+  timed = metrics.enabled
+  if timed:
+    start = time.perf_counter()
+
   # Get the current time in seconds since the Epoch
   now_epoch_seconds = int(time.time())
   
@@ -29,7 +41,10 @@ def new_serial_with_seed(initial_seed):
   # Append zeros to the serial number until it is 15 digits long
   # Note: if you pick a different length, you'll need to pick a different prime
   # number in the linear_congruential_generator_with_seed method.
-  return f'{str_result:<015}'
+  serial = f'{str_result:<015}'
+  if timed:
+    metrics.observe_since("serial", start)
+  return serial
 
 def linear_congruential_generator_with_seed(seed):
   prime = int(9999999999971)
@@ -37,3 +52,80 @@ def linear_congruential_generator_with_seed(seed):
   increment = int(1664525)
   
   return str((seed * multiplier + increment) % prime)
+
+# Counter based serial numbers
+#
+# The index'th serial number is a keyed permutation of the index, so any serial can be
+# computed directly without threading state through, and no two indexes below the limit
+# can ever give the same serial.  Workers can generate any range of indexes on their own,
+# in parallel or on different nodes, while the serials still look random on the tag.
+#
+# The permutation is a balanced Feistel network over just enough bits to hold limit - 1,
+# with cycle walking (re-permuting until the result is below the limit), so it maps
+# [0, limit) exactly onto itself.  Use dict_scheme_2_serial_limit for each scheme's limit,
+# or 1 << bits for an exact bit width.
+
+FEISTEL_ROUNDS = 4
+MASK_64 = 0xFFFFFFFFFFFFFFFF
+
+# Use this to get the index'th serial number for a scheme, as a string for the encoders
+def new_serial_with_key(key, index, scheme=TCIN_96):
+  timed = metrics.enabled
+  if timed:
+    start = time.perf_counter()
+
+  serial = str(permuted_serial(key, index, dict_scheme_2_serial_limit[scheme]))
+
+  if timed:
+    metrics.observe_since("serial", start)
+  return serial
+
+def permuted_serial(key, index, limit):
+  if not 0 <= index < limit:
+    raise ValueError(f'Index {index} is out of range for {limit} serial numbers')
+  half = feistel_half_bits(limit)
+  keys = feistel_keys(key)
+  serial = feistel(index, half, keys)
+  while serial >= limit:
+    serial = feistel(serial, half, keys)
+  return serial
+
+# The inverse of permuted_serial: which index gives this serial
+def permuted_index(key, serial, limit):
+  if not 0 <= serial < limit:
+    raise ValueError(f'Serial {serial} is out of range for {limit} serial numbers')
+  half = feistel_half_bits(limit)
+  keys = feistel_keys(key)
+  index = feistel_inverse(serial, half, keys)
+  while index >= limit:
+    index = feistel_inverse(index, half, keys)
+  return index
+
+def feistel(x, half, keys):
+  mask = (1 << half) - 1
+  left, right = x >> half, x & mask
+  for k in keys:
+    left, right = right, left ^ (mix64(right ^ k) & mask)
+  return (left << half) | right
+
+def feistel_inverse(x, half, keys):
+  mask = (1 << half) - 1
+  left, right = x >> half, x & mask
+  for k in reversed(keys):
+    left, right = right ^ (mix64(left ^ k) & mask), left
+  return (left << half) | right
+
+def feistel_half_bits(limit):
+  return max(1, ((limit - 1).bit_length() + 1) // 2)
+
+# Round keys for a key (an int, or a decimal string like the seeds above)
+@functools.lru_cache(maxsize=64)
+def feistel_keys(key):
+  key = int(key) & MASK_64
+  return tuple(mix64((key + (i + 1) * 0x9E3779B97F4A7C15) & MASK_64) for i in range(FEISTEL_ROUNDS))
+
+# The SplitMix64 finalizer, to scramble the bits of a 64 bit value
+def mix64(x):
+  x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+  x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK_64
+  return x ^ (x >> 31)
@@ -0,0 +1,216 @@
+#
+#  tag_archive.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains classes to archive issued EPCs in a compact binary file
+#
+#  An archive is a 32 byte header (magic, scheme name and record size) followed by
+#  one 12 byte big endian record per EPC, so 100M tags take 1.2 GB instead of about
+#  5 GB of hex and URI text.  The record count is just the size of the file, so
+#  appending never rewrites the header, and a torn write at the end (less than a
+#  whole record) is dropped the next time the archive is opened for writing.
+#
+#  TagArchiveWriter appends whole batches (a TagBatch, an (N, 12) array, raw bytes, or
+#  EncodedTags or ints), and TagArchive memory-maps the file, so it opens instantly
+#  and its records are zero copy memoryview and numpy views over the mapping.
+#
+#  e.g. with TagArchiveWriter("tags.epc", TCIN_96) as writer:
+#         writer.append(encode_tcin_batch(tcins, serials))
+#       with TagArchive("tags.epc") as archive:
+#         archive.hex(12345), archive.tags()[-10:], decode_buffer(archive.records)
+#
+#  Note: this module requires numpy.
+#
+
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from packer import *
+from lanes import *
+
+# Header: magic, scheme name (NUL padded) and record size
+ARCHIVE_MAGIC = b'RFIDTAG1'
+ARCHIVE_HEADER = struct.Struct('<8s16sI4x')
+ARCHIVE_SCHEME_BYTES = 16
+
+# Read and check the header of an open archive file, returns the scheme
+def read_archive_header(f, path):
+  header = f.read(ARCHIVE_HEADER.size)
+  if len(header) < ARCHIVE_HEADER.size:
+    raise ValueError(f'Not a tag archive (too short): {path}')
+  magic, scheme, record_size = ARCHIVE_HEADER.unpack(header)
+  if magic != ARCHIVE_MAGIC:
+    raise ValueError(f'Not a tag archive: {path}')
+  if record_size != EPC_BYTES:
+    raise ValueError(f'Tag archive {path} has {record_size} byte records, not {EPC_BYTES}')
+  return scheme.rstrip(b'\0').decode('ascii')
+
+# tag_archive_writer python class to append batches of tags to an archive
+class TagArchiveWriter:
+
+  # Creates the archive, or appends to it if it already holds the same scheme
+  def __init__(self, path, scheme):
+    # Instance variables
+    self.path = path
+    self.scheme = scheme
+    self.count = 0
+
+    encoded_scheme = scheme.encode('ascii')
+    if len(encoded_scheme) > ARCHIVE_SCHEME_BYTES:
+      raise ValueError(f'Scheme name is longer than {ARCHIVE_SCHEME_BYTES} bytes: {scheme}')
+
+    self.f = open(path, "r+b" if os.path.exists(path) else "w+b")
+    try:
+      size = os.fstat(self.f.fileno()).st_size
+      if size == 0:
+        self.f.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, encoded_scheme, EPC_BYTES))
+      else:
+        archived_scheme = read_archive_header(self.f, path)
+        if archived_scheme != scheme:
+          raise ValueError(f'Tag archive {path} holds {archived_scheme} tags, not {scheme}')
+        self.count = (size - ARCHIVE_HEADER.size) // EPC_BYTES
+        # Drop any partial record left by a torn write
+        self.f.truncate(ARCHIVE_HEADER.size + self.count * EPC_BYTES)
+      self.f.seek(0, os.SEEK_END)
+    except BaseException:
+      self.f.close()
+      raise
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def __len__(self):
+    return self.count
+
+  # Append a batch of tags, returns the number of records written
+  def append(self, tags):
+    data = self.records_2_bytes(tags)
+    self.f.write(data)
+    num = len(data) // EPC_BYTES
+    self.count += num
+    return num
+
+  # Flush to the OS, and to disk with sync=True
+  def flush(self, sync=False):
+    self.f.flush()
+    if sync:
+      os.fsync(self.f.fileno())
+
+  def close(self):
+    if not self.f.closed:
+      self.f.close()
+
+  # The 12 byte records of a TagBatch, an (N, 12) uint8 array, bytes (a whole number of
+  # records), or a list of EncodedTags or packed ints
+  def records_2_bytes(self, tags):
+    if hasattr(tags, "tags") and hasattr(tags, "scheme"):
+      self.check_scheme(tags.scheme)
+      tags = tags.tags
+    if isinstance(tags, np.ndarray):
+      if tags.dtype != np.uint8 or tags.shape[-1:] != (EPC_BYTES,):
+        raise ValueError(f'Expected an (N, {EPC_BYTES}) uint8 array, not {tags.dtype} {tags.shape}')
+      return memoryview(np.ascontiguousarray(tags)).cast('B')
+    if isinstance(tags, (bytes, bytearray, memoryview)):
+      data = memoryview(tags).cast('B')
+      if len(data) % EPC_BYTES:
+        raise ValueError(f'{len(data)} bytes is not a whole number of {EPC_BYTES} byte records')
+      return data
+
+    records = []
+    for tag in tags:
+      if isinstance(tag, int):
+        records.append(epc_2_bytes(tag))
+      else:
+        self.check_scheme(tag.scheme)
+        records.append(tag.bytes)
+    return b''.join(records)
+
+  def check_scheme(self, scheme):
+    if scheme != self.scheme:
+      raise ValueError(f'Can\'t archive {scheme} tags in a {self.scheme} archive: {self.path}')
+
+# tag_archive python class to read an archive through a memory mapping
+class TagArchive:
+
+  def __init__(self, path):
+    # Instance variables
+    self.path = path
+    self.f = open(path, "rb")
+    try:
+      self.scheme = read_archive_header(self.f, path)
+      size = os.fstat(self.f.fileno()).st_size
+      self.count = (size - ARCHIVE_HEADER.size) // EPC_BYTES
+      self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+    except BaseException:
+      self.f.close()
+      raise
+    # Every whole record, as one zero copy view of the mapping
+    self.records = memoryview(self.mm)[ARCHIVE_HEADER.size:ARCHIVE_HEADER.size + self.count * EPC_BYTES]
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def __len__(self):
+    return self.count
+
+  # One record as bytes, or a slice of records as a zero copy memoryview
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      start, stop, step = i.indices(self.count)
+      if step != 1:
+        raise ValueError("Archive slices must be contiguous")
+      return self.records[start * EPC_BYTES:max(stop, start) * EPC_BYTES]
+    if i < 0:
+      i += self.count
+    if not 0 <= i < self.count:
+      raise IndexError(f'Record {i} is out of range for {self.count} records')
+    return bytes(self.records[i * EPC_BYTES:(i + 1) * EPC_BYTES])
+
+  def __iter__(self):
+    records = self.records
+    for offset in range(0, len(records), EPC_BYTES):
+      yield bytes(records[offset:offset + EPC_BYTES])
+
+  def value(self, i):
+    return int.from_bytes(self[i], 'big')
+
+  def hex(self, i):
+    return self[i].hex().upper()
+
+  def uri(self, i):
+    # Imported here, as only the URI needs the decoder
+    from decoder import epc_2_uri
+    return epc_2_uri(self.value(i))
+
+  # The records as a zero copy, read only (N, 12) uint8 array
+  def tags(self):
+    return np.frombuffer(self.mm, dtype=np.uint8, count=self.count * EPC_BYTES,
+                         offset=ARCHIVE_HEADER.size).reshape(self.count, EPC_BYTES)
+
+  # Both uint64 lanes of every record (see lanes.py)
+  def lanes(self):
+    return tags_2_lanes(self.tags())
+
+  # The mapping is only unmapped once no views of it are left, so any memoryview or
+  # array taken from the archive stays valid after close
+  def close(self):
+    if self.f.closed:
+      return
+    self.records.release()
+    try:
+      self.mm.close()
+    except BufferError:
+      pass
+    self.f.close()
@@ -12,8 +12,17 @@
 #  number is available, there are two initializers that will leverage a linear congruential
 #  generator to create a pseudo random serial number, one with a seed, one without.
 #
+#  encode_tcin returns an immutable EncodedTag instead, which only renders the
+#  binary, hex and URI forms when they are asked for.
+#
+
+import time
 
 from converter import *
+from packer import *
+from prefix_cache import prefix_cache
+from encoded_tag import EncodedTag
+from instrumentation import metrics
 from serial_number_generator import new_serial_with_seed
 
 # tcin_encoder python class to encapsulate the data in an instance
@@ -34,6 +43,10 @@ class TCINEncoder:
   # Use this with a seed
   def with_tcin_and_seed(self, tcin, seed):
     return self.with_tcin_and_serial_number (tcin, new_serial_with_seed(seed))
+
+  # Use this with a SerialAllocator, so parallel workers never duplicate a serial number
+  def with_tcin_and_allocator(self, tcin, allocator):
+    return self.with_tcin_and_serial_number(tcin, str(allocator.next_serial()))
   
   # Use this with TCIN and serial number
   def with_tcin_and_serial_number(self, tcin, ser):
@@ -71,20 +84,49 @@ class TCINEncoder:
     # 50 bits are the serial number (guaranteed 15 digits)
     # = 96 bits
   
-    tcin_bin = dec_2_bin(self.tcin, tcin_bin_len)
-    ser_bin = dec_2_bin(self.ser, ser_bin_len)
-  
-    # The return from dec_2_bin is multpiles of 4, so chop off any leading bits for those that aren't
-    if len(tcin_bin) > tcin_bin_len:
-      tcin_bin = tcin_bin[len(tcin_bin) - tcin_bin_len:]
-  
-    if len(ser_bin) > ser_bin_len:
-      ser_bin = ser_bin[len(ser_bin) - ser_bin_len:]
-  
-    self.tcin_bin = "00001000000" + tcin_bin + ser_bin
-    self.tcin_hex = bin_2_hex(self.tcin_bin, 24)
-  
-    # Strip any leading zeros before building the URI form, and build the uri
-    self.tcin_uri = "urn:epc:tag:tcin-96:0." + tcin.lstrip('0') + "." + ser.lstrip('0')
+    tag = encode_tcin(tcin, ser)
+    self.tcin_bin = tag.bin
+    self.tcin_hex = tag.hex
+    self.tcin_uri = tag.uri
   
     return self.tcin_uri
+
+# Use this with TCIN and serial number, returns an EncodedTag (see
+# TCINEncoder.with_tcin_and_serial_number)
+def encode_tcin(tcin, ser):
+  timed = metrics.enabled
+  if timed:
+    count_tcin_inputs(tcin, ser)
+    start = time.perf_counter()
+
+  # Everything but the serial is cached, see tcin_prefix below
+  tcin_epc, uri_prefix = prefix_cache.lookup(tcin_prefix, tcin)
+  tcin_epc |= int(ser[0:15]) & TCIN_96_SERIAL_MASK
+
+  # Strip any leading zeros before building the URI form
+  tag = EncodedTag(tcin_epc, TCIN_96, None, uri_prefix, ser.lstrip('0'))
+  if timed:
+    metrics.observe_since("pack", start)
+  return tag
+
+# Use this to write the 12 bytes of a tag straight into a caller's buffer (a bytearray,
+# memoryview, mmap or shared memory) at offset, without building any of the strings or
+# the EncodedTag, returns nothing
+def encode_tcin_into(buffer, offset, tcin, ser):
+  if metrics.enabled:
+    count_tcin_inputs(tcin, ser)
+  hi, lo = prefix_cache.lookup_lanes(tcin_prefix, tcin)
+  EPC_STRUCT.pack_into(buffer, offset, hi, lo | (int(ser[0:15]) & TCIN_96_SERIAL_MASK))
+
+# Count an encode, and any inputs that are truncated or zero filled (see instrumentation.py)
+def count_tcin_inputs(tcin, ser):
+  metrics.count_encode(TCIN_96)
+  metrics.check_length(TCIN_96, "tcin", tcin, 10, zero_fill=True)
+  metrics.check_length(TCIN_96, "ser", ser, 15)
+
+# The prefix (everything but the serial) of a TCIN-96, as the packed value and the
+# start of the URI, for the PrefixCache (see with_tcin_and_serial_number)
+def tcin_prefix(tcin):
+  # The packer chops off any leading bits that don't fit in each field
+  tcin_epc = pack_tcin_96(0, int(tcin[0:10].zfill(10)), 0)
+  return tcin_epc, "urn:epc:tag:tcin-96:0." + tcin.lstrip('0') + "."
@@ -0,0 +1,101 @@
+#
+#  test_batch_encoder.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the batch_encoder module
+#
+
+import unittest
+
+import numpy as np
+
+from batch_encoder import *
+from epc_encoder import EPCEncoder
+from tcin_encoder import TCINEncoder
+from tiai_encoder import TIAIEncoder
+
+class TestBatchEncoder(unittest.TestCase):
+  def test_encode_dpci_batch(self):
+    """
+    Test that a batch of DPCIs matches EPCEncoder.with_dpci
+    """
+    dpts = ["281", "001", "999", "049"]
+    clss = ["00", "05", "99", "10"]
+    itms = ["8570", "0012", "9999", "0000"]
+    sers = ["12345", "99", "9999999999", "1"]
+    batch = encode_dpci_batch(dpts, clss, itms, sers)
+    self.assertEqual(batch.tags.shape, (4, 12), msg="tags shape != (4, 12)")
+    self.assertEqual(batch.tags.dtype, np.uint8, msg="tags dtype != uint8")
+
+    encode_epc = EPCEncoder()
+    for i in range(len(batch)):
+      uri = encode_epc.with_dpci(dpts[i], clss[i], itms[i], sers[i])
+      self.assertEqual(batch.hex(i), encode_epc.gid_hex, msg="batch hex != gid_hex")
+      self.assertEqual(batch.bin(i), encode_epc.gid_bin, msg="batch bin != gid_bin")
+      self.assertEqual(batch.uri(i), uri, msg="batch uri != gid_uri")
+
+    self.assertEqual(next(batch.hexes()), "3504B3264014EC6000003039", msg="hex != 3504B3264014EC6000003039")
+
+  def test_encode_dpci_batch_with_ints(self):
+    """
+    Test that ints encode the same as zero padded strings
+    """
+    batch = encode_dpci_batch(np.array([281]), np.array([0]), np.array([8570]), np.array([12345]))
+    self.assertEqual(batch.hex(0), "3504B3264014EC6000003039", msg="hex != 3504B3264014EC6000003039")
+    self.assertEqual(batch.uri(0), "urn:epc:tag:gid-96:04928100.0085702.12345", msg="uri != urn:epc:tag:gid-96:04928100.0085702.12345")
+
+  def test_encode_tcin_batch(self):
+    """
+    Test that a batch of TCINs matches TCINEncoder.with_tcin_and_serial_number
+    """
+    tcins = ["16399080", "13951442", "9999999999"]
+    sers = ["001", "123456789012345", "999999999999999"]
+    batch = encode_tcin_batch(tcins, sers)
+
+    encode_tcin = TCINEncoder()
+    for i in range(len(batch)):
+      uri = encode_tcin.with_tcin_and_serial_number(tcins[i], sers[i])
+      self.assertEqual(batch.hex(i), encode_tcin.tcin_hex, msg="batch hex != tcin_hex")
+      self.assertEqual(batch.bin(i), encode_tcin.tcin_bin, msg="batch bin != tcin_bin")
+      self.assertEqual(batch.uri(i), uri, msg="batch uri != tcin_uri")
+
+  def test_out_of_range(self):
+    """
+    Test that values just past each field's limit are refused rather than masked
+    """
+    gid_limit = dict_scheme_2_serial_limit[GID_96]
+    tcin_limit = dict_scheme_2_serial_limit[TCIN_96]
+    self.assertEqual(encode_dpci_batch([999], [99], [9999], [gid_limit - 1]).uri(0),
+                     EPCEncoder().with_dpci("999", "99", "9999", str(gid_limit - 1)), msg="largest dpci mismatch")
+    self.assertEqual(encode_tcin_batch([TCIN_LIMIT - 1], [tcin_limit - 1]).uri(0),
+                     TCINEncoder().with_tcin_and_serial_number(str(TCIN_LIMIT - 1), str(tcin_limit - 1)),
+                     msg="largest tcin mismatch")
+    for args in (([1000], [0], [8570], [1]), ([281], [100], [8570], [1]), ([281], [0], [10000], [1]),
+                 ([281], [0], [8570], [gid_limit]), ([281], [0], [8570], [-1])):
+      with self.assertRaises(ValueError, msg=f'dpci {args} accepted'):
+        encode_dpci_batch(*args)
+    for args in (([TCIN_LIMIT], [1]), ([13951442], [tcin_limit]), ([13951442], [2 ** 50 + 5]), ([2 ** 36], [1])):
+      with self.assertRaises(ValueError, msg=f'tcin {args} accepted'):
+        encode_tcin_batch(*args)
+
+  def test_encode_tiai_char_batch(self):
+    """
+    Test that a batch of character asset IDs matches TIAIEncoder.with_char_id
+    """
+    asset_refs = ["017", "7", "1234"]
+    asset_ids = ["123ABC", "y2a630", "ABCDEFGHIJKLMN"]
+    batch = encode_tiai_char_batch(asset_refs, asset_ids)
+
+    encode_tiai = TIAIEncoder()
+    for i in range(len(batch)):
+      encode_tiai.with_char_id(asset_refs[i], asset_ids[i])
+      self.assertEqual(batch.hex(i), encode_tiai.tiai_hex, msg="batch hex != tiai_hex")
+
+    with self.assertRaises(ValueError):
+      encode_tiai_char_batch(["017"], ["ABC$"])
+
+if __name__ == '__main__':
+  unittest.main()
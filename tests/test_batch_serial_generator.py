@@ -0,0 +1,91 @@
+#
+#  test_batch_serial_generator.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the batch_serial_generator module
+#
+
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from batch_serial_generator import *
+from serial_number_generator import linear_congruential_generator_with_seed, new_serial_with_seed, permuted_serial
+from epc_encoder import encode_dpci, encode_gtin
+from batch_encoder import encode_tcin_batch
+from tcin_encoder import TCINEncoder
+
+class TestBatchSerialGenerator(unittest.TestCase):
+  def test_serials_with_seed(self):
+    """
+    Test that the batch LCG matches new_serial_with_seed for consecutive seeds
+    """
+    now = 1621209600
+    serials = serials_with_seed("7725272730706", 1000, now=now)
+    self.assertEqual(serials.dtype, np.uint64, msg="serials dtype != uint64")
+    self.assertEqual(len(set(serials.tolist())), 1000, msg="batch serials repeat")
+
+    seed = 7725272730706 + int(linear_congruential_generator_with_seed(now))
+    for i in (0, 1, 999):
+      expected = f'{"00" + linear_congruential_generator_with_seed(seed + i):<015}'
+      self.assertEqual(int(serials[i]), int(expected), msg="batch serial != new_serial_with_seed")
+
+  def test_serials_with_seed_schemes(self):
+    """
+    Test that GID-96 and SGTIN-96 batch serials are the serials the encoders keep from
+    new_serial_with_seed, not the 15 digit serial masked to the field
+    """
+    now = 1621209600
+    encoders = {
+      GID_96: lambda ser: encode_dpci("281", "00", "8570", ser).value & GID_96_SERIAL_MASK,
+      SGTIN_96: lambda ser: encode_gtin("00043935460624", ser, "101").value & SGTIN_96_SERIAL_MASK
+    }
+    for scheme, encode in encoders.items():
+      serials = serials_with_seed(12, 200, scheme, now=now)
+      self.assertLess(int(serials.max()), dict_scheme_2_serial_limit[scheme], msg=f'{scheme} serial too wide')
+      with mock.patch("serial_number_generator.time.time", return_value=now):
+        expected = [encode(new_serial_with_seed(12 + i)) for i in range(200)]
+      self.assertEqual(serials.tolist(), expected, msg=f'{scheme} batch serials != new_serial_with_seed')
+
+  def test_lcg_batch(self):
+    """
+    Test the overflow free LCG against the python int version for large seeds
+    """
+    seeds = np.array([0, 1, LCG_PRIME - 1, LCG_PRIME, 2 ** 63 + 12345], dtype=np.uint64)
+    expected = [int(linear_congruential_generator_with_seed(int(seed))) for seed in seeds]
+    self.assertEqual(lcg_batch(seeds).tolist(), expected, msg="lcg_batch != linear_congruential_generator_with_seed")
+
+  def test_serials_with_key(self):
+    """
+    Test that the batch permutation matches permuted_serial and fits each scheme
+    """
+    serials = serials_with_key(12345, 10 ** 6, 1000)
+    expected = [permuted_serial(12345, 10 ** 6 + i, 10 ** 15) for i in range(1000)]
+    self.assertEqual(serials.tolist(), expected, msg="serials_with_key != permuted_serial")
+
+    serials = permuted_serials(12345, np.arange(1 << 12), 1 << 12)
+    self.assertEqual(sorted(serials.tolist()), list(range(1 << 12)), msg="permuted serials are not a permutation")
+
+    serials = serials_with_key(12345, 0, 1000, GID_96)
+    self.assertLess(int(serials.max()), 10 ** 10, msg="GID serial too wide")
+
+    with self.assertRaises(ValueError):
+      permuted_serials(12345, [1000], 1000)
+
+  def test_batch_encode(self):
+    """
+    Test that batch serials plug straight into the batch encoders
+    """
+    serials = serials_with_key(12345, 0, 3)
+    batch = encode_tcin_batch(["13951442"] * 3, serials)
+    encode_tcin = TCINEncoder()
+    for i in range(3):
+      encode_tcin.with_tcin_and_serial_number("13951442", str(serials[i]))
+      self.assertEqual(batch.hex(i), encode_tcin.tcin_hex, msg="batch hex != tcin_hex")
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,65 @@
+#
+#  test_benchmark_suite.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the benchmark suite
+#
+
+import unittest
+
+from benchmarks.benchmark_suite import *
+
+def results(**ops_and_peaks):
+  return {"results": {key: {"ops_per_sec": ops, "peak_bytes": peak} for key, (ops, peak) in ops_and_peaks.items()}}
+
+class TestBenchmarkSuite(unittest.TestCase):
+  def test_percentile(self):
+    """
+    Test nearest rank percentiles
+    """
+    values = list(range(1, 101))
+    self.assertEqual(percentile(values, 50), 50, msg="p50 != 50")
+    self.assertEqual(percentile(values, 99), 99, msg="p99 != 99")
+    self.assertEqual(percentile([7], 90), 7, msg="p90 of one value != 7")
+    self.assertEqual(percentile([], 50), 0.0, msg="p50 of nothing != 0")
+
+  def test_compare_results(self):
+    """
+    Test that only changes beyond the threshold are flagged, for cases in both runs
+    """
+    baseline = results(a=(1000, 100), b=(1000, 100), c=(1000, 100))
+    current = results(a=(950, 105), b=(800, 100), c=(1000, 200), d=(1, 1))
+    regressions = compare_results(baseline, current, 0.1)
+    self.assertEqual([(r["key"], r["metric"]) for r in regressions], [("b", "ops_per_sec"), ("c", "peak_bytes")],
+                     msg="regressions != b ops_per_sec, c peak_bytes")
+    self.assertAlmostEqual(regressions[0]["change"], -0.2, msg="change != -20%")
+    self.assertEqual(compare_results(baseline, current, 1.5), [], msg="regressions within 150% threshold")
+
+  def test_run_case(self):
+    """
+    Test running a scalar and a batch case
+    """
+    result = run_case("epc_encoder.encode_dpci", 10)
+    self.assertEqual(result["calls"], 10, msg="calls != 10")
+    self.assertGreater(result["ops_per_sec"], 0, msg="ops_per_sec <= 0")
+    self.assertLessEqual(result["p50_us"], result["p99_us"], msg="p50 > p99")
+
+    result = run_case("batch_encoder.encode_tcin_batch", 10, repeat=2)
+    self.assertEqual(result["kind"], "batch", msg="kind != batch")
+    self.assertGreater(result["peak_bytes"], 0, msg="peak_bytes <= 0")
+
+    with self.assertRaises(ValueError):
+      run_case("sscc", 10)
+
+  def test_every_case(self):
+    """
+    Test that every case runs
+    """
+    for name in case_names():
+      self.assertGreater(run_case(name, 4, repeat=1)["ops_per_sec"], 0, msg=f'{name} ops_per_sec <= 0')
+
+if __name__ == '__main__':
+  unittest.main()
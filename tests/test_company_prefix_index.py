@@ -0,0 +1,100 @@
+#
+#  test_company_prefix_index.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the company_prefix_index module
+#
+
+import os
+import tempfile
+import unittest
+
+from company_prefix_index import *
+from epc_encoder import EPCEncoder
+
+GCP_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<gcpPrefixFormatList date="2021-05-17T00:00:00">
+  <entry prefix="00439" gcpLength="7"/>
+  <entry prefix="06141" gcpLength="7"/>
+  <entry prefix="0614199" gcpLength="9"/>
+  <entry prefix="0885909" gcpLength="6"/>
+</gcpPrefixFormatList>
+"""
+
+class TestCompanyPrefixIndex(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.dir.name, "gcpprefixformatlist.xml")
+    with open(self.path, "w") as f:
+      f.write(GCP_XML)
+    self.index = CompanyPrefixIndex.load(self.path)
+
+  def tearDown(self):
+    self.dir.cleanup()
+
+  def test_partition(self):
+    """
+    Test longest prefix lookups for single GTINs
+    """
+    self.assertEqual(len(self.index), 4, msg="len(index) != 4")
+    self.assertEqual(self.index.partition("00043935460624"), 5, msg="partition != 5")
+    self.assertEqual(self.index.partition("00614141123452"), 5, msg="partition != 5")
+    self.assertEqual(self.index.partition("00614199123452"), 3, msg="partition != 3")
+    self.assertEqual(self.index.partition("885909123452"), 6, msg="partition != 6")
+    self.assertEqual(self.index.partition("00999999123452"), None, msg="partition != None")
+
+  def test_partitions(self):
+    """
+    Test that the batch lookup matches the single lookup
+    """
+    gtins = ["00043935460624", "00614141123452", "00614199123452", "885909123452", "00999999123452"]
+    self.assertEqual(self.index.partitions(gtins).tolist(), [5, 5, 3, 6, -1], msg="partitions != [5, 5, 3, 6, -1]")
+    self.assertEqual(self.index.partitions(np.array([43935460624], dtype=np.uint64)).tolist(), [5],
+                     msg="partitions != [5]")
+
+  def test_long_gtins(self):
+    """
+    Test that GTINs over 14 digits are cut the same way by the batch and single lookups
+    """
+    gtins = ["123456789012345678", "004393546062499", "0000614141123452", "12345"]
+    self.assertEqual(gtins_2_keys(gtins).tolist(), [int(gtin_2_key(gtin)) for gtin in gtins], msg="string keys mismatch")
+    numbers = [123456789012345678, 43935460624, 614141123452999]
+    self.assertEqual(gtins_2_keys(np.array(numbers, dtype=np.uint64)).tolist(),
+                     [int(gtin_2_key(gtin)) for gtin in numbers], msg="int keys mismatch")
+    self.assertEqual(self.index.partitions(gtins).tolist(),
+                     [-1 if self.index.partition(gtin) is None else self.index.partition(gtin) for gtin in gtins],
+                     msg="partitions mismatch")
+
+  def test_text_file(self):
+    """
+    Test loading a text file of prefix and length pairs
+    """
+    path = os.path.join(self.dir.name, "gcp.txt")
+    with open(path, "w") as f:
+      f.write("# prefix,length\n00439,7\n0614199 9\n\n")
+    index = CompanyPrefixIndex.load(path)
+    self.assertEqual(index.partition("00614199123452"), 3, msg="partition != 3")
+    self.assertEqual(index.partition("00614141123452"), None, msg="partition != None")
+
+    with self.assertRaises(ValueError):
+      CompanyPrefixIndex([("06141X", 7)])
+
+  def test_with_gtin_and_index(self):
+    """
+    Test encoding a GTIN with the partition from the index
+    """
+    encode_epc = EPCEncoder()
+    uri = encode_epc.with_gtin_and_index("00043935460624", "1", self.index)
+    self.assertEqual(uri, "urn:epc:tag:sgtin-96:1.0043935.046062.1", msg="uri != urn:epc:tag:sgtin-96:1.0043935.046062.1")
+    gtin_hex = encode_epc.gtin_hex
+    encode_epc.with_gtin("00043935460624", "1", "101")
+    self.assertEqual(gtin_hex, encode_epc.gtin_hex, msg="with_gtin_and_index != with_gtin")
+
+    with self.assertRaises(ValueError):
+      encode_epc.with_gtin_and_index("00999999123452", "1", self.index)
+
+if __name__ == '__main__':
+  unittest.main()
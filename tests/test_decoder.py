@@ -0,0 +1,121 @@
+#
+#  test_decoder.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the decoder module
+#
+
+import unittest
+
+import numpy as np
+
+from decoder import *
+from epc_encoder import EPCEncoder
+from tcin_encoder import TCINEncoder
+from tiai_encoder import TIAIEncoder
+from batch_encoder import chars_2_asset_id_lanes
+
+class TestDecoder(unittest.TestCase):
+  def test_decode_gid_96(self):
+    """
+    Test decoding a GID-96 back to the encoder's URI
+    """
+    encode_epc = EPCEncoder()
+    uri = encode_epc.with_dpci("281", "00", "8570", "12345")
+    decoded = decode_hex(encode_epc.gid_hex)
+    self.assertEqual(decoded["scheme"], GID_96, msg="scheme != gid-96")
+    self.assertEqual(decoded["manager"], 4928100, msg="manager != 4928100")
+    self.assertEqual(decoded["object_class"], 85702, msg="object_class != 85702")
+    self.assertEqual(decoded["serial"], 12345, msg="serial != 12345")
+    self.assertEqual(decoded["uri"], uri, msg="uri != gid_uri")
+
+  def test_decode_sgtin_96(self):
+    """
+    Test decoding an SGTIN-96 in every partition
+    """
+    encode_epc = EPCEncoder()
+    for part in range(7):
+      uri = encode_epc.with_gtin("00043935460624", "12345", f'{part:03b}')
+      decoded = decode_hex(encode_epc.gtin_hex)
+      self.assertEqual(decoded["partition"], part, msg="partition mismatch")
+      self.assertEqual(decoded["uri"], uri, msg="uri != gtin_uri")
+      self.assertEqual(decoded["gtin"], "00043935460624", msg="gtin != 00043935460624")
+
+  def test_decode_tcin_96(self):
+    """
+    Test decoding a TCIN-96
+    """
+    encode_tcin = TCINEncoder()
+    uri = encode_tcin.with_tcin_and_serial_number("13951442", "123456789012345")
+    decoded = decode_bytes(bytes.fromhex(encode_tcin.tcin_hex))
+    self.assertEqual(decoded["tcin"], 13951442, msg="tcin != 13951442")
+    self.assertEqual(decoded["serial"], 123456789012345, msg="serial != 123456789012345")
+    self.assertEqual(decoded["uri"], uri, msg="uri != tcin_uri")
+
+  def test_decode_tiai_a_96(self):
+    """
+    Test decoding a TIAI-A-96 in each asset ID form
+    """
+    encode_tiai = TIAIEncoder()
+    uri = encode_tiai.with_dec_id("017", "12345678901234567890")
+    self.assertEqual(decode_hex(encode_tiai.tiai_hex)["uri"], uri, msg="dec uri != tiai_uri")
+
+    uri = encode_tiai.with_hex_id("017", "AF034C16FD")
+    self.assertEqual(tiai_a_96_uri(int(encode_tiai.tiai_hex, 16), "hex"), uri, msg="hex uri != tiai_uri")
+
+    uri = encode_tiai.with_char_id("07", "0Y2A630")
+    decoded = decode_hex(encode_tiai.tiai_hex)
+    self.assertEqual(decoded["asset_ref"], 7, msg="asset_ref != 7")
+    self.assertEqual(decoded["asset_id_char"], "0Y2A630", msg="asset_id_char != 0Y2A630")
+    self.assertEqual(tiai_a_96_uri(int(encode_tiai.tiai_hex, 16), "char"), uri, msg="char uri != tiai_uri")
+
+  def test_unsupported_header(self):
+    """
+    Test that an unknown header raises a ValueError
+    """
+    with self.assertRaises(ValueError):
+      decode_hex("E28011702000000000000000")
+
+  def test_decode_buffer(self):
+    """
+    Test bulk decoding a buffer of concatenated EPCs
+    """
+    hexes = ["3504B3264014EC6000003039", "0800035387487048860DDF79", "303402AE7C2CFB8000003039",
+             "0A001100AB54A98CEB1F0AD2", "E28011702000000000000000", "080003E8EBA0000000000001"]
+    decoded = decode_buffer(b"".join(bytes.fromhex(h) for h in hexes))
+
+    self.assertEqual(decoded[TCIN_96]["rows"].tolist(), [1, 5], msg="tcin rows != [1, 5]")
+    self.assertEqual(decoded[TCIN_96]["tcin"].tolist(), [13951442, 16399080], msg="tcin mismatch")
+    self.assertEqual(decoded[TCIN_96]["serial"].tolist(), [123456789012345, 1], msg="tcin serial mismatch")
+    self.assertEqual(decoded[GID_96]["manager"].tolist(), [4928100], msg="gid manager != 4928100")
+    self.assertEqual(decoded[GID_96]["object_class"].tolist(), [85702], msg="gid object class != 85702")
+    self.assertEqual(decoded[SGTIN_96]["company_prefix"].tolist(), [43935], msg="sgtin company prefix != 43935")
+    self.assertEqual(decoded[SGTIN_96]["item_reference"].tolist(), [46062], msg="sgtin item reference != 46062")
+    self.assertEqual(decoded[TIAI_A_96]["asset_ref"].tolist(), [17], msg="tiai asset ref != 17")
+    asset_id = (int(decoded[TIAI_A_96]["asset_id_hi"][0]) << 64) | int(decoded[TIAI_A_96]["asset_id_lo"][0])
+    self.assertEqual(asset_id, 12345678901234567890, msg="tiai asset id != 12345678901234567890")
+    self.assertEqual(decoded["unknown"]["rows"].tolist(), [4], msg="unknown rows != [4]")
+
+  def test_asset_id_lanes_2_chars(self):
+    """
+    Test that the TIAI batch codec matches tiai_codec
+    """
+    asset_ids = ["123ABC", "y2a630", "", "A B", "ABCDEFGHIJKL", "ABCDEFGHIJKLMN"]
+    hi, lo = chars_2_asset_id_lanes(asset_ids)
+    for i, asset_id in enumerate(asset_ids):
+      expected = chars_2_asset_id(asset_id.upper()[:12])
+      self.assertEqual(int(hi[i]) << 64 | int(lo[i]), expected, msg=f'lanes != chars_2_asset_id({asset_id})')
+
+    chars, valid = asset_id_lanes_2_chars(np.append(hi, np.uint64(0)), np.append(lo, np.uint64(0x3F)))
+    self.assertEqual(chars.tolist(), ["123ABC", "Y2A630", "", "AB", "ABCDEFGHIJKL", "ABCDEFGHIJKL", ""],
+                     msg="decoded chars don't match")
+    self.assertEqual(valid.tolist(), [True] * 6 + [False], msg="valid != character codes")
+
+    with self.assertRaises(ValueError):
+      chars_2_asset_id_lanes(["ABC", "AB_C"])
+
+if __name__ == '__main__':
+  unittest.main()
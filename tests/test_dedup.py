@@ -0,0 +1,82 @@
+#
+#  test_dedup.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the dedup module
+#
+
+import unittest
+
+from dedup import *
+from tcin_encoder import encode_tcin
+
+class TestReadDeduper(unittest.TestCase):
+  def setUp(self):
+    self.tags = [encode_tcin("13951442", str(serial)) for serial in range(3)]
+
+  def test_time_window(self):
+    """
+    Test repeats are suppressed until the first read leaves the time window
+    """
+    expired = []
+    deduper = ReadDeduper(window=1.0, on_expire=lambda *args: expired.append(args))
+    epc = self.tags[0].value
+    self.assertTrue(deduper.add(epc, timestamp=0.0), msg="first read suppressed")
+    self.assertFalse(deduper.add(epc, timestamp=0.5), msg="repeat reported")
+    self.assertFalse(deduper.add(self.tags[0].bytes, timestamp=0.9), msg="repeat as bytes reported")
+    self.assertEqual(deduper.suppressed(epc), 2, msg="suppressed != 2")
+    self.assertTrue(deduper.add(self.tags[1].value, timestamp=0.9), msg="other tag suppressed")
+    self.assertTrue(deduper.add(epc, timestamp=1.0), msg="read after the window suppressed")
+    self.assertEqual(expired, [(epc, None, 2)], msg="expired mismatch")
+    self.assertEqual(deduper.suppressed(epc), 0, msg="suppressed not reset")
+    self.assertEqual(deduper.info(), DedupInfo(5, 3, 2, 2), msg="info mismatch")
+
+    deduper.expire(5.0)
+    self.assertEqual(len(deduper), 0, msg="window not empty")
+    self.assertEqual(deduper.suppressed(epc), None, msg="expired read still suppressed")
+
+  def test_count_window(self):
+    """
+    Test a window bounded by count keeps only the most recently reported EPCs
+    """
+    deduper = ReadDeduper(window=None, max_keys=2)
+    reads = [(tag.value, 0, 0.0) for tag in self.tags + self.tags[2:0:-1] + self.tags[:1]]
+    reported = [read[0] for read in deduper.dedup(reads)]
+    self.assertEqual(reported, [tag.value for tag in self.tags + self.tags[:1]], msg="reported mismatch")
+    self.assertEqual(len(deduper), 2, msg="window size != 2")
+    with self.assertRaises(ValueError):
+      ReadDeduper(window=None)
+
+  def test_per_antenna(self):
+    """
+    Test that per antenna, the first read on each antenna is reported
+    """
+    expired = []
+    deduper = ReadDeduper(window=1.0, per_antenna=True, on_expire=lambda *args: expired.append(args))
+    epc = self.tags[0].value
+    self.assertTrue(deduper.add(epc, 1, 0.0), msg="antenna 1 suppressed")
+    self.assertTrue(deduper.add(epc, 2, 0.0), msg="antenna 2 suppressed")
+    self.assertFalse(deduper.add(epc, 2, 0.1), msg="antenna 2 repeat reported")
+    deduper.flush()
+    self.assertEqual(expired, [(epc, 1, 0), (epc, 2, 1)], msg="expired mismatch")
+    with self.assertRaises(ValueError):
+      deduper.add(epc, 1 << ANTENNA_BITS)
+
+  def test_filter_buffer(self):
+    """
+    Test filtering a buffer of raw reads down to the first reads
+    """
+    deduper = ReadDeduper(window=10.0)
+    raw = b''.join(self.tags[i % 2].bytes for i in range(100))
+    self.assertEqual(deduper.filter_buffer(raw, timestamp=0.0), self.tags[0].bytes + self.tags[1].bytes,
+                     msg="filtered buffer mismatch")
+    self.assertEqual(deduper.filter_buffer(raw + self.tags[2].bytes, timestamp=1.0), self.tags[2].bytes,
+                     msg="second buffer mismatch")
+    with self.assertRaises(ValueError):
+      deduper.filter_buffer(raw[:-1])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,140 @@
+#
+#  test_encode_service.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the encode_service module on localhost
+#
+
+import asyncio
+import json
+import unittest
+
+from encode_service import *
+from tcin_encoder import encode_tcin
+
+class TestEncodeService(unittest.IsolatedAsyncioTestCase):
+  async def asyncSetUp(self):
+    self.service = EncodeService(max_batch_size=32, max_wait=0.005)
+    self.port = await self.service.start()
+
+  async def asyncTearDown(self):
+    await self.service.stop()
+
+  async def send_lines(self, lines):
+    reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+    writer.write("".join(line + "\n" for line in lines).encode("utf-8"))
+    await writer.drain()
+    responses = [json.loads(await reader.readline()) for _ in lines]
+    writer.close()
+    await writer.wait_closed()
+    return responses
+
+  async def test_concurrent_clients(self):
+    """
+    Test many pipelined requests from many clients, coalesced into batches
+    """
+    clients = [[json.dumps({"id": i, "scheme": "tcin", "tcin": str(13951442 + client), "ser": str(i)})
+                for i in range(25)] for client in range(8)]
+    results = await asyncio.gather(*(self.send_lines(lines) for lines in clients))
+
+    for client, responses in enumerate(results):
+      for i, response in enumerate(responses):
+        tag = encode_tcin(str(13951442 + client), str(i))
+        self.assertEqual(response, {"id": i, "hex": tag.hex, "uri": tag.uri}, msg=f'client {client} row {i} mismatch')
+
+    stats = self.service.stats()
+    self.assertEqual(stats["requests"], 200, msg="requests != 200")
+    self.assertLess(stats["batches"], 200, msg="requests were not batched")
+    self.assertLessEqual(stats["mean_batch_size"], 32, msg="mean_batch_size > max_batch_size")
+    self.assertEqual(stats["metrics"]["stages"]["request"]["count"], 200, msg="request latencies != 200")
+
+  async def test_errors(self):
+    """
+    Test that bad requests get an error line, and the connection carries on
+    """
+    responses = await self.send_lines([
+      "not json",
+      json.dumps({"id": 1, "scheme": "sscc"}),
+      json.dumps({"id": 2, "scheme": "dpci", "dpt": "281", "cls": "00", "itm": "8570"}),
+      json.dumps({"id": 3, "scheme": "dpci", "dpt": "281", "cls": "00", "itm": "8570", "ser": "abc"}),
+      json.dumps({"id": 4, "scheme": "dpci", "dpt": "281", "cls": "00", "itm": "8570", "ser": "12345", "fields": ["bin"]})
+    ])
+    self.assertIn("error", responses[0], msg="no error for bad json")
+    self.assertEqual(responses[1], {"id": 1, "error": "Unsupported scheme: sscc"}, msg="scheme error mismatch")
+    self.assertEqual(responses[2], {"id": 2, "error": "Missing field: ser"}, msg="missing field error mismatch")
+    self.assertIn("error", responses[3], msg="no error for bad serial")
+    self.assertEqual(len(responses[4]["bin"]), 96, msg="len(bin) != 96")
+
+    # Requests on a connection run concurrently, so ask for the stats once they are done
+    stats = (await self.send_lines([json.dumps({"id": 5, "command": "stats"})]))[0]["stats"]
+    self.assertEqual(stats["errors"], 4, msg="errors != 4")
+
+  async def test_stop_with_pending_request(self):
+    """
+    Test that a request still waiting for a batch when the service stops gets an error line
+    """
+    service = EncodeService()
+    # A queue with no batcher running, so the request stays pending
+    service.batcher.queue = asyncio.Queue(service.batcher.max_pending)
+    request = asyncio.ensure_future(service.respond(json.dumps({"id": 1, "scheme": "tcin", "tcin": "13951442", "ser": "1"})))
+    await asyncio.sleep(0.01)
+    self.assertEqual(service.batcher.pending(), 1, msg="pending != 1")
+
+    await service.stop()
+    self.assertEqual(json.loads(await request), {"id": 1, "error": "Service stopped"}, msg="stopped error mismatch")
+    self.assertEqual(service.stats()["errors"], 1, msg="errors != 1")
+
+  async def test_stop_while_batching(self):
+    """
+    Test that requests in a batch that is still filling up fail when the batcher stops
+    """
+    batcher = MicroBatcher(lambda items: items, max_batch_size=4, max_wait=1.0)
+    batcher.start()
+    submits = [asyncio.ensure_future(batcher.submit(i)) for i in range(2)]
+    await asyncio.sleep(0.05)
+    self.assertEqual((batcher.pending(), len(batcher.batch)), (0, 2), msg="requests are not in the batch")
+
+    await batcher.stop()
+    results = await asyncio.wait_for(asyncio.gather(*submits, return_exceptions=True), 1.0)
+    for result in results:
+      self.assertIsInstance(result, ConnectionAbortedError, msg="request was not failed")
+    self.assertEqual(batcher.batches, 0, msg="batches != 0")
+
+  async def test_micro_batcher(self):
+    """
+    Test that batches never go over max_batch_size, and results go back to each caller
+    """
+    sizes = []
+    def encode_batch(items):
+      sizes.append(len(items))
+      return [item * 2 if item != 3 else ValueError("three") for item in items]
+
+    batcher = MicroBatcher(encode_batch, max_batch_size=4, max_wait=0.01)
+    batcher.start()
+    try:
+      results = await asyncio.gather(*(batcher.submit(i) for i in range(10)), return_exceptions=True)
+    finally:
+      await batcher.stop()
+    self.assertEqual(sizes, [4, 4, 2], msg="batch sizes != [4, 4, 2]")
+    self.assertEqual(results[:3], [0, 2, 4], msg="results mismatch")
+    self.assertIsInstance(results[3], ValueError, msg="results[3] is not a ValueError")
+
+  async def test_backpressure(self):
+    """
+    Test that submitting waits while the queue is full
+    """
+    batcher = MicroBatcher(lambda items: items, max_pending=2)
+    batcher.queue = asyncio.Queue(batcher.max_pending)
+    submits = [asyncio.ensure_future(batcher.submit(i)) for i in range(3)]
+    await asyncio.sleep(0.01)
+    self.assertEqual(batcher.pending(), 2, msg="pending != 2 with no batcher running")
+
+    batcher.task = asyncio.get_running_loop().create_task(batcher.run())
+    self.assertEqual(await asyncio.gather(*submits), [0, 1, 2], msg="results != [0, 1, 2]")
+    await batcher.stop()
+
+if __name__ == '__main__':
+  unittest.main()
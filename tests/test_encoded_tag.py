@@ -0,0 +1,77 @@
+#
+#  test_encoded_tag.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the encoded_tag module
+#
+
+import unittest
+
+from encoded_tag import *
+from epc_encoder import EPCEncoder, encode_dpci, encode_gtin, encode_gtin_in_gid
+from tcin_encoder import TCINEncoder, encode_tcin
+from tiai_encoder import TIAIEncoder, encode_tiai_char, encode_tiai_dec, encode_tiai_hex
+
+class TestEncodedTag(unittest.TestCase):
+  def test_lazy_forms(self):
+    """
+    Test that each form is rendered once, on first use
+    """
+    tag = encode_dpci("281", "00", "8570", "12345")
+    self.assertEqual(tag.scheme, GID_96, msg="scheme != gid-96")
+    self.assertIsNone(tag._hex, msg="hex rendered before it was asked for")
+    self.assertEqual(tag.hex, "3504B3264014EC6000003039", msg="hex != 3504B3264014EC6000003039")
+    self.assertIs(tag.hex, tag.hex, msg="hex not cached")
+    self.assertEqual(tag.bytes, bytes.fromhex("3504B3264014EC6000003039"), msg="bytes != 3504B3264014EC6000003039")
+    self.assertEqual(tag.uri, "urn:epc:tag:gid-96:04928100.0085702.12345", msg="uri != urn:epc:tag:gid-96:04928100.0085702.12345")
+    self.assertEqual(tag.bin, f'{tag.value:096b}', msg="bin != value")
+
+  def test_immutable(self):
+    """
+    Test that a tag can't be changed, and compares by value
+    """
+    tag = encode_tcin("16399080", "1")
+    with self.assertRaises(AttributeError):
+      tag.value = 0
+    with self.assertRaises(AttributeError):
+      tag.note = "x"
+    self.assertEqual(tag, EncodedTag(tag.value, TCIN_96), msg="tags with the same value are not equal")
+    self.assertEqual(len({tag, encode_tcin("16399080", "01")}), 1, msg="equal tags hash differently")
+
+  def test_uri_from_value(self):
+    """
+    Test building the URI from the value alone
+    """
+    self.assertEqual(EncodedTag(0x3504B3264014EC6000003039, GID_96).uri, "urn:epc:tag:gid-96:04928100.0085702.12345",
+                     msg="uri != urn:epc:tag:gid-96:04928100.0085702.12345")
+    tag = encode_tiai_char("017", "123abc")
+    self.assertEqual(EncodedTag(tag.value, TIAI_A_96, "char").uri, tag.uri, msg="char form uri != encoder uri")
+
+  def test_shims(self):
+    """
+    Test that the encoder classes match the encode functions
+    """
+    encode_epc = EPCEncoder()
+    self.assertEqual(encode_epc.with_gtin("00043935460624", "12345", "101"), encode_gtin("00043935460624", "12345", "101").uri,
+                     msg="with_gtin != encode_gtin")
+    self.assertEqual(encode_epc.gtin_hex, encode_gtin("00043935460624", "12345", "101").hex, msg="gtin_hex != encode_gtin")
+    encode_epc.with_gtin_in_gid("00052175551276", "0100012345")
+    self.assertEqual(encode_epc.gid_uri, encode_gtin_in_gid("00052175551276", "0100012345").uri, msg="with_gtin_in_gid != encode_gtin_in_gid")
+
+    encoder = TCINEncoder()
+    encoder.with_tcin_and_serial_number("13951442", "007")
+    self.assertEqual(encoder.tcin_uri, encode_tcin("13951442", "007").uri, msg="with_tcin_and_serial_number != encode_tcin")
+
+    encode_tiai = TIAIEncoder()
+    for method, function, asset_id in ((encode_tiai.with_dec_id, encode_tiai_dec, "123456789012345"),
+                                       (encode_tiai.with_char_id, encode_tiai_char, "Y2a630"),
+                                       (encode_tiai.with_hex_id, encode_tiai_hex, "00abc")):
+      uri = method("017", asset_id)
+      tag = function("017", asset_id)
+      self.assertEqual((uri, encode_tiai.tiai_hex), (tag.uri, tag.hex), msg=f'{method.__name__} != {function.__name__}')
+
+if __name__ == '__main__':
+  unittest.main()
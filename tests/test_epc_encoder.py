@@ -129,5 +129,17 @@ class TestEPCConverter(unittest.TestCase):
     self.assertEqual(calculate_check_digit("01149103868"), "7", msg="calculate_check_digit !- 7")
     self.assertEqual(calculate_check_digit("64393443327"), "0", msg="calculate_check_digit !- 0")
     
+  def test_encode_into(self):
+    """
+    Test writing tags straight into a buffer
+    """
+    buffer = bytearray(36)
+    encode_dpci_into(buffer, 0, "281", "00", "8570", "12345")
+    encode_gtin_in_gid_into(buffer, 12, "00043935460623", "12345")
+    encode_gtin_into(buffer, 24, "00043935460623", "12345", "101")
+    self.assertEqual(buffer[0:12].hex().upper(), encode_dpci("281", "00", "8570", "12345").hex, msg="dpci mismatch")
+    self.assertEqual(bytes(buffer[12:24]), encode_gtin_in_gid("00043935460623", "12345").bytes, msg="gtin_in_gid mismatch")
+    self.assertEqual(buffer[24:36].hex().upper(), "303402AE7C2CFB8000003039", msg="gtin != 303402AE7C2CFB8000003039")
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,104 @@
+#
+#  test_epc_index.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the epc_index module
+#
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import epc_index
+from epc_index import *
+from batch_encoder import encode_tcin_batch, encode_dpci_batch, encode_tiai_char_batch
+from tag_archive import TagArchiveWriter, TagArchive
+from tcin_encoder import encode_tcin
+
+class TestEPCIndex(unittest.TestCase):
+  def setUp(self):
+    self.tcins = encode_tcin_batch(np.full(1000, 13951442), np.arange(1000))
+    self.dpcis = encode_dpci_batch(np.full(500, 249), np.full(500, 1), np.full(500, 1234), np.arange(500))
+    self.index = EPCIndex.from_batches([self.tcins, self.dpcis])
+
+  def test_lookup(self):
+    """
+    Test a bulk lookup of a read buffer, in any order, with misses
+    """
+    self.assertEqual(len(self.index), 1500, msg="len != 1500")
+    order = np.random.default_rng(7).permutation(1500)
+    reads = np.concatenate([self.tcins.tags, self.dpcis.tags])[order]
+    self.assertTrue(np.array_equal(self.index.lookup_tags(reads), order), msg="lookup_tags mismatch")
+    self.assertTrue(np.array_equal(self.index.lookup_tags(reads.tobytes()), order), msg="buffer lookup mismatch")
+
+    unknown = encode_tcin_batch(np.full(3, 13951442), np.arange(1000, 1003))
+    self.assertEqual(self.index.lookup(*unknown.lanes()).tolist(), [-1, -1, -1], msg="unknown serials found")
+    self.assertEqual(self.index.lookup_tags(unknown.tags, default=-7).tolist(), [-7] * 3, msg="default ignored")
+    self.assertEqual(self.index.get(self.tcins.value(42)), 42, msg="get(42) != 42")
+    self.assertEqual(self.index.get(encode_tcin("13951442", "123456789012345").value), None, msg="get of unknown")
+    self.assertEqual(len(EPCIndex.from_tags(b'').lookup_tags(reads)), 1500, msg="empty index lookup")
+
+  def test_duplicates(self):
+    """
+    Test that a repeated EPC keeps its last value, and values must match the EPCs
+    """
+    tags = np.concatenate([self.tcins.tags[:10], self.tcins.tags[:5]])
+    index = EPCIndex.from_tags(tags, np.arange(100, 115))
+    self.assertEqual(len(index), 10, msg="len != 10")
+    self.assertEqual(index.lookup_tags(self.tcins.tags[:10]).tolist(), list(range(110, 115)) + list(range(105, 110)),
+                     msg="duplicates kept the wrong value")
+    with self.assertRaises(ValueError):
+      EPCIndex.from_tags(tags, np.arange(3))
+
+  def test_hash_collisions(self):
+    """
+    Test EPCs that share a hash are still told apart
+    """
+    hi, lo = self.tcins.lanes()
+    try:
+      epc_index.hash_lanes = lambda hi, lo: lo & np.uint64(0xF)
+      index = EPCIndex(hi, lo)
+      self.assertTrue(np.array_equal(index.lookup(hi[::-1], lo[::-1]), np.arange(1000)[::-1]), msg="collision mismatch")
+      self.assertEqual(index.lookup(hi[:1], lo[:1] + np.uint64(1 << 60)).tolist(), [-1], msg="collision miss found")
+    finally:
+      epc_index.hash_lanes = hash_lanes
+
+  def test_prefix(self):
+    """
+    Test that unknown serials of known items resolve to their item
+    """
+    self.assertEqual(drop_serials(*self.tcins.lanes())[1].tolist(), [self.tcins.lanes()[1][0] & ~np.uint64((1 << 50) - 1)] * 1000,
+                     msg="serials not dropped")
+    unknown = np.concatenate([encode_tcin_batch(np.array([13951442, 13951443]), np.array([5000, 5000])).tags,
+                              encode_dpci_batch([249], [1], [1234], [900]).tags, self.tcins.tags[7:8]])
+    hi, lo = tags_2_lanes(unknown)
+    self.assertEqual(self.index.lookup_prefix(hi, lo).tolist(), [999, -1, 1499, 999], msg="lookup_prefix mismatch")
+    values, found = self.index.resolve(hi, lo)
+    self.assertEqual(values.tolist(), [999, -1, 1499, 7], msg="resolve values mismatch")
+    self.assertEqual(found.tolist(), [1, 0, 1, 2], msg="resolve match kinds mismatch")
+
+    tiais = encode_tiai_char_batch(["1234", "1234"], ["ABC", "XYZ"])
+    index = EPCIndex.from_batches([tiais])
+    other = encode_tiai_char_batch(["1234", "1235"], ["QQQ", "ABC"])
+    self.assertEqual(index.lookup_prefix(*other.lanes()).tolist(), [1, -1], msg="tiai lookup_prefix mismatch")
+
+  def test_from_archive(self):
+    """
+    Test building an index from an archive, open or by path
+    """
+    with tempfile.TemporaryDirectory() as dir:
+      path = os.path.join(dir, "tags.epc")
+      with TagArchiveWriter(path, TCIN_96) as writer:
+        writer.append(self.tcins)
+      index = EPCIndex.from_archive(path)
+      with TagArchive(path) as archive:
+        self.assertEqual(len(EPCIndex.from_archive(archive)), 1000, msg="len != 1000")
+    self.assertEqual(index.lookup_tags(self.tcins.tags[::-1]).tolist(), list(range(999, -1, -1)), msg="archive lookup mismatch")
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,40 @@
+#
+#  test_gtin_normalizer.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the gtin_normalizer module
+#
+
+import unittest
+
+from gtin_normalizer import *
+
+class TestGTINNormalizer(unittest.TestCase):
+  def test_normalize_gtins(self):
+    """
+    Test the status and GTIN-14 of each kind of GTIN
+    """
+    gtins = ["00043935460624", "0043935460624", "043935460624", "12345670",
+             "00043935460625", "0004393546062A", "4393546062", "000439354606240", ""]
+    normalized, status = normalize_gtins(gtins)
+    self.assertEqual(normalized.tolist(), ["00043935460624"] * 3 + ["00000012345670"] + [""] * 5,
+                     msg="normalized GTINs != GTIN-14s")
+    self.assertEqual(status.tolist(), [GTIN_OK] * 4 + [GTIN_BAD_CHECK_DIGIT, GTIN_NOT_NUMERIC] + [GTIN_BAD_LENGTH] * 3,
+                     msg="statuses don't match")
+    self.assertEqual(status_counts(status), {"ok": 4, "bad length": 3, "not numeric": 1, "bad check digit": 1},
+                     msg="status counts don't match")
+
+  def test_normalize_gtin(self):
+    """
+    Test that the single GTIN normalizer matches the batch
+    """
+    gtins = ["00052175551276", "885909123452", "88590912345", "8859091234520", "12-45670", "12345678"]
+    normalized, status = normalize_gtins(gtins)
+    for i, gtin in enumerate(gtins):
+      self.assertEqual(normalize_gtin(gtin), (normalized[i], status[i]), msg=f'normalize_gtin({gtin}) != batch')
+
+if __name__ == '__main__':
+  unittest.main()
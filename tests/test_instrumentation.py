@@ -0,0 +1,102 @@
+#
+#  test_instrumentation.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the instrumentation module
+#
+
+import os
+import tempfile
+import unittest
+import urllib.request
+
+from instrumentation import *
+from epc_encoder import EPCEncoder
+from tcin_encoder import encode_tcin
+from serial_number_generator import new_serial_with_seed
+
+class TestInstrumentation(unittest.TestCase):
+  def tearDown(self):
+    metrics.disable()
+    metrics.reset()
+
+  def test_disabled(self):
+    """
+    Test that nothing is recorded until metrics are enabled
+    """
+    metrics.reset()
+    encode_tcin("13951442", "123456789012345").uri
+    snapshot = metrics.snapshot()
+    self.assertEqual(snapshot["encodes"], {}, msg="encodes recorded while disabled")
+    self.assertEqual(snapshot["stages"], {}, msg="stages recorded while disabled")
+
+  def test_counts_and_events(self):
+    """
+    Test the encode counts, and the truncated and zero filled inputs
+    """
+    metrics.enable()
+    encoder = EPCEncoder()
+    encoder.with_dpci("2811", "00", "8570", "12345678901")
+    encoder.with_gtin("43935460623", "12345", "101")
+    encode_tcin("13951442", "123456789012345")
+
+    snapshot = metrics.snapshot()
+    self.assertEqual(snapshot["encodes"], {"gid-96": 1, "sgtin-96": 1, "tcin-96": 1}, msg="encodes mismatch")
+    self.assertEqual(snapshot["events"]["gid-96"], {TRUNCATED: {"dpt": 1, "ser": 1}}, msg="gid-96 events mismatch")
+    self.assertEqual(snapshot["events"]["sgtin-96"], {ZERO_FILLED: {"gtin": 1}}, msg="sgtin-96 events mismatch")
+    self.assertEqual(snapshot["events"]["tcin-96"], {ZERO_FILLED: {"tcin": 1}}, msg="tcin-96 events mismatch")
+
+  def test_stages(self):
+    """
+    Test the stage histograms
+    """
+    metrics = Metrics(buckets=(1e-9, 10.0))
+    for seconds in (0.5, 0.5, 20.0):
+      metrics.observe("uri", seconds)
+    stage = metrics.snapshot()["stages"]["uri"]
+    self.assertEqual(stage["count"], 3, msg="count != 3")
+    self.assertEqual(stage["sum"], 21.0, msg="sum != 21.0")
+    self.assertEqual(stage["buckets"], {"1e-09": 0, "10.0": 2, "+Inf": 3}, msg="buckets mismatch")
+
+  def test_stages_from_encoders(self):
+    """
+    Test that the encoders time their stages
+    """
+    metrics.enable()
+    tag = encode_tcin("13951442", new_serial_with_seed("42"))
+    tag.hex, tag.uri
+    self.assertEqual(set(metrics.snapshot()["stages"]), {"serial", "pack", "hex", "uri"}, msg="stages mismatch")
+
+  def test_prometheus(self):
+    """
+    Test the Prometheus text, written to a file and served over http
+    """
+    metrics.enable()
+    encode_tcin("13951442", "123456789012345").hex
+    text = metrics.prometheus_text()
+    self.assertIn('rfid_encoder_encodes_total{scheme="tcin-96"} 1\n', text, msg="encodes_total missing")
+    self.assertIn('rfid_encoder_input_events_total{scheme="tcin-96",field="tcin",event="zero_filled"} 1\n', text,
+                  msg="input_events_total missing")
+    self.assertIn('rfid_encoder_stage_seconds_count{stage="hex"} 1\n', text, msg="stage_seconds_count missing")
+    self.assertIn('# TYPE rfid_encoder_stage_seconds histogram\n', text, msg="histogram type missing")
+
+    with tempfile.TemporaryDirectory() as path:
+      path = os.path.join(path, "rfid_encoder.prom")
+      metrics.write_prometheus(path)
+      with open(path) as f:
+        self.assertEqual(f.read(), text, msg="file != prometheus_text()")
+
+    server = metrics.serve_prometheus(0)
+    try:
+      url = f'http://127.0.0.1:{server.server_address[1]}/metrics'
+      with urllib.request.urlopen(url) as response:
+        self.assertEqual(response.read().decode("utf-8"), text, msg="served != prometheus_text()")
+    finally:
+      server.shutdown()
+      server.server_close()
+
+if __name__ == '__main__':
+  unittest.main()
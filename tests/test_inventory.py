@@ -0,0 +1,89 @@
+#
+#  test_inventory.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the inventory module
+#
+
+import unittest
+
+import numpy as np
+
+from inventory import *
+from batch_encoder import encode_tcin_batch, encode_dpci_batch
+from epc_encoder import encode_dpci, encode_gtin, encode_gtin_in_gid
+from tcin_encoder import encode_tcin
+from tiai_encoder import encode_tiai_dec
+
+class TestInventory(unittest.TestCase):
+  def test_classify(self):
+    """
+    Test the kind and serial free item key of each scheme
+    """
+    tags = [encode_tcin("13951442", "12345"), encode_dpci("281", "00", "8570", "12345"),
+            encode_gtin("00043935460624", "12345", "101"), encode_tiai_dec("17", "12345678901234567890")]
+    raw = b''.join(tag.bytes for tag in tags) + bytes(12)
+    kinds, items = classify(*buffer_2_lanes(raw))
+    self.assertEqual([KINDS[kind] for kind in kinds], ["tcin", "dpci", "gtin", "tiai", "unknown"], msg="kinds mismatch")
+    labels = [item_label(KINDS[kind], item) for kind, item in zip(kinds.tolist(), items.tolist())]
+    self.assertEqual(labels, ["13951442", "281-00-8570", "00043935460624", "17", "0x00"], msg="labels mismatch")
+
+  def test_counts(self):
+    """
+    Test counts by item, reader and antenna, merged across batches
+    """
+    inventory = Inventory()
+    tcins = encode_tcin_batch(np.repeat([13951442, 13951443], 50), np.arange(100))
+    inventory.add(tcins.tags, reader=1, antenna=np.arange(100) % 2)
+    inventory.add(tcins.tags[:10].tobytes(), reader=2, antenna=0)
+    inventory.add(encode_dpci_batch([281] * 3, [0] * 3, [8570] * 3, [1, 2, 3]).tags, reader=2)
+    inventory.add(encode_gtin_in_gid("00043935460623", "12345").bytes, reader=2)
+    inventory.add(b'')
+
+    self.assertEqual(inventory.reads, 114, msg="reads != 114")
+    self.assertEqual(inventory.kind_counts(), {"tcin": 110, "dpci": 3, "gid": 1}, msg="kind counts mismatch")
+    self.assertEqual(inventory.counts("tcin"), {"13951442": 60, "13951443": 50}, msg="tcin counts mismatch")
+    self.assertEqual(inventory.counts("dpci"), {"281-00-8570": 3}, msg="dpci counts mismatch")
+    self.assertEqual(inventory.counts("gtin"), {}, msg="gtin counts mismatch")
+    self.assertEqual(inventory.rows("tcin", by="reader"),
+                     [("13951442", 1, None, 50), ("13951442", 2, None, 10), ("13951443", 1, None, 50)], msg="reader rows mismatch")
+    self.assertEqual(inventory.rows("tcin")[:3],
+                     [("13951442", 1, 0, 25), ("13951442", 1, 1, 25), ("13951442", 2, 0, 10)], msg="antenna rows mismatch")
+    with self.assertRaises(ValueError):
+      inventory.rows("tcin", by="store")
+    with self.assertRaises(ValueError):
+      inventory.counts("upc")
+
+  def test_locations(self):
+    """
+    Test readers and antennas that don't fit in the location are refused
+    """
+    inventory = Inventory()
+    tags = encode_tcin_batch([13951442] * 4, np.arange(4)).tags
+    inventory.add(tags, reader=(1 << 48) - 1, antenna=np.array([0, 1, 2, (1 << 16) - 1]))
+    self.assertEqual(inventory.rows("tcin")[-1], ("13951442", (1 << 48) - 1, (1 << 16) - 1, 1), msg="largest location mismatch")
+    for reader, antenna in ((0, 1 << 16), (0, -1), (1 << 48, 0), (-1, 0), (0, np.array([0, 1, 2, 70000]))):
+      with self.assertRaises(ValueError, msg=f'reader {reader} antenna {antenna} accepted'):
+        inventory.add(tags, reader=reader, antenna=antenna)
+    self.assertEqual(inventory.reads, 4, msg="refused reads were counted")
+
+  def test_merge(self):
+    """
+    Test merging inventories counts the same as one inventory of every batch
+    """
+    batches = [encode_tcin_batch(np.random.default_rng(i).integers(0, 20, 1000), np.arange(1000)) for i in range(4)]
+    whole = Inventory()
+    parts = [Inventory(), Inventory()]
+    for i, batch in enumerate(batches):
+      whole.add(batch.tags, reader=i % 2, antenna=i)
+      parts[i % 2].add(batch.tags, reader=i % 2, antenna=i)
+    parts[0].merge(parts[1])
+    self.assertEqual(parts[0].rows("tcin"), whole.rows("tcin"), msg="merged rows mismatch")
+    self.assertEqual(parts[0].reads, 4000, msg="reads != 4000")
+    self.assertEqual(sum(whole.counts("tcin").values()), 4000, msg="total != 4000")
+
+if __name__ == '__main__':
+  unittest.main()
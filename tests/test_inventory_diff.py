@@ -0,0 +1,71 @@
+#
+#  test_inventory_diff.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the inventory_diff module
+#
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from inventory_diff import *
+from batch_encoder import encode_tcin_batch, encode_dpci_batch
+from tag_archive import TagArchiveWriter
+
+class TestInventoryDiff(unittest.TestCase):
+  def setUp(self):
+    self.tcins = encode_tcin_batch(np.repeat([13951442, 13951443], 500), np.arange(1000))
+    self.dpcis = encode_dpci_batch([281] * 100, [0] * 100, [8570] * 100, np.arange(100))
+
+  def test_diff(self):
+    """
+    Test the matched, missing and unexpected sets of a diff, with repeated reads
+    """
+    strays = encode_tcin_batch([13951444] * 5, np.arange(5))
+    reads = np.concatenate([self.tcins.tags[::2], self.tcins.tags[::4], strays.tags])
+    diff = diff_inventory([self.tcins, self.dpcis], reads.tobytes())
+    self.assertEqual(diff.counts(), {"matched": 500, "missing": 600, "unexpected": 5, "expected": 1100,
+                                     "observed": 505, "reads": 755}, msg="counts mismatch")
+    self.assertEqual(diff.values("matched"), {self.tcins.value(i) for i in range(0, 1000, 2)}, msg="matched mismatch")
+    self.assertEqual(diff.values("unexpected"), {strays.value(i) for i in range(5)}, msg="unexpected mismatch")
+    missing = {self.tcins.value(i) for i in range(1, 1000, 2)} | {self.dpcis.value(i) for i in range(100)}
+    self.assertEqual({int.from_bytes(tag.tobytes(), 'big') for tag in diff.tags("missing")}, missing, msg="missing mismatch")
+    with self.assertRaises(ValueError):
+      diff.lanes("extra")
+
+  def test_rollup(self):
+    """
+    Test the per item rollup of a diff
+    """
+    reads = np.concatenate([self.tcins.tags[:10], self.dpcis.tags[:99], encode_tcin_batch([13951444], [0]).tags])
+    diff = diff_inventory([self.tcins, self.dpcis], reads)
+    self.assertEqual(diff.rollup(), [("tcin", "13951442", 500, 10, 490, 0), ("tcin", "13951443", 500, 0, 500, 0),
+                                     ("tcin", "13951444", 0, 0, 0, 1), ("dpci", "281-00-8570", 100, 99, 1, 0)],
+                     msg="rollup mismatch")
+    self.assertEqual(diff.rollup("dpci"), [("dpci", "281-00-8570", 100, 99, 1, 0)], msg="dpci rollup mismatch")
+    self.assertEqual(diff.rollup("gtin"), [], msg="gtin rollup mismatch")
+
+  def test_archives(self):
+    """
+    Test diffing archives by path, and empty inputs
+    """
+    with tempfile.TemporaryDirectory() as dir:
+      paths = [os.path.join(dir, "tcin.epc"), os.path.join(dir, "dpci.epc")]
+      with TagArchiveWriter(paths[0], TCIN_96) as writer:
+        writer.append(self.tcins)
+      with TagArchiveWriter(paths[1], GID_96) as writer:
+        writer.append(self.dpcis)
+      diff = diff_inventory(paths, self.dpcis)
+    self.assertEqual(diff.counts()["matched"], 100, msg="matched != 100")
+    self.assertEqual(diff.counts()["missing"], 1000, msg="missing != 1000")
+    self.assertEqual(diff_inventory([], b'').counts()["expected"], 0, msg="empty diff")
+    self.assertEqual(diff_inventory(b'', self.dpcis).counts()["unexpected"], 100, msg="nothing expected")
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,55 @@
+#
+#  test_lanes.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the lanes module
+#
+
+import unittest
+
+import numpy as np
+
+from lanes import *
+from batch_encoder import encode_tcin_batch
+
+class TestLanes(unittest.TestCase):
+  def test_lanes(self):
+    """
+    Test packing and unpacking the two uint64 lanes, including a field that straddles them
+    """
+    hi, lo = encode_tcin_batch(["13951442"], ["123456789012345"]).lanes()
+    self.assertEqual(int(unpack_lanes(hi, lo, 0, 8)[0]), TCIN_96_HEADER, msg="header != 0x08")
+    self.assertEqual(int(unpack_lanes(hi, lo, 11, 35)[0]), 13951442, msg="tcin != 13951442")
+    self.assertEqual(int(unpack_lanes(hi, lo, 46, 50)[0]), 123456789012345, msg="ser != 123456789012345")
+
+    tags = lanes_2_tags(hi, lo)
+    hi2, lo2 = tags_2_lanes(tags)
+    self.assertTrue((hi == hi2).all() and (lo == lo2).all(), msg="lanes don't round trip")
+
+  def test_as_uint64(self):
+    """
+    Test digit strings parse the same as numpy's conversion, which still takes anything else
+    """
+    digits = ["0", "7", "0045", "13951442", "9999999999999999999"] + [str(i * 7919) for i in range(1000)]
+    self.assertEqual(as_uint64(digits).tolist(), np.array(digits).astype(np.uint64).tolist(), msg="digits mismatch")
+    self.assertEqual(as_uint64(["12345678901234567890", " 5", "+7"]).tolist(), [12345678901234567890, 5, 7],
+                     msg="numpy fallback mismatch")
+    self.assertEqual(as_uint64([281, 0]).tolist(), [281, 0], msg="ints mismatch")
+    with self.assertRaises(ValueError):
+      as_uint64(["12", ""])
+    with self.assertRaises(ValueError):
+      as_uint64(["12", "1a"])
+
+  def test_pack_lanes(self):
+    """
+    Test packing constant and array fields into the lanes
+    """
+    hi, lo = pack_lanes([(TIAI_A_96_HEADER, 8), (0, 3), (np.array([17, 8191]), 13), (0xFF, 8), (np.array([1, 2**64 - 1], dtype=np.uint64), 64)], 2)
+    self.assertEqual(bytes(lanes_2_tags(hi, lo)[0]).hex().upper(), "0A0011FF0000000000000001", msg="row 0 != 0A0011FF0000000000000001")
+    self.assertEqual(bytes(lanes_2_tags(hi, lo)[1]).hex().upper(), "0A1FFFFFFFFFFFFFFFFFFFFF", msg="row 1 != 0A1FFFFFFFFFFFFFFFFFFFFF")
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,68 @@
+#
+#  test_packer.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the packer module
+#
+
+import unittest
+
+from packer import *
+from converter import *
+
+class TestPacker(unittest.TestCase):
+  def test_pack_gid_96(self):
+    """
+    Test packing a GID-96 and rendering it as bytes, hex and binary
+    """
+    gid = pack_gid_96(4928100, 85702, 12345)
+    self.assertEqual(epc_2_hex(gid), "3504B3264014EC6000003039", msg="gid hex != 3504B3264014EC6000003039")
+    self.assertEqual(epc_2_bytes(gid), bytes.fromhex("3504B3264014EC6000003039"), msg="gid bytes != 3504B3264014EC6000003039")
+    self.assertEqual(epc_2_bin(gid), hex_2_bin("3504B3264014EC6000003039", 96), msg="gid bin != hex_2_bin")
+    self.assertEqual(len(epc_2_bin(gid)), 96, msg="len(gid bin) != 96 bits")
+
+  def test_pack_sgtin_96(self):
+    """
+    Test packing an SGTIN-96
+    """
+    sgtin = pack_sgtin_96(1, 5, 24, 43935, 46062, 12345)
+    self.assertEqual(epc_2_hex(sgtin), "303402AE7C2CFB8000003039", msg="sgtin hex != 303402AE7C2CFB8000003039")
+
+  def test_pack_tcin_96(self):
+    """
+    Test packing a TCIN-96, with leading zeros in the hex
+    """
+    tcin = pack_tcin_96(0, 16399080, 1)
+    self.assertEqual(epc_2_hex(tcin), "080003E8EBA0000000000001", msg="tcin hex != 080003E8EBA0000000000001")
+    self.assertEqual(epc_2_bytes(tcin)[0], TCIN_96_HEADER, msg="tcin header != 0x08")
+
+  def test_pack_tiai_a_96(self):
+    """
+    Test packing a TIAI-A-96
+    """
+    tiai = pack_tiai_a_96(0, 17, 0xAF034C16FD)
+    self.assertEqual(epc_2_hex(tiai), "0A001100000000AF034C16FD", msg="tiai hex != 0A001100000000AF034C16FD")
+
+  def test_truncation(self):
+    """
+    Test that fields which are too long are truncated to their lowest bits
+    """
+    self.assertEqual(pack_gid_96(1 << 28, 1 << 24, 1 << 36), GID_96_HEADER << 88, msg="gid overflow not truncated")
+    self.assertEqual(pack_tcin_96(8, 1 << 35, 1 << 50), TCIN_96_HEADER << 88, msg="tcin overflow not truncated")
+    self.assertEqual(pack_tiai_a_96(8, 1 << 13, 1 << 72), TIAI_A_96_HEADER << 88, msg="tiai overflow not truncated")
+
+  def test_pack_epc_into(self):
+    """
+    Test writing a packed EPC into a buffer
+    """
+    buffer = bytearray(26)
+    epc = pack_tcin_96(0, 13951442, 123456789012345)
+    pack_epc_into(buffer, 1, epc)
+    pack_epc_into(memoryview(buffer), 13, epc)
+    self.assertEqual(bytes(buffer), b'\0' + epc_2_bytes(epc) * 2 + b'\0', msg="buffer mismatch")
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,61 @@
+#
+#  test_parallel.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the parallel module
+#
+
+import io
+import unittest
+
+from parallel import *
+
+class TestParallel(unittest.TestCase):
+  def test_run_parallel_matches_pipeline(self):
+    """
+    Test that the process pool writes exactly what the single process pipeline does, in order
+    """
+    manifest = "tcin,ser\n" + "".join(f'{13951442 + i},{i + 1}\n' for i in range(50))
+    expected = io.StringIO()
+    run_pipeline(io.StringIO(manifest), expected, "tcin", fields=("hex", "uri", "bin"))
+
+    out = io.StringIO()
+    counter, report = run_parallel(io.StringIO(manifest), out, "tcin", fields=("hex", "uri", "bin"),
+                                   chunk_size=7, workers=2)
+    self.assertEqual(out.getvalue(), expected.getvalue(), msg="parallel output != pipeline output")
+    self.assertEqual(counter.rows, 50, msg="counter.rows != 50")
+
+    workers = report.snapshot()
+    self.assertEqual(sum(worker["rows"] for worker in workers.values()), 50, msg="worker rows != 50")
+    self.assertEqual(sum(worker["chunks"] for worker in workers.values()), 8, msg="worker chunks != 8")
+
+  def test_run_parallel_ndjson(self):
+    """
+    Test NDJSON in and out of the process pool
+    """
+    manifest = '{"asset_ref": "017", "asset_id": "123ABC"}\n{"asset_ref": "7", "asset_id": "Y2A630"}\n'
+    out = io.StringIO()
+    run_parallel(io.StringIO(manifest), out, "tiai_char", "ndjson", "ndjson", chunk_size=1, workers=2)
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    self.assertEqual(rows[0]["hex"], "0A0011000000000C72CC1083", msg="hex != 0A0011000000000C72CC1083")
+    self.assertEqual(rows[1]["uri"], "urn:epc:tag:tiai-a-96:0.7.Y2A630", msg="uri != urn:epc:tag:tiai-a-96:0.7.Y2A630")
+
+    # JSON numbers encode the same as strings
+    numbers = encode_lines_in_worker("tcin", "ndjson", None, ['{"tcin": 13951442, "ser": 5}\n'], "csv", ("uri",))
+    self.assertEqual(numbers[3], "urn:epc:tag:tcin-96:0.13951442.5\n", msg="numbers row mismatch")
+
+  def test_encode_parallel(self):
+    """
+    Test that encoded chunks come back in input order
+    """
+    rows = [{"dpt": "281", "cls": "00", "itm": "8570", "ser": str(i)} for i in range(20)]
+    chunks = list(encode_parallel(rows, "dpci", chunk_size=3, workers=2))
+    self.assertEqual(len(chunks), 7, msg="len(chunks) != 7")
+    uris = [row["uri"] for chunk in chunks for row in chunk]
+    self.assertEqual(uris, [f'urn:epc:tag:gid-96:04928100.0085702.{i}' for i in range(20)], msg="uris out of order")
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,117 @@
+#
+#  test_pipeline.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the pipeline module
+#
+
+import io
+import itertools
+import json
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+from pipeline import *
+
+class TestPipeline(unittest.TestCase):
+  def test_run_pipeline_csv(self):
+    """
+    Test streaming a CSV manifest of DPCIs to CSV
+    """
+    manifest = io.StringIO("dpt,cls,itm,ser\n281,00,8570,12345\n281,00,8570,12346\n281,00,8570,12347\n")
+    out = io.StringIO()
+    counter = run_pipeline(manifest, out, "dpci", chunk_size=2)
+
+    lines = out.getvalue().splitlines()
+    self.assertEqual(lines[0], "hex,uri", msg="header != hex,uri")
+    self.assertEqual(lines[1], "3504B3264014EC6000003039,urn:epc:tag:gid-96:04928100.0085702.12345", msg="row 1 mismatch")
+    self.assertEqual(len(lines), 4, msg="len(lines) != 4")
+    self.assertEqual(counter.rows, 3, msg="counter.rows != 3")
+    self.assertEqual(counter.bytes, len(out.getvalue()), msg="counter.bytes != bytes written")
+
+  def test_run_pipeline_ndjson(self):
+    """
+    Test streaming an NDJSON manifest of TCINs to NDJSON
+    """
+    manifest = io.StringIO('{"tcin": "13951442", "ser": "123456789012345"}\n\n{"tcin": "16399080", "ser": "001"}\n')
+    out = io.StringIO()
+    run_pipeline(manifest, out, "tcin", "ndjson", "ndjson", ("hex", "bin"))
+
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    self.assertEqual(rows[0]["hex"], "0800035387487048860DDF79", msg="hex != 0800035387487048860DDF79")
+    self.assertEqual(rows[1]["bin"], "000010000000000000000011111010001110101110100000000000000000000000000000000000000000000000000001", msg="bin mismatch")
+    self.assertNotIn("uri", rows[0], msg="uri should not be output")
+
+  def test_run_pipeline_ndjson_numbers(self):
+    """
+    Test that NDJSON numbers encode the same as strings
+    """
+    manifest = io.StringIO('{"dpt": 281, "cls": "00", "itm": 8570, "ser": 12345}\n')
+    out = io.StringIO()
+    run_pipeline(manifest, out, "dpci", "ndjson", "csv")
+    self.assertEqual(out.getvalue().splitlines()[1], "3504B3264014EC6000003039,urn:epc:tag:gid-96:04928100.0085702.12345",
+                     msg="dpci row mismatch")
+    tag = list(encode_rows([{"tcin": 13951442, "ser": 5}], "tcin"))[0][0]
+    self.assertEqual(tag["uri"], "urn:epc:tag:tcin-96:0.13951442.5", msg="tcin uri mismatch")
+
+  def test_encode_rows_is_lazy(self):
+    """
+    Test that rows are only read one chunk at a time, even from an endless source
+    """
+    rows = ({"asset_ref": "17", "asset_id": str(i)} for i in itertools.count())
+    chunks = encode_rows(rows, "tiai_dec", chunk_size=5)
+    first = next(chunks)
+    self.assertEqual(len(first), 5, msg="len(chunk) != 5")
+    self.assertEqual(first[1]["uri"], "urn:epc:tag:tiai-a-96:0.17.1", msg="uri != urn:epc:tag:tiai-a-96:0.17.1")
+
+  def test_unsupported_scheme(self):
+    """
+    Test that an unknown scheme raises a ValueError
+    """
+    with self.assertRaises(ValueError):
+      next(encode_rows([], "sscc"))
+
+  def test_encode_values_across_threads(self):
+    """
+    Test that encoding from a pool of threads gives the same tags as encoding serially
+    """
+    for scheme, rows in (("dpci", [["281", "00", "8570", str(i)] for i in range(2000)]),
+                         ("tcin", [[str(13951442 + i % 7), str(i)] for i in range(2000)]),
+                         ("tiai_char", [[str(i % 1000), f'A{i}'] for i in range(2000)])):
+      serial = encode_values(scheme, rows)
+      with ThreadPoolExecutor(8) as executor:
+        threaded = list(itertools.chain.from_iterable(
+          executor.map(lambda chunk: encode_values(scheme, chunk), [rows[i:i + 50] for i in range(0, len(rows), 50)])))
+      self.assertEqual(threaded, serial, msg=f'{scheme}: threaded != serial')
+
+  def test_encode_values_fields(self):
+    """
+    Test that only the fields asked for are rendered
+    """
+    rows = [[str(13951442 + i), str(i)] for i in range(10)]
+    every = encode_values("tcin", rows)
+    hexes = encode_values("tcin", rows, ("hex",))
+    self.assertEqual(hexes, [{"hex": row["hex"]} for row in every], msg="hex only mismatch")
+    self.assertEqual(list(encode_rows([{"tcin": "13951442", "ser": "1"}], "tcin", fields=("uri",)))[0][0].keys(),
+                     {"uri"}, msg="encode_rows fields mismatch")
+
+  def test_encode_values_into_shared_memory(self):
+    """
+    Test encoding rows straight into a shared memory segment
+    """
+    rows = [["281", "00", "8570", str(i)] for i in range(100)]
+    memory = shared_memory.SharedMemory(create=True, size=12 * len(rows))
+    try:
+      self.assertEqual(encode_values_into("dpci", rows, memory.buf), 100, msg="rows written != 100")
+      self.assertEqual(bytes(memory.buf[12 * 99:12 * 100]).hex().upper(), encode_values("dpci", rows[99:])[0]["hex"],
+                       msg="row 99 mismatch")
+    finally:
+      memory.close()
+      memory.unlink()
+
+if __name__ == '__main__':
+  unittest.main()
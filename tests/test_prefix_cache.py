@@ -0,0 +1,135 @@
+#
+#  test_prefix_cache.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the prefix_cache module
+#
+
+import threading
+import unittest
+
+from prefix_cache import *
+from epc_encoder import EPCEncoder, dpci_prefix, gtin_prefix
+from tcin_encoder import TCINEncoder, tcin_prefix
+
+class TestPrefixCache(unittest.TestCase):
+  def test_lookup(self):
+    """
+    Test hits, misses and least recently used eviction
+    """
+    cache = PrefixCache(maxsize=2)
+    self.assertEqual(cache.lookup(tcin_prefix, "13951442"), tcin_prefix("13951442"), msg="lookup != tcin_prefix")
+    cache.lookup(tcin_prefix, "13951442")
+    cache.lookup(tcin_prefix, "16399080")
+    cache.lookup(tcin_prefix, "13951442")
+    cache.lookup(dpci_prefix, "281", "00", "8570")
+    self.assertEqual(cache.cache_info(), PrefixCacheInfo(2, 3, 2, 2), msg="cache_info != (2, 3, 2, 2)")
+
+    # 16399080 was the least recently used, so it was evicted
+    cache.lookup(tcin_prefix, "16399080")
+    self.assertEqual(cache.cache_info().misses, 4, msg="misses != 4")
+
+  def test_invalidate(self):
+    """
+    Test dropping one prefix, one kind of prefix, or all of them
+    """
+    cache = PrefixCache()
+    cache.lookup(tcin_prefix, "13951442")
+    cache.lookup(tcin_prefix, "16399080")
+    cache.lookup(gtin_prefix, "00043935460624", "101")
+    cache.invalidate(tcin_prefix, "13951442")
+    self.assertEqual(cache.cache_info().currsize, 2, msg="currsize != 2")
+    cache.clear(tcin_prefix)
+    self.assertEqual(cache.cache_info().currsize, 1, msg="currsize != 1")
+    cache.clear()
+    self.assertEqual(cache.cache_info(), PrefixCacheInfo(0, 0, 4096, 0), msg="cache_info != (0, 0, 4096, 0)")
+
+    cache.resize(0)
+    cache.lookup(tcin_prefix, "13951442")
+    self.assertEqual(cache.cache_info().currsize, 0, msg="currsize != 0 with caching off")
+
+  def test_thread_caches(self):
+    """
+    Test that each thread builds and keeps its own prefixes, and a shared cache is opt in
+    """
+    cache = ThreadPrefixCache(maxsize=2)
+    looked_up = threading.Barrier(5)
+    done = threading.Event()
+    def lookups():
+      for tcin in ("13951442", "13951442", "16399080"):
+        cache.lookup(tcin_prefix, tcin)
+      looked_up.wait()
+      done.wait()
+    threads = [threading.Thread(target=lookups) for _ in range(4)]
+    for thread in threads:
+      thread.start()
+    looked_up.wait()
+    self.assertEqual(cache.cache_info(), PrefixCacheInfo(4, 8, 2, 8), msg="cache_info != (4, 8, 2, 8)")
+    done.set()
+    for thread in threads:
+      thread.join()
+
+    # A thread's cache goes with it
+    for tcin in ("13951442", "13951442", "16399080"):
+      cache.lookup(tcin_prefix, tcin)
+    self.assertEqual(cache.cache_info(), PrefixCacheInfo(1, 2, 2, 2), msg="cache_info != (1, 2, 2, 2)")
+
+    # A full thread cache is emptied rather than kept in LRU order
+    cache.lookup(dpci_prefix, "281", "00", "8570")
+    self.assertEqual(cache.local.cache.prefixes, {(dpci_prefix, ("281", "00", "8570")): dpci_prefix("281", "00", "8570")},
+                     msg="full cache was not emptied")
+    cache.invalidate(dpci_prefix, "281", "00", "8570")
+    self.assertEqual(cache.cache_info().currsize, 0, msg="currsize != 0 after invalidate")
+    cache.clear()
+    self.assertEqual(cache.cache_info()[:2], (0, 0), msg="hits and misses not cleared")
+
+    shared = PrefixCache()
+    cache.use_shared(shared)
+    self.assertEqual(cache.lookup(tcin_prefix, "13951442"), tcin_prefix("13951442"), msg="shared lookup != tcin_prefix")
+    self.assertEqual(shared.cache_info().misses, 1, msg="shared cache was not used")
+    cache.use_shared(None)
+    cache.lookup(tcin_prefix, "13951442")
+    self.assertEqual(shared.cache_info().misses, 1, msg="shared cache still used")
+
+  def test_lookup_lanes(self):
+    """
+    Test the prefix lanes of an item are the top 32 and bottom 64 bits of its prefix
+    """
+    cache = ThreadPrefixCache()
+    prefix = dpci_prefix("281", "00", "8570")[0]
+    self.assertEqual(cache.lookup_lanes(dpci_prefix, ("281", "00", "8570")), (prefix >> 64, prefix & ((1 << 64) - 1)),
+                     msg="dpci lanes mismatch")
+    cache.lookup_lanes(dpci_prefix, ("281", "00", "8570"))
+    cache.lookup_lanes(tcin_prefix, "13951442")
+    self.assertEqual(cache.cache_info(), PrefixCacheInfo(1, 2, 4096, 2), msg="cache_info != (1, 2, 4096, 2)")
+    cache.invalidate(dpci_prefix, "281", "00", "8570")
+    cache.clear(tcin_prefix)
+    self.assertEqual(cache.cache_info().currsize, 0, msg="lanes were not dropped")
+
+    shared = PrefixCache()
+    cache.use_shared(shared)
+    prefix = tcin_prefix("13951442")[0]
+    self.assertEqual(cache.lookup_lanes(tcin_prefix, "13951442"), (prefix >> 64, prefix & ((1 << 64) - 1)),
+                     msg="shared lanes mismatch")
+    self.assertEqual(shared.cache_info().misses, 1, msg="shared cache was not used")
+
+  def test_encoders(self):
+    """
+    Test that the encoders give the same tags from the cached prefixes
+    """
+    encode_epc = EPCEncoder()
+    encode_tcin = TCINEncoder()
+    prefix_cache.clear()
+    for ser in ("12345", "1", "99999999999"):
+      encode_epc.with_dpci("281", "00", "8570", ser)
+      encode_tcin.with_tcin_and_serial_number("16399080", ser)
+    self.assertEqual(encode_epc.gid_uri, "urn:epc:tag:gid-96:04928100.0085702.9999999999", msg="gid_uri != urn:epc:tag:gid-96:04928100.0085702.9999999999")
+    self.assertEqual(encode_epc.gid_hex, "3504B3264014EC62540BE3FF", msg="gid_hex != 3504B3264014EC62540BE3FF")
+    self.assertEqual(encode_tcin.tcin_hex, "080003E8EBA000174876E7FF", msg="tcin_hex != 080003E8EBA000174876E7FF")
+    self.assertEqual(prefix_cache.cache_info().misses, 2, msg="misses != 2")
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,76 @@
+#
+#  test_range_encoder.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the range_encoder module
+#
+
+import unittest
+
+from range_encoder import *
+from pipeline import dict_scheme_2_encoder
+
+class TestRangeEncoder(unittest.TestCase):
+  def setUp(self):
+    self.items = {
+      "dpci": ("281", "00", "8570"),
+      "gtin": ("00043935460624", "101"),
+      "gtin_in_gid": ("00043935460624",),
+      "tcin": ("13951442",)
+    }
+
+  def test_matches_encoders(self):
+    """
+    Test every form of a range matches the scheme's encode function, serial by serial
+    """
+    for scheme, fields in self.items.items():
+      encode = dict_scheme_2_encoder[scheme][0]
+      columns = dict_scheme_2_encoder[scheme][1]
+      expected = []
+      for serial in range(0, 50):
+        row = dict(zip(dict_scheme_2_range[scheme][1], fields), ser=str(serial))
+        expected.append(encode(*[row[column] for column in columns]))
+
+      tags = list(encode_range(scheme, fields, 0, 50))
+      self.assertEqual([tag.hex for tag in tags], [tag.hex for tag in expected], msg=f'{scheme} hex mismatch')
+      self.assertEqual([tag.uri for tag in tags], [tag.uri for tag in expected], msg=f'{scheme} uri mismatch')
+
+      batch = encode_range(scheme, fields, 0, 50, batch=True)
+      self.assertEqual(len(batch), 50, msg=f'{scheme} batch length != 50')
+      self.assertEqual(list(batch.hexes()), [tag.hex for tag in expected], msg=f'{scheme} batch mismatch')
+
+      buffer = bytearray(4 + 50 * EPC_BYTES)
+      self.assertEqual(encode_range_into(buffer, 4, scheme, fields, 0, 50), 50, msg=f'{scheme} written != 50')
+      self.assertEqual(bytes(buffer[4:]), b''.join(tag.bytes for tag in expected), msg=f'{scheme} buffer mismatch')
+
+  def test_fields(self):
+    """
+    Test item fields can be a dict, and must match the scheme
+    """
+    by_name = encode_range("dpci", {"dpt": "281", "cls": "00", "itm": "8570"}, 7, 1)
+    self.assertEqual(next(by_name).uri, "urn:epc:tag:gid-96:04928100.0085702.7", msg="dict fields mismatch")
+    with self.assertRaises(ValueError):
+      encode_range("dpci", ("281", "00"), 0, 1)
+    with self.assertRaises(ValueError):
+      encode_range("tiai_dec", ("17",), 0, 1)
+
+  def test_overflow(self):
+    """
+    Test a range that doesn't fit in the serial field is refused up front
+    """
+    limit = dict_scheme_2_serial_limit[TCIN_96]
+    tags = list(encode_range("tcin", ("13951442",), limit - 2, 2))
+    self.assertEqual(tags[-1].value & TCIN_96_SERIAL_MASK, limit - 1, msg="last serial mismatch")
+    with self.assertRaises(OverflowError):
+      encode_range("tcin", ("13951442",), limit - 2, 3)
+    with self.assertRaises(OverflowError):
+      encode_range("dpci", self.items["dpci"], dict_scheme_2_serial_limit[GID_96], 1, batch=True)
+    with self.assertRaises(ValueError):
+      encode_range("gtin", self.items["gtin"], -1, 1)
+    self.assertEqual(len(encode_range("gtin", self.items["gtin"], 0, 0, batch=True)), 0, msg="empty batch")
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,111 @@
+#
+#  test_select_mask.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the select_mask module
+#
+
+import random
+import unittest
+
+from select_mask import *
+from epc_encoder import encode_dpci, encode_gtin
+from tcin_encoder import encode_tcin
+from tiai_encoder import encode_tiai_dec
+
+class TestSelectMask(unittest.TestCase):
+  def matches(self, masks, tag):
+    return any(mask_matches(mask, tag.value) for mask in masks)
+
+  def test_range_2_prefixes(self):
+    """
+    Test that the prefixes of a range cover exactly the range, with the fewest blocks
+    """
+    self.assertEqual(range_2_prefixes(0, 255, 8), [(0, 0)], msg="whole field != one empty prefix")
+    self.assertEqual(range_2_prefixes(4, 11, 4), [(1, 2), (2, 2)], msg="4-11 mismatch")
+    self.assertEqual(len(range_2_prefixes(1, 254, 8)), 14, msg="1-254 != 14 prefixes")
+    rng = random.Random(7)
+    for i in range(200):
+      first = rng.randrange(1024)
+      last = rng.randrange(first, 1024)
+      covered = set()
+      for prefix, bits in range_2_prefixes(first, last, 10):
+        block = range(prefix << (10 - bits), (prefix + 1) << (10 - bits))
+        self.assertTrue(covered.isdisjoint(block), msg="blocks overlap")
+        covered.update(block)
+      self.assertEqual(covered, set(range(first, last + 1)), msg=f'{first}-{last} not covered exactly')
+    with self.assertRaises(ValueError):
+      range_2_prefixes(0, 256, 8)
+
+  def test_value_runs(self):
+    """
+    Test values are sorted and merged into runs
+    """
+    self.assertEqual(value_runs([5, "3", range(6, 9), 4, 20, range(0, 0)]), [(3, 8), (20, 20)], msg="runs mismatch")
+    self.assertEqual(value_runs(range(10, 20)), [(10, 19)], msg="range run mismatch")
+    with self.assertRaises(ValueError):
+      value_runs(range(0, 10, 2))
+
+  def test_tcin_masks(self):
+    """
+    Test TCIN masks match exactly the TCINs asked for
+    """
+    mask = tcin_masks("13951442")[0]
+    self.assertEqual(mask, SelectMask(0x20, 46, bytes.fromhex("080003538748")), msg="tcin mask mismatch")
+    masks = tcin_masks(range(13951400, 13951500))
+    self.assertLess(len(masks), 12, msg="too many masks")
+    for tcin in (13951399, 13951400, 13951442, 13951499, 13951500):
+      self.assertEqual(self.matches(masks, encode_tcin(str(tcin), "12345")), 13951400 <= tcin < 13951500,
+                       msg=f'tcin {tcin} mismatch')
+    self.assertFalse(self.matches(masks, encode_tiai_dec("17", "13951442")), msg="tiai matched a tcin mask")
+    skipped = tcin_masks([13951442], fltr=None)[0]
+    self.assertEqual((skipped.pointer, skipped.length), (0x20 + 11, 35), msg="unfiltered mask mismatch")
+    self.assertTrue(self.matches([skipped], encode_tcin("13951442", "1")), msg="unfiltered mask doesn't match")
+
+  def test_dpci_masks(self):
+    """
+    Test department, class and DPCI masks match exactly the DPCIs asked for
+    """
+    departments = department_masks(range(280, 283))
+    classes = class_masks("281", [0, 1, 2, 3])
+    dpcis = dpci_masks([("281", "00", "8570")])
+    self.assertEqual(len(classes), 1, msg="classes 0-3 != one mask")
+    self.assertEqual(dpcis[0].length, 60, msg="dpci mask length != 60")
+    for dpt, cls, itm in (("279", "99", "8570"), ("280", "00", "0000"), ("281", "00", "8570"), ("281", "00", "8571"),
+                          ("281", "04", "8570"), ("282", "99", "9999"), ("283", "00", "8570")):
+      tag = encode_dpci(dpt, cls, itm, "12345")
+      self.assertEqual(self.matches(departments, tag), 280 <= int(dpt) <= 282, msg=f'department {dpt} mismatch')
+      self.assertEqual(self.matches(classes, tag), dpt == "281" and int(cls) < 4, msg=f'class {dpt}-{cls} mismatch')
+      self.assertEqual(self.matches(dpcis, tag), (dpt, cls, itm) == ("281", "00", "8570"), msg=f'dpci {itm} mismatch')
+    with self.assertRaises(ValueError):
+      class_masks("281", [100])
+
+  def test_gtin_masks(self):
+    """
+    Test company prefix and GTIN masks match the SGTINs encoded by with_gtin
+    """
+    tag = encode_gtin("00043935460624", "12345", "101")
+    self.assertTrue(self.matches(company_prefix_masks("0043935"), tag), msg="company prefix doesn't match")
+    self.assertTrue(self.matches(company_prefix_masks(range(43900, 44000), digits=7), tag), msg="range doesn't match")
+    self.assertFalse(self.matches(company_prefix_masks(["0043936", "004393"]), tag), msg="other prefix matched")
+    self.assertTrue(self.matches(gtin_masks("00043935460624", "101"), tag), msg="gtin doesn't match")
+    self.assertTrue(self.matches(gtin_masks("00043935460624", "101", fltr=None), tag), msg="unfiltered gtin doesn't match")
+    self.assertFalse(self.matches(gtin_masks("00043935460624", "101", fltr=3), tag), msg="filter 3 matched")
+    self.assertFalse(self.matches(gtin_masks("00043935460631", "101"), tag), msg="other gtin matched")
+    with self.assertRaises(ValueError):
+      company_prefix_masks(range(0, 10))
+
+  def test_asset_ref_masks(self):
+    """
+    Test asset ref masks match exactly the asset refs asked for
+    """
+    masks = asset_ref_masks(range(16, 32))
+    self.assertEqual(masks, [SelectMask(0x20, 20, bytes.fromhex("0A0010"))], msg="asset ref mask mismatch")
+    self.assertTrue(self.matches(masks, encode_tiai_dec("17", "12345")), msg="asset ref 17 doesn't match")
+    self.assertFalse(self.matches(masks, encode_tiai_dec("32", "12345")), msg="asset ref 32 matched")
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,97 @@
+#
+#  test_serial_allocator.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the serial_allocator module
+#
+
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from serial_allocator import *
+from tcin_encoder import TCINEncoder
+
+# Run in a worker process: take serials from a shared state file
+def take_serials(path, count):
+  with SerialAllocator(path, block_size=10) as allocator:
+    return allocator.take(count)
+
+class TestSerialAllocator(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.dir.name, "serials.state")
+
+  def tearDown(self):
+    self.dir.cleanup()
+
+  def test_disjoint_blocks(self):
+    """
+    Test that two allocators on the same state file never hand out the same serial
+    """
+    with SerialAllocator(self.path, block_size=100) as first, SerialAllocator(self.path, block_size=100) as second:
+      serials = [first.next_serial(), second.next_serial(), first.next_serial(), second.next_serial()]
+      serials += first.take(250) + second.take(250)
+    self.assertEqual(serials[:4], [0, 100, 1, 101], msg="serials != [0, 100, 1, 101]")
+    self.assertEqual(len(set(serials)), len(serials), msg="duplicate serials handed out")
+
+  def test_persistent_state(self):
+    """
+    Test that reopening the state file (e.g. after a crash) never reissues a serial
+    """
+    with SerialAllocator(self.path, block_size=1000) as allocator:
+      allocator.next_serial()
+    with SerialAllocator(self.path, block_size=1000) as allocator:
+      self.assertEqual(allocator.next_unreserved(), 1000, msg="next_unreserved != 1000")
+      self.assertEqual(allocator.next_serial(), 1000, msg="serial != 1000")
+
+  def test_torn_write(self):
+    """
+    Test that a damaged copy of the state falls back to the other copy
+    """
+    with SerialAllocator(self.path) as allocator:
+      allocator.allocate_block(10)
+      allocator.allocate_block(10)
+      # Sequence 2 is in the first slot, so damage it
+      allocator.mm[STATE_SLOT_OFFSETS[0]] ^= 0xFF
+      self.assertEqual(allocator.next_unreserved(), 10, msg="next_unreserved != 10")
+
+  def test_serial_width(self):
+    """
+    Test that each scheme's serial width is enforced
+    """
+    with SerialAllocator(self.path, scheme=GID_96) as allocator:
+      self.assertEqual(allocator.limit, 10 ** 10, msg="GID limit != 10 digits")
+      allocator.allocate_block(10 ** 10 - 1)
+      self.assertEqual(len(allocator.allocate_block(1)), 1, msg="last serial not allocated")
+      with self.assertRaises(OverflowError):
+        allocator.allocate_block(1)
+
+    with self.assertRaises(ValueError):
+      SerialAllocator(self.path, scheme=TCIN_96)
+
+  def test_processes(self):
+    """
+    Test that worker processes never duplicate a serial
+    """
+    with ProcessPoolExecutor(2) as executor:
+      results = list(executor.map(take_serials, [self.path] * 4, [25] * 4))
+    serials = [serial for result in results for serial in result]
+    self.assertEqual(len(set(serials)), 100, msg="duplicate serials across processes")
+
+  def test_with_tcin_and_allocator(self):
+    """
+    Test encoding a TCIN with serials from an allocator
+    """
+    encode_tcin = TCINEncoder()
+    with SerialAllocator(self.path) as allocator:
+      allocator.next_serial()
+      self.assertEqual(encode_tcin.with_tcin_and_allocator("16399080", allocator), "urn:epc:tag:tcin-96:0.16399080.1", msg="uri != urn:epc:tag:tcin-96:0.16399080.1")
+    self.assertEqual(encode_tcin.tcin_hex, "080003E8EBA0000000000001", msg="tcin_hex != 080003E8EBA0000000000001")
+
+if __name__ == '__main__':
+  unittest.main()
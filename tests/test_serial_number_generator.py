@@ -11,6 +11,7 @@
 import unittest
 
 from serial_number_generator import *
+from packer import GID_96, SGTIN_96
 
 class TestSerialNumberGenerator(unittest.TestCase):
   def test_new_serial_with_seed(self):
@@ -19,5 +20,35 @@ class TestSerialNumberGenerator(unittest.TestCase):
     """
     self.assertEqual(len(new_serial_with_seed(12345)), 15, msg="Random Number not 15 digits long")
 
+  def test_permuted_serial(self):
+    """
+    Test that the keyed permutation never repeats a serial and stays below the limit
+    """
+    serials = [permuted_serial(12345, i, 1000) for i in range(1000)]
+    self.assertEqual(sorted(serials), list(range(1000)), msg="permuted serials are not a permutation")
+    self.assertNotEqual(serials[:10], list(range(10)), msg="permuted serials are sequential")
+
+    # Exact bit width, and an odd one
+    serials = set(permuted_serial("7725272730706", i, 1 << 13) for i in range(1 << 13))
+    self.assertEqual(len(serials), 1 << 13, msg="permuted serials repeat")
+    self.assertLess(max(serials), 1 << 13, msg="permuted serial too wide")
+
+    # Any index can be computed directly, and inverted
+    serial = permuted_serial(12345, 10 ** 14, 10 ** 15)
+    self.assertEqual(permuted_serial(12345, 10 ** 14, 10 ** 15), serial, msg="permuted serial not repeatable")
+    self.assertEqual(permuted_index(12345, serial, 10 ** 15), 10 ** 14, msg="permuted index != 10 ** 14")
+    self.assertNotEqual(permuted_serial(54321, 10 ** 14, 10 ** 15), serial, msg="key makes no difference")
+
+    with self.assertRaises(ValueError):
+      permuted_serial(12345, 1000, 1000)
+
+  def test_new_serial_with_key(self):
+    """
+    Test that serials for each scheme fit the encoders
+    """
+    self.assertLessEqual(len(new_serial_with_key(12345, 0)), 15, msg="TCIN serial longer than 15 digits")
+    self.assertLessEqual(len(new_serial_with_key(12345, 0, GID_96)), 10, msg="GID serial longer than 10 digits")
+    self.assertLessEqual(len(new_serial_with_key(12345, 0, SGTIN_96)), 11, msg="SGTIN serial longer than 11 digits")
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,98 @@
+#
+#  test_tag_archive.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the tag_archive module
+#
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from tag_archive import *
+from batch_encoder import encode_tcin_batch
+from tcin_encoder import encode_tcin
+from decoder import decode_buffer
+
+class TestTagArchive(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.dir.name, "tags.epc")
+
+  def tearDown(self):
+    self.dir.cleanup()
+
+  def test_write_and_read(self):
+    """
+    Test appending batches, then reading them back by index, slice, iteration and views
+    """
+    batch = encode_tcin_batch(np.full(1000, 13951442), np.arange(1000))
+    tag = encode_tcin("13951442", "123456789012345")
+    with TagArchiveWriter(self.path, TCIN_96) as writer:
+      self.assertEqual(writer.append(batch), 1000, msg="appended != 1000")
+      writer.append([tag, tag.value])
+      writer.append(batch.tags[:3].tobytes())
+
+    self.assertEqual(os.path.getsize(self.path), ARCHIVE_HEADER.size + 1005 * EPC_BYTES, msg="file size mismatch")
+    with TagArchive(self.path) as archive:
+      self.assertEqual(archive.scheme, TCIN_96, msg="scheme != tcin-96")
+      self.assertEqual(len(archive), 1005, msg="len != 1005")
+      self.assertEqual(archive[7], batch.bytes(7), msg="archive[7] mismatch")
+      self.assertEqual(archive.hex(1000), "0800035387487048860DDF79", msg="hex(1000) mismatch")
+      self.assertEqual(archive.value(-4), tag.value, msg="value(-4) mismatch")
+      self.assertEqual(archive.uri(1001), tag.uri, msg="uri(1001) mismatch")
+      self.assertEqual(bytes(archive[2:4]), batch.tags[2:4].tobytes(), msg="archive[2:4] mismatch")
+      self.assertEqual(list(archive)[:1000], [batch.bytes(i) for i in range(1000)], msg="iteration mismatch")
+      self.assertTrue(np.array_equal(archive.tags()[:1000], batch.tags), msg="tags() mismatch")
+      self.assertEqual(decode_buffer(archive.records)[TCIN_96]["serial"][999], 999, msg="decoded serial != 999")
+      with self.assertRaises(IndexError):
+        archive[1005]
+
+  def test_append_checks(self):
+    """
+    Test that appends must match the archive's scheme, and torn records are dropped
+    """
+    with TagArchiveWriter(self.path, TCIN_96) as writer:
+      writer.append([encode_tcin("13951442", "1")])
+      with self.assertRaises(ValueError):
+        writer.append(b'\0' * 13)
+    with open(self.path, "ab") as f:
+      f.write(b'\x08\x00\x03')
+
+    with self.assertRaises(ValueError):
+      TagArchiveWriter(self.path, GID_96)
+    with TagArchiveWriter(self.path, TCIN_96) as writer:
+      self.assertEqual(len(writer), 1, msg="len != 1 after a torn write")
+      writer.append([encode_tcin("13951442", "2")])
+    with TagArchive(self.path) as archive:
+      self.assertEqual([int.from_bytes(record, 'big') & 0xFF for record in archive], [1, 2], msg="serials != [1, 2]")
+
+  def test_views_outlive_close(self):
+    """
+    Test that views taken from an archive stay valid after it is closed
+    """
+    with TagArchiveWriter(self.path, TCIN_96) as writer:
+      writer.append([encode_tcin("13951442", "1")])
+    archive = TagArchive(self.path)
+    tags = archive.tags()
+    records = archive[0:1]
+    archive.close()
+    self.assertEqual(tags[0, 0], 0x08, msg="tags()[0, 0] != 0x08")
+    self.assertEqual(records[0], 0x08, msg="records[0] != 0x08")
+
+  def test_not_an_archive(self):
+    """
+    Test that other files are rejected
+    """
+    with open(self.path, "wb") as f:
+      f.write(b'0800035387487048860DDF79\n' * 2)
+    with self.assertRaises(ValueError):
+      TagArchive(self.path)
+
+if __name__ == '__main__':
+  unittest.main()
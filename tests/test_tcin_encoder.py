@@ -8,6 +8,7 @@
 #  This file contains a class to test the tcin_encoder module
 #
 
+import struct
 import unittest
 
 from tcin_encoder import *
@@ -78,5 +79,15 @@ class TestTCINConverter(unittest.TestCase):
     self.assertEqual(encode_tcin.tcin_bin, "000010000000000000000011011100011110001001110001111011100000110000101001111101010000110010110001", msg="tcin_bin != 000010000000000000000011011100011110001001110001111011100000110000101001111101010000110010110001")
     self.assertEqual(len(encode_tcin.tcin_bin), 96, msg="len(tcin_bin) != 96 bits")
     
+  def test_encode_tcin_into(self):
+    """
+    Test writing a tag straight into a buffer, at an offset
+    """
+    buffer = bytearray(16)
+    self.assertIsNone(encode_tcin_into(buffer, 4, "13951442", "123456789012345"), msg="encode_tcin_into returned a value")
+    self.assertEqual(buffer[4:].hex().upper(), "0800035387487048860DDF79", msg="tcin != 0800035387487048860DDF79")
+    with self.assertRaises(struct.error):
+      encode_tcin_into(buffer, 8, "13951442", "1")
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,41 @@
+#
+#  test_tiai_codec.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains a class to test the tiai_codec module
+#
+
+import unittest
+
+from tiai_codec import *
+
+class TestTIAICodec(unittest.TestCase):
+  def test_chars_2_asset_id(self):
+    """
+    Test encoding and decoding a character asset ID as an int
+    """
+    self.assertEqual(chars_2_asset_id("123ABC"), 0xC72CC1083, msg="asset_id != 0xC72CC1083")
+    self.assertEqual(asset_id_2_chars(0xC72CC1083), "123ABC", msg="chars != 123ABC")
+    self.assertEqual(asset_id_2_chars(chars_2_asset_id("A B-/#9Z")), "AB-/#9Z", msg="space doesn't decode to nothing")
+    self.assertEqual(asset_id_2_chars(0), "", msg="chars != ''")
+
+  def test_invalid(self):
+    """
+    Test that unsupported characters and codes raise a ValueError
+    """
+    with self.assertRaisesRegex(ValueError, "'\\$ab'"):
+      chars_2_asset_id("ab$C")
+    with self.assertRaises(ValueError):
+      chars_2_bin("ÄB")
+    with self.assertRaises(ValueError):
+      asset_id_2_chars(0x3F)
+    with self.assertRaises(ValueError):
+      asset_id_2_chars(1 << 72)
+    with self.assertRaises(ValueError):
+      bin_2_chars("11000")
+
+if __name__ == '__main__':
+  unittest.main()
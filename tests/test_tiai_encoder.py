@@ -122,5 +122,33 @@ class TestTIAIConverter(unittest.TestCase):
     self.assertEqual(bin3, bin4, msg="bin3 != bin4")
     self.assertEqual(char3, char4, msg="char3 != char4")
     
+  def test_with_bin_id_ignores_earlier_calls(self):
+    """
+    Test that the URI form only depends on the call, not on what the instance encoded before
+    """
+    encode_tiai = TIAIEncoder()
+    encode_tiai.with_dec_id("17", "123456789012345")
+    uri = encode_tiai.with_bin_id("17", hex_2_bin("AF034C16FD", 72))
+    self.assertEqual(uri, "urn:epc:tag:tiai-a-96:0.17.AF034C16FD", msg="uri != urn:epc:tag:tiai-a-96:0.17.AF034C16FD")
+
+    uri = encode_tiai.with_bin_id("17", dec_2_bin("123456789012345", 72), "dec", "123456789012345")
+    self.assertEqual(uri, "urn:epc:tag:tiai-a-96:0.17.123456789012345", msg="uri != urn:epc:tag:tiai-a-96:0.17.123456789012345")
+
+  def test_encode_into(self):
+    """
+    Test writing tags straight into a buffer
+    """
+    buffer = memoryview(bytearray(36))
+    encode_tiai_dec_into(buffer, 0, "17", "123456789012345")
+    encode_tiai_char_into(buffer, 12, "017", "ab12")
+    encode_tiai_hex_into(buffer, 24, "017", "AF034C16FD")
+    self.assertEqual(bytes(buffer[0:12]), encode_tiai_dec("17", "123456789012345").bytes, msg="dec mismatch")
+    self.assertEqual(bytes(buffer[12:24]), encode_tiai_char("017", "AB12").bytes, msg="char mismatch")
+    self.assertEqual(buffer[24:36].hex().upper(), "0A001100000000AF034C16FD", msg="hex != 0A001100000000AF034C16FD")
+
+    # An asset ID that fills the top word as well
+    encode_tiai_hex_into(buffer, 0, "1999", "FFFFFFFFFFFFFFFFFF")
+    self.assertEqual(bytes(buffer[0:12]), encode_tiai_hex("1999", "FFFFFFFFFFFFFFFFFF").bytes, msg="full hex mismatch")
+
 if __name__ == '__main__':
     unittest.main()
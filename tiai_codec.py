@@ -0,0 +1,78 @@
+#
+#  tiai_codec.py
+#  rfid_encoder
+#
+#  Created by Tim.Milne on 5/17/21
+#  Copyright © 2021 Tim Milne. All rights reserved.
+#
+#  This file contains functions to convert TIAI asset IDs to and from Target's
+#  custom 6 bit character code
+#
+#  Each character is its 6 bit code (the low 6 bits of its ASCII value), except
+#  space, which is 000000 and decodes back to nothing.  As 6 bits are exactly two
+#  octal digits, a string is translated to octal (or straight to binary) in one
+#  str.translate call, and an int is rendered in octal and read back four digits
+#  (two characters) at a time from a 4096 entry table.  Unsupported characters are
+#  found up front, by deleting every supported character with bytes.translate, so
+#  the ValueError names all of them.
+#
+#  For whole arrays of asset IDs, see batch_encoder.chars_2_asset_id_lanes and
+#  decoder.asset_id_lanes_2_chars.
+#
+
+# The supported characters (space is code 0)
+TIAI_CHARS = "#-/0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+TIAI_ASSET_ID_CHARS = 12
+
+dict_char_2_code = {c: ord(c) & 0x3F for c in TIAI_CHARS}
+dict_char_2_code[" "] = 0
+dict_code_2_char = {code: c if code else "" for c, code in dict_char_2_code.items()}
+
+# Translation tables
+tiai_char_bytes = "".join(dict_char_2_code).encode('ascii')
+table_char_2_octal = str.maketrans({c: f'{code:02o}' for c, code in dict_char_2_code.items()})
+table_char_2_bin = str.maketrans({c: f'{code:06b}' for c, code in dict_char_2_code.items()})
+dict_octal_2_chars = {
+  f'{code_1 << 6 | code_2:04o}': c_1 + c_2
+  for code_1, c_1 in dict_code_2_char.items()
+  for code_2, c_2 in dict_code_2_char.items()
+}
+
+# Raise a ValueError naming every character that can't be encoded
+def check_chars(c):
+  if c.encode('ascii', 'replace').translate(None, tiai_char_bytes):
+    invalid = sorted(set(x for x in c if x not in dict_char_2_code))
+    raise ValueError(f'Unsupported TIAI characters {"".join(invalid)!r} in {c!r}')
+
+# Encode a string of characters as an int, 6 bits per character
+def chars_2_asset_id(c):
+  check_chars(c)
+  if not c:
+    return 0
+  return int(c.translate(table_char_2_octal), 8)
+
+# Decode num 6 bit characters from an int (code 0 decodes to nothing)
+def asset_id_2_chars(asset_id, num=TIAI_ASSET_ID_CHARS):
+  if asset_id < 0 or asset_id >> (6 * num):
+    raise ValueError(f'Asset ID {asset_id} is wider than {num} characters')
+  # Round up to whole pairs of characters, the extra leading code 0 decodes to nothing
+  octal = f'{asset_id:0{4 * ((num + 1) // 2)}o}'
+  try:
+    return "".join([dict_octal_2_chars[octal[i:i + 4]] for i in range(0, len(octal), 4)])
+  except KeyError:
+    raise ValueError(f'Asset ID {asset_id} has a 6 bit code with no character') from None
+
+# Encode a string of characters as a binary string, 6 bits per character
+# Pass an optional "num" to prepend zeroes until the return is that length
+def chars_2_bin(c, num=0):
+  check_chars(c)
+  return c.translate(table_char_2_bin).zfill(num)
+
+# Decode a binary string, 6 bits per character
+# Pass an optional "num" to prepend zeroes until the return is that length
+def bin_2_chars(b, num=0):
+  if len(b) % 6:
+    raise ValueError(f'Binary string of {len(b)} bits is not a whole number of 6 bit characters')
+  if not b:
+    return "".zfill(num)
+  return asset_id_2_chars(int(b, 2), len(b) // 6).zfill(num)
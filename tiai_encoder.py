@@ -13,8 +13,17 @@
 #  The asset ref is a 3 digit decimal number, and the asset id is a unique 21
 #  digit decimal or 12 character code, encoded in 6-bit.
 #
+#  The encode_tiai_* functions return an immutable EncodedTag instead, which only
+#  renders the binary, hex and URI forms when they are asked for.
+#
+
+import time
 
 from converter import *
+from packer import *
+from encoded_tag import EncodedTag
+from tiai_codec import *
+from instrumentation import metrics
 
 # tiai_encoder python class to encapsulate the data in an instance
 class TIAIEncoder:
@@ -46,7 +55,7 @@ class TIAIEncoder:
       self.asset_id_dec = self.asset_id_dec[:21] 
   
     # Convert to binary and call binary function
-    return self.with_bin_id(asset_ref_dec, dec_2_bin(self.asset_id_dec, 72))
+    return self.with_bin_id(asset_ref_dec, dec_2_bin(self.asset_id_dec, 72), "dec", self.asset_id_dec.lstrip('0'))
   
   # Use this if the Asset ID is an char (max 12 chars)
   def with_char_id(self, asset_ref_dec, asset_id_char):
@@ -65,7 +74,7 @@ class TIAIEncoder:
     asset_id_bin = self.char_2_bin(self.asset_id_char, 72)
     
     # Convert to binary and call binary function
-    return self.with_bin_id(asset_ref_dec, asset_id_bin)
+    return self.with_bin_id(asset_ref_dec, asset_id_bin, "char", self.asset_id_char)
   
   # Use this if the Asset ID is a hex (max 18 hex digits for 72 bits)
   def with_hex_id(self, asset_ref_dec, asset_id_hex):
@@ -82,14 +91,14 @@ class TIAIEncoder:
       self.asset_id_hex = self.asset_id_hex[:18] 
   
     # Convert to binary and call binary function
-    return self.with_bin_id(asset_ref_dec, hex_2_bin(self.asset_id_hex, 72))
+    return self.with_bin_id(asset_ref_dec, hex_2_bin(self.asset_id_hex, 72), "hex")
   
   # Use this if the Asset ID is already a binary (max 72 bits)
-  # Don't call this directly
-  def with_bin_id(self, asset_ref_dec, asset_id_bin):
+  # The URI shows the asset ID in the given form ("dec", "char" or "hex") and text
+  # (by default the hex of the asset ID), never in a form left over from an earlier call
+  def with_bin_id(self, asset_ref_dec, asset_id_bin, form="hex", asset_id_text=None):
     self.asset_ref_dec = asset_ref_dec
     self.asset_id_bin = asset_id_bin
-    # TPM: Since we don't call this directly we don't zero out the other forms so we can build the uri later.
   
     # Encode TIAI in a Targt proprietary TIAI-96
     asset_ref_bin_len = 13
@@ -115,138 +124,111 @@ class TIAIEncoder:
     # 72 bits are the asset ID (21 digits or 12 characters, already encoded into binary)
     # = 96 bits
 
-    self.asset_ref_bin = dec_2_bin(self.asset_ref_dec, asset_ref_bin_len)
-    self.asset_id_bin.rjust(asset_id_bin_len, '0')
-  
-    # The return from dec_2_bin may be multpiles of 4, so chop off any leading bits for those that aren't
-    if len(self.asset_ref_bin) > asset_ref_bin_len:
-      self.asset_ref_bin = self.asset_ref_bin[len(self.asset_ref_bin) - asset_ref_bin_len:]
-
-    if len(self.asset_id_bin) > asset_id_bin_len:
-      self.asset_id_bin = self.asset_id_bin[len(self.asset_id_bin) - asset_id_bin_len:]
-  
-    self.asset_id_hex = bin_2_hex(self.asset_id_bin)
+    asset_ref = int(self.asset_ref_dec)
+    asset_id = int(self.asset_id_bin, 2)
+    self.asset_ref_bin = dec_2_bin(asset_ref & 0x1FFF, asset_ref_bin_len)
+    self.asset_id_hex = dec_2_hex(asset_id)
   
-    self.tiai_bin = "00001010000" + self.asset_ref_bin + self.asset_id_bin
-    self.tiai_hex = bin_2_hex(self.tiai_bin, 24)
-  
-    # Strip any leading zeros before building the URI form (note: except for asset_id_char)
+    # Strip any leading zeros, as in the URI form (note: except for asset_id_char)
     self.asset_ref_dec = self.asset_ref_dec.lstrip('0')
     self.asset_id_dec = self.asset_id_dec.lstrip('0')
     self.asset_id_hex = self.asset_id_hex.lstrip('0')
-  
-    # Build the uri form using the asset id type set above
-    # TPM: This is why we don't zero out the others in this method like the other methods above
-    if len(self.asset_id_dec) > 0:
-      self.tiai_uri = "urn:epc:tag:tiai-a-96:0." + self.asset_ref_dec + "." + self.asset_id_dec
-    elif len(self.asset_id_char) > 0:
-      self.tiai_uri = "urn:epc:tag:tiai-a-96:0." + self.asset_ref_dec + "." + self.asset_id_char
-    elif len(self.asset_id_hex) > 0:
-      self.tiai_uri = "urn:epc:tag:tiai-a-96:0." + self.asset_ref_dec + "." + self.asset_id_hex
+    if asset_id_text is None:
+      asset_id_text = self.asset_id_hex
+
+    tag = encode_tiai(asset_ref_dec, asset_id, form, asset_id_text)
+    self.tiai_bin = tag.bin
+    self.tiai_hex = tag.hex
+    self.tiai_uri = tag.uri
 
     return self.tiai_uri
   
   # Pass an optional "num" to prepend zeroes until the return is that length
+  # Raises a ValueError for any character outside the 6 bit code (see tiai_codec.py)
   def char_2_bin(self, c, num=0):
-    b = ""
-    
-    for x in c:
-      b += self.dict_char_2_bin[x]
-    
-    return b.zfill(num)
+    return chars_2_bin(c, num)
   
   def bin_2_char(self, b, num=0):
-    c = ""
-   
-    for x in (b[i:i+6] for i in range(0, len(b), 6)):
-      c += self.dict_bin_2_char[x]
-    
-    return c.zfill(num)
+    return bin_2_chars(b, num)
 
   # Class variables (constant and used across all class instances)
   # Custom 6 bit encoding (limited character set)
-  dict_char_2_bin = {
-    "#": "100011",
-    "-": "101101",
-    "/": "101111",
-    "0": "110000",
-    "1": "110001",
-    "2": "110010",
-    "3": "110011",
-    "4": "110100",
-    "5": "110101",
-    "6": "110110",
-    "7": "110111",
-    "8": "111000",
-    "9": "111001",
-    "A": "000001",
-    "B": "000010",
-    "C": "000011",
-    "D": "000100",
-    "E": "000101",
-    "F": "000110",
-    "G": "000111",
-    "H": "001000",
-    "I": "001001",
-    "J": "001010",
-    "K": "001011",
-    "L": "001100",
-    "M": "001101",
-    "N": "001110",
-    "O": "001111",
-    "P": "010000",
-    "Q": "010001",
-    "R": "010010",
-    "S": "010011",
-    "T": "010100",
-    "U": "010101",
-    "V": "010110",
-    "W": "010111",
-    "X": "011000",
-    "Y": "011001",
-    "Z": "011010",
-    " ": "000000"
-  }
-
-  dict_bin_2_char = {
-    "100011": "#",
-    "101101": "-",
-    "101111": "/",
-    "110000": "0",
-    "110001": "1",
-    "110010": "2",
-    "110011": "3",
-    "110100": "4",
-    "110101": "5",
-    "110110": "6",
-    "110111": "7",
-    "111000": "8",
-    "111001": "9",
-    "000001": "A",
-    "000010": "B",
-    "000011": "C",
-    "000100": "D",
-    "000101": "E",
-    "000110": "F",
-    "000111": "G",
-    "001000": "H",
-    "001001": "I",
-    "001010": "J",
-    "001011": "K",
-    "001100": "L",
-    "001101": "M",
-    "001110": "N",
-    "001111": "O",
-    "010000": "P",
-    "010001": "Q",
-    "010010": "R",
-    "010011": "S",
-    "010100": "T",
-    "010101": "U",
-    "010110": "V",
-    "010111": "W",
-    "011000": "X",
-    "011001": "Y",
-    "011010": "Z",
-    "000000": ""
-  }
+  dict_char_2_bin = {c: f'{code:06b}' for c, code in dict_char_2_code.items()}
+  dict_bin_2_char = {f'{code:06b}': c for code, c in dict_code_2_char.items()}
+
+# Use this if the Asset ID is an integer (max 21 digits), returns an EncodedTag
+def encode_tiai_dec(asset_ref_dec, asset_id_dec):
+  if metrics.enabled:
+    metrics.check_length(TIAI_A_96, "asset_id", asset_id_dec, 21)
+  asset_id_dec = asset_id_dec[:21]
+  return encode_tiai(asset_ref_dec, int(asset_id_dec), "dec", asset_id_dec.lstrip('0'))
+
+# Use this if the Asset ID is an char (max 12 chars), returns an EncodedTag
+def encode_tiai_char(asset_ref_dec, asset_id_char):
+  if metrics.enabled:
+    metrics.check_length(TIAI_A_96, "asset_id", asset_id_char, 12)
+  asset_id_char = asset_id_char.upper()[:12]
+  return encode_tiai(asset_ref_dec, chars_2_asset_id(asset_id_char), "char", asset_id_char)
+
+# Use this if the Asset ID is a hex (max 18 hex digits for 72 bits), returns an EncodedTag
+def encode_tiai_hex(asset_ref_dec, asset_id_hex):
+  if metrics.enabled:
+    metrics.check_length(TIAI_A_96, "asset_id", asset_id_hex, 18)
+  asset_id = int(asset_id_hex[:18], 16)
+  return encode_tiai(asset_ref_dec, asset_id, "hex", f'{asset_id:X}'.lstrip('0'))
+
+# Pack the asset ref (only the last 3 digits are used) and the 72 bit asset ID, and
+# build the URI from the asset ID in the given form and text (there is no URI for
+# an empty asset ID, the same as TIAIEncoder)
+def encode_tiai(asset_ref_dec, asset_id, form=None, asset_id_text=None):
+  timed = metrics.enabled
+  if timed:
+    metrics.count_encode(TIAI_A_96)
+    metrics.check_length(TIAI_A_96, "asset_ref", asset_ref_dec, 3)
+    start = time.perf_counter()
+
+  asset_ref_dec = asset_ref_dec[-3:]
+
+  # The packer chops off any leading bits that don't fit in each field
+  tiai = pack_tiai_a_96(0, int(asset_ref_dec), asset_id)
+  if asset_id_text is None:
+    tag = EncodedTag(tiai, TIAI_A_96, form)
+  elif not asset_id_text:
+    tag = EncodedTag(tiai, TIAI_A_96, form, "", "")
+  else:
+    tag = EncodedTag(tiai, TIAI_A_96, form, "urn:epc:tag:tiai-a-96:0." + asset_ref_dec.lstrip('0') + ".", asset_id_text)
+  if timed:
+    metrics.observe_since("pack", start)
+  return tag
+
+TIAI_ASSET_ID_MASK = (1 << TIAI_A_96_ASSET_ID_BITS) - 1
+TIAI_A_96_TOP = TIAI_A_96_HEADER << 24
+
+# Use these to write the 12 bytes of a tag straight into a caller's buffer (a bytearray,
+# memoryview, mmap or shared memory) at offset, without building any of the strings or
+# the EncodedTag, returns nothing
+def encode_tiai_dec_into(buffer, offset, asset_ref_dec, asset_id_dec):
+  if metrics.enabled:
+    metrics.check_length(TIAI_A_96, "asset_id", asset_id_dec, 21)
+  encode_tiai_into(buffer, offset, asset_ref_dec, int(asset_id_dec[:21]))
+
+def encode_tiai_char_into(buffer, offset, asset_ref_dec, asset_id_char):
+  if metrics.enabled:
+    metrics.check_length(TIAI_A_96, "asset_id", asset_id_char, 12)
+  encode_tiai_into(buffer, offset, asset_ref_dec, chars_2_asset_id(asset_id_char.upper()[:12]))
+
+def encode_tiai_hex_into(buffer, offset, asset_ref_dec, asset_id_hex):
+  if metrics.enabled:
+    metrics.check_length(TIAI_A_96, "asset_id", asset_id_hex, 18)
+  encode_tiai_into(buffer, offset, asset_ref_dec, int(asset_id_hex[:18], 16))
+
+# The top word is the header, filter 0, asset ref and the top 8 bits of the asset ID, so
+# the two words are packed straight from the asset ref and ID (see pack_tiai_a_96)
+def encode_tiai_into(buffer, offset, asset_ref_dec, asset_id):
+  if metrics.enabled:
+    metrics.count_encode(TIAI_A_96)
+    metrics.check_length(TIAI_A_96, "asset_ref", asset_ref_dec, 3)
+  asset_id &= TIAI_ASSET_ID_MASK
+  EPC_STRUCT.pack_into(buffer, offset,
+                       TIAI_A_96_TOP | ((int(asset_ref_dec[-3:]) & 0x1FFF) << 8) | (asset_id >> 64),
+                       asset_id & EPC_LO_MASK)